@@ -0,0 +1,5 @@
+"""
+Micro-benchmarks of Jasmin's hot paths, every module can be run as a script:
+
+    python -m jasmin.benchmarks.<module>
+"""
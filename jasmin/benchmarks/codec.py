@@ -0,0 +1,58 @@
+"""
+SMPP PDU codec benchmark: compares PDUEncoder's fast path with the generic encoder
+when encoding and decoding the most frequent PDUs.
+
+Usage: python -m jasmin.benchmarks.codec [iterations]
+"""
+
+import StringIO
+import sys
+import time
+
+from jasmin.vendor.smpp.pdu.operations import SubmitSM, SubmitSMResp, DeliverSM, DeliverSMResp, EnquireLink
+from jasmin.vendor.smpp.pdu.pdu_encoding import PDUEncoder
+from jasmin.vendor.smpp.pdu.pdu_types import RegisteredDelivery, RegisteredDeliveryReceipt, MessageState
+
+
+def getPDUs():
+    return [
+        SubmitSM(seqNum=1, source_addr='Jasmin', destination_addr='21698700177', short_message='Hello world !',
+                 registered_delivery=RegisteredDelivery(RegisteredDeliveryReceipt.SMSC_DELIVERY_RECEIPT_REQUESTED)),
+        SubmitSMResp(seqNum=1, message_id='4a843ce6-4a7c-4d07-b9ac-49a9c5f6d1b0'),
+        DeliverSM(seqNum=2, source_addr='21698700177', destination_addr='Jasmin',
+                  short_message='id:4a843ce6 sub:001 dlvrd:001 submit date:1701011200 done date:1701011200 stat:DELIVRD',
+                  receipted_message_id='4a843ce6', message_state=MessageState.DELIVERED),
+        DeliverSMResp(seqNum=2),
+        EnquireLink(seqNum=3),
+    ]
+
+
+def run(encoder, pdus, iterations):
+    encoded = [encoder.encode(pdu) for pdu in pdus]
+
+    start = time.time()
+    for _ in xrange(iterations):
+        for pdu in pdus:
+            encoder.encode(pdu)
+    encodeDuration = time.time() - start
+
+    start = time.time()
+    for _ in xrange(iterations):
+        for data in encoded:
+            encoder.decode(StringIO.StringIO(data))
+    decodeDuration = time.time() - start
+
+    return encodeDuration, decodeDuration
+
+
+def main(iterations=5000):
+    pdus = getPDUs()
+    count = iterations * len(pdus)
+
+    print '%-10s %-18s %s' % ('Codec', 'Encode (us/PDU)', 'Decode (us/PDU)')
+    for name, encoder in [('generic', PDUEncoder(fastPath=False)), ('fast', PDUEncoder())]:
+        encodeDuration, decodeDuration = run(encoder, pdus, iterations)
+        print '%-10s %-18.2f %.2f' % (name, encodeDuration * 1000000 / count, decodeDuration * 1000000 / count)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
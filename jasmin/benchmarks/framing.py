@@ -0,0 +1,58 @@
+"""
+SMPP framing benchmark: measures how long SMPPProtocolBase.dataReceived takes to split a single
+buffer of back-to-back PDUs, time per PDU must remain constant when the PDU count grows.
+
+Usage: python -m jasmin.benchmarks.framing [max_pdu_count]
+"""
+
+import sys
+import time
+
+from jasmin.vendor.smpp.pdu.operations import DeliverSM
+from jasmin.vendor.smpp.pdu.pdu_encoding import PDUEncoder
+from jasmin.vendor.smpp.twisted.protocol import SMPPProtocolBase
+
+
+class FramingProtocol(SMPPProtocolBase):
+    """Only frames PDUs, decoding and dispatching are not benchmarked"""
+
+    def __init__(self):
+        SMPPProtocolBase.__init__(self)
+        self.messages = 0
+
+    def rawMessageReceived(self, message):
+        self.messages += 1
+
+    def incompletePDURead(self):
+        pass
+
+
+def getBuffer(pdu_count):
+    pdu = DeliverSM(seqNum=1, source_addr='1234', destination_addr='4567',
+                    short_message='id:1 sub:001 dlvrd:001 submit date:1701011200 done date:1701011200 stat:DELIVRD')
+    return PDUEncoder().encode(pdu) * pdu_count
+
+
+def run(pdu_count):
+    data = getBuffer(pdu_count)
+    protocol = FramingProtocol()
+
+    start = time.time()
+    protocol.dataReceived(data)
+    duration = time.time() - start
+
+    assert protocol.messages == pdu_count
+    assert len(protocol.recvBuffer) == 0
+    return duration
+
+
+def main(max_pdu_count=10000):
+    print '%-10s %-12s %s' % ('PDUs', 'Total (ms)', 'Per PDU (us)')
+    pdu_count = max_pdu_count / 8
+    while pdu_count <= max_pdu_count:
+        duration = run(pdu_count)
+        print '%-10s %-12.2f %.2f' % (pdu_count, duration * 1000, duration * 1000000 / pdu_count)
+        pdu_count *= 2
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+GSM 03.38 codec benchmark: compares the table driven gsm_encode() with the former
+character by character encoder, for the typical content of HTTP /send requests.
+
+Usage: python -m jasmin.benchmarks.gsm [iterations]
+"""
+
+import sys
+import time
+
+from jasmin.protocols.smpp.operations import (gsm_chars, gsm_chars_ext, gsm_encode, gsm_decode,
+                                              gsm_pack_septets, gsm_unpack_septets)
+
+
+def loop_gsm_encode(plaintext):
+    "Former gsm_encode(), looking up every character in the alphabet strings"
+    res = ""
+    for c in plaintext:
+        idx = gsm_chars.find(c)
+        if idx != -1:
+            res += chr(idx)
+            continue
+        idx = gsm_chars_ext.find(c)
+        if idx != -1:
+            res += chr(27) + chr(idx)
+    return res
+
+
+def getContents():
+    return [
+        u'Hello world !',
+        u'Your verification code is 482913, it expires in 5 minutes.',
+        u'Ça coûte 5€ [promo] : répondez {OUI} au 1234 ~ Müller & Søn' * 3,
+    ]
+
+
+def run(f, contents, iterations):
+    start = time.time()
+    for _ in xrange(iterations):
+        for content in contents:
+            f(content)
+    return time.time() - start
+
+
+def main(iterations=20000):
+    contents = getContents()
+    encoded = [gsm_encode(content) for content in contents]
+    count = iterations * len(contents)
+
+    for content in contents:
+        assert gsm_encode(content) == loop_gsm_encode(content)
+
+    print '%-22s %s' % ('Operation', 'us/message')
+    for name, f, args in [('encode (loop)', loop_gsm_encode, contents),
+                          ('encode (tables)', gsm_encode, contents),
+                          ('decode (tables)', gsm_decode, encoded),
+                          ('pack septets', gsm_pack_septets, encoded),
+                          ('unpack septets', gsm_unpack_septets, [gsm_pack_septets(e) for e in encoded])]:
+        print '%-22s %.2f' % (name, run(f, args, iterations) * 1000000 / count)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
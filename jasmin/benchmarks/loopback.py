@@ -0,0 +1,291 @@
+"""
+SMPP stack throughput benchmark: floods PDUs over loopback TCP between Jasmin's SMPP
+client and server stacks and local fakes, no external service is needed.
+
+Scenarios:
+  smsc_submit_sm   SMPPClientProtocol.sendDataRequest(submit_sm) to a fake SMSC
+  smsc_deliver_sm  deliver_sm flood from a fake SMSC to SMPPClientProtocol
+  smpps_submit_sm  submit_sm from an ESME to SMPPServerFactory (credentials, routing and
+                   billing), routed messages are acknowledged by a loopback
+                   SMPPClientManagerPB instead of being queued
+  smpps_deliver_sm deliver_sm flood from SMPPServerFactory to a bound ESME
+
+For every scenario, window requests are kept in flight until pdu_count responses are
+received; PDUs/second, p50/p99 request to response latency and CPU time per PDU are
+reported. Both ends run in the same process, CPU time covers the whole round trip.
+
+Usage: python -m jasmin.benchmarks.loopback [scenario[,scenario...]|all] [pdu_count] [window]
+"""
+
+import StringIO
+import cPickle as pickle
+import logging
+import os
+import resource
+import struct
+import sys
+import tempfile
+import time
+
+from twisted.cred import portal
+from twisted.internet import defer, protocol, reactor
+
+from jasmin.protocols.smpp.configs import SMPPClientConfig, SMPPServerConfig
+from jasmin.protocols.smpp.factory import SMPPClientFactory, SMPPServerFactory
+from jasmin.routing.Routes import DefaultRoute
+from jasmin.routing.configs import RouterPBConfig
+from jasmin.routing.jasminApi import User, Group, SmppClientConnector
+from jasmin.routing.router import RouterPB
+from jasmin.tools.cred.checkers import RouterAuthChecker
+from jasmin.tools.cred.portal import SmppsRealm
+from jasmin.vendor.smpp.pdu.operations import SubmitSM, DeliverSM
+from jasmin.vendor.smpp.pdu.pdu_encoding import PDUEncoder
+from jasmin.vendor.smpp.pdu.pdu_types import CommandId, PDUResponse
+
+LOG_DIR = tempfile.gettempdir()
+USERNAME = 'bench'
+PASSWORD = 'bench'
+
+
+def getSubmitSm():
+    return SubmitSM(source_addr='Jasmin', destination_addr='21698700177', short_message='Hello world !')
+
+
+def getDeliverSm():
+    return DeliverSM(source_addr='21698700177', destination_addr='Jasmin', short_message='Hello Jasmin !')
+
+
+def discardMessage(smpp, pdu):
+    "SMPPClientFactory msgHandler: received messages are acknowledged and dropped"
+    pass
+
+
+def cpuTime():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class FakeSMSC(protocol.Protocol):
+    """Acknowledges every request (submit_sm is given a message_id) and sends data requests
+    through sendDataRequest(), which returns a deferred fired with the response
+    """
+
+    def __init__(self):
+        self.encoder = PDUEncoder()
+        self.recvBuffer = ''
+        self.seqNum = 0
+        self.messageCount = 0
+        self.pendingResponses = {}
+
+    def dataReceived(self, data):
+        data = self.recvBuffer + data
+        offset = 0
+        while len(data) - offset >= 4:
+            length = struct.unpack_from('!L', data, offset)[0]
+            if len(data) - offset < length:
+                break
+            self.PDUReceived(self.encoder.decode(StringIO.StringIO(data[offset:offset + length])))
+            offset += length
+        self.recvBuffer = data[offset:]
+
+    def PDUReceived(self, pdu):
+        if isinstance(pdu, PDUResponse):
+            d = self.pendingResponses.pop(pdu.seqNum, None)
+            if d is not None:
+                d.callback(pdu)
+        elif pdu.commandId == CommandId.submit_sm:
+            self.messageCount += 1
+            self.sendPDU(pdu.requireAck(pdu.seqNum, message_id='%08x' % self.messageCount))
+        elif pdu.requireAck is not None:
+            self.sendPDU(pdu.requireAck(pdu.seqNum))
+
+    def sendPDU(self, pdu):
+        self.transport.write(self.encoder.encode(pdu))
+
+    def sendDataRequest(self, pdu):
+        self.seqNum += 1
+        pdu.seqNum = self.seqNum
+        d = defer.Deferred()
+        self.pendingResponses[pdu.seqNum] = d
+        self.sendPDU(pdu)
+        return d
+
+
+class FakeSMSCFactory(protocol.ServerFactory):
+    protocol = FakeSMSC
+    lastProto = None
+
+    def buildProtocol(self, addr):
+        self.lastProto = protocol.ServerFactory.buildProtocol(self, addr)
+        return self.lastProto
+
+
+class LoopbackSMPPClientManagerPB(object):
+    """Stands for SMPPClientManagerPB: accepts every routed submit_sm without queuing it"""
+
+    def __init__(self):
+        self.messageCount = 0
+
+    def perspective_submit_sm(self, cid, SubmitSmPDU, submit_sm_bill, priority, pickled, source_connector):
+        self.messageCount += 1
+        return defer.succeed('%08x' % self.messageCount)
+
+
+class Flood(object):
+    """Keeps window requests in flight until count responses are received"""
+
+    def __init__(self, send, getPDU, count, window):
+        self.send = send
+        self.getPDU = getPDU
+        self.count = count
+        self.window = window
+        self.sent = 0
+        self.errors = 0
+        self.latencies = []
+        self.done = None
+
+    def start(self):
+        self.done = defer.Deferred()
+        self.startedAt = time.time()
+        self.cpuAt = cpuTime()
+        for _ in range(min(self.window, self.count)):
+            self.sendNext()
+        return self.done
+
+    def sendNext(self):
+        self.sent += 1
+        d = defer.maybeDeferred(self.send, self.getPDU())
+        d.addCallbacks(self.received, self.failed, callbackArgs=(time.time(),))
+
+    def received(self, _, sentAt):
+        self.latencies.append(time.time() - sentAt)
+        self.next()
+
+    def failed(self, failure):
+        self.errors += 1
+        self.next()
+
+    def next(self):
+        if self.sent < self.count:
+            self.sendNext()
+        elif len(self.latencies) + self.errors == self.count:
+            self.duration = time.time() - self.startedAt
+            self.cpu = cpuTime() - self.cpuAt
+            self.done.callback(self)
+
+    def getPercentile(self, percentile):
+        if len(self.latencies) == 0:
+            return 0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100.0))]
+
+
+def getClientConfig(cid, port):
+    return SMPPClientConfig(id=cid, host='127.0.0.1', port=port, username=USERNAME, password=PASSWORD,
+                            reconnectOnConnectionLoss=False, reconnectOnConnectionFailure=False,
+                            log_file=os.path.join(LOG_DIR, 'jasmin-benchmark-%s.log' % cid))
+
+
+def getServerConfig():
+    config = SMPPServerConfig()
+    config.id = 'bench_smpps'
+    config.log_file = os.path.join(LOG_DIR, 'jasmin-benchmark-%s.log' % config.id)
+    return config
+
+
+def getRouterPB():
+    config = RouterPBConfig()
+    config.log_file = os.path.join(LOG_DIR, 'jasmin-benchmark-router.log')
+    routerpb = RouterPB(config, persistenceTimer=False)
+
+    user = User('bench', Group('bench'), USERNAME, PASSWORD)
+    routerpb.perspective_group_add(pickle.dumps(user.group, pickle.HIGHEST_PROTOCOL))
+    routerpb.perspective_user_add(pickle.dumps(user, pickle.HIGHEST_PROTOCOL))
+    routerpb.perspective_mtroute_add(
+        pickle.dumps(DefaultRoute(SmppClientConnector('bench_smppc')), pickle.HIGHEST_PROTOCOL), 0)
+    return routerpb
+
+
+@defer.inlineCallbacks
+def runSMSC(scenario, count, window):
+    smsc_factory = FakeSMSCFactory()
+    port = reactor.listenTCP(0, smsc_factory, interface='127.0.0.1')
+    client = SMPPClientFactory(getClientConfig('bench_smppc', port.getHost().port), discardMessage)
+    try:
+        yield client.connectAndBind()
+
+        if scenario == 'smsc_submit_sm':
+            flood = Flood(client.smpp.sendDataRequest, getSubmitSm, count, window)
+        else:
+            flood = Flood(smsc_factory.lastProto.sendDataRequest, getDeliverSm, count, window)
+        yield flood.start()
+    finally:
+        yield client.disconnectAndDontRetryToConnect()
+        yield port.stopListening()
+
+    defer.returnValue(flood)
+
+
+@defer.inlineCallbacks
+def runSMPPServer(scenario, count, window):
+    routerpb = getRouterPB()
+    config = getServerConfig()
+    _portal = portal.Portal(SmppsRealm(config.id, routerpb))
+    _portal.registerChecker(RouterAuthChecker(routerpb))
+    smpps_factory = SMPPServerFactory(config, auth_portal=_portal, RouterPB=routerpb,
+                                      SMPPClientManagerPB=LoopbackSMPPClientManagerPB())
+    port = reactor.listenTCP(0, smpps_factory, interface='127.0.0.1')
+    client = SMPPClientFactory(getClientConfig('bench_esme', port.getHost().port), discardMessage)
+    try:
+        yield client.connectAndBind()
+
+        if scenario == 'smpps_submit_sm':
+            flood = Flood(client.smpp.sendDataRequest, getSubmitSm, count, window)
+        else:
+            binding = smpps_factory.bound_connections[USERNAME].getNextBindingForDelivery()
+            flood = Flood(binding.sendDataRequest, getDeliverSm, count, window)
+        yield flood.start()
+    finally:
+        yield client.disconnectAndDontRetryToConnect()
+        yield port.stopListening()
+
+    defer.returnValue(flood)
+
+
+SCENARIOS = {
+    'smsc_submit_sm': runSMSC,
+    'smsc_deliver_sm': runSMSC,
+    'smpps_submit_sm': runSMPPServer,
+    'smpps_deliver_sm': runSMPPServer,
+}
+
+
+def run(scenario, count=10000, window=100):
+    """Run scenario, returns a deferred fired with the finished Flood"""
+    return SCENARIOS[scenario](scenario, count, window)
+
+
+@defer.inlineCallbacks
+def main(scenarios='all', count=10000, window=100):
+    if scenarios == 'all':
+        scenarios = sorted(SCENARIOS)
+    else:
+        scenarios = scenarios.split(',')
+
+    print '%-18s %-10s %-8s %-12s %-10s %-10s %s' % (
+        'Scenario', 'PDUs', 'Errors', 'PDUs/s', 'p50 (ms)', 'p99 (ms)', 'CPU/PDU (us)')
+    try:
+        for scenario in scenarios:
+            flood = yield run(scenario, count, window)
+            print '%-18s %-10s %-8s %-12.0f %-10.2f %-10.2f %.1f' % (
+                scenario, count, flood.errors, count / flood.duration,
+                flood.getPercentile(50) * 1000, flood.getPercentile(99) * 1000,
+                flood.cpu * 1000000 / count)
+    finally:
+        reactor.stop()
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    args = sys.argv[1:2] + [int(arg) for arg in sys.argv[2:]]
+    reactor.callWhenRunning(main, *args)
+    reactor.run()
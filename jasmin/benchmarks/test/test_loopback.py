@@ -0,0 +1,31 @@
+"""
+Test cases for the loopback benchmark scenarios
+"""
+
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from jasmin.benchmarks import loopback
+
+
+class LoopbackScenariosTestCase(TestCase):
+
+    @defer.inlineCallbacks
+    def assertScenario(self, scenario):
+        flood = yield loopback.run(scenario, count=20, window=5)
+
+        self.assertEqual(flood.errors, 0)
+        self.assertEqual(len(flood.latencies), 20)
+        self.assertTrue(flood.getPercentile(50) <= flood.getPercentile(99))
+
+    def test_smsc_submit_sm(self):
+        return self.assertScenario('smsc_submit_sm')
+
+    def test_smsc_deliver_sm(self):
+        return self.assertScenario('smsc_deliver_sm')
+
+    def test_smpps_submit_sm(self):
+        return self.assertScenario('smpps_submit_sm')
+
+    def test_smpps_deliver_sm(self):
+        return self.assertScenario('smpps_deliver_sm')
@@ -25,6 +25,7 @@ from jasmin.protocols.http.server import HTTPApi
 from jasmin.protocols.smpp.configs import SMPPServerConfig, SMPPServerPBConfig
 from jasmin.protocols.smpp.factory import SMPPServerFactory
 from jasmin.protocols.smpp.pb import SMPPServerPB
+from jasmin.protocols.smpp.stats import SMPPServerStatsCollector
 from jasmin.queues.configs import AmqpConfig
 from jasmin.queues.factory import AmqpFactory
 from jasmin.redis.client import ConnectionWithConfiguration
@@ -123,12 +124,21 @@ class JasminDaemon(object):
             pb.PBServerFactory(jPBPortalRoot),
             interface=RouterPBConfigInstance.bind)
 
+        # Redis client is used to share users quotas with other routers
+        if RouterPBConfigInstance.shared_quotas:
+            self.components['router-pb-factory'].addRedisClient(self.components['rc'])
+
         # AMQP Broker is used to listen to deliver_sm/dlr queues
         return self.components['router-pb-factory'].addAmqpBroker(self.components['amqp-broker-factory'])
 
+    @defer.inlineCallbacks
     def stopRouterPBService(self):
         """Stop Router PB server"""
-        return self.components['router-pb-server'].stopListening()
+        yield self.components['router-pb-server'].stopListening()
+
+        # Give back leased quotas
+        if self.components['router-pb-factory'].sharedQuotas is not None:
+            yield self.components['router-pb-factory'].sharedQuotas.stop()
 
     def startSMPPClientManagerPBService(self):
         """Start SMPP Client Manager PB server"""
@@ -209,7 +219,9 @@ class JasminDaemon(object):
             SmppsRealm(
                 SMPPServerConfigInstance.id,
                 self.components['router-pb-factory']))
-        p.registerChecker(RouterAuthChecker(self.components['router-pb-factory']))
+        p.registerChecker(RouterAuthChecker(
+            self.components['router-pb-factory'],
+            SMPPServerStatsCollector().get(SMPPServerConfigInstance.id)))
 
         # SMPPServerFactory init
         self.components['smpp-server-factory'] = SMPPServerFactory(
@@ -10,12 +10,15 @@ from twisted.spread import pb
 import jasmin
 from jasmin.protocols.smpp.protocol import SMPPServerProtocol
 from jasmin.protocols.smpp.services import SMPPClientService
+from jasmin.queues import wire
 from jasmin.tools.migrations.configuration import ConfigurationMigrator
 from jasmin.vendor.smpp.pdu.pdu_types import RegisteredDeliveryReceipt
 from jasmin.vendor.smpp.twisted.protocol import SMPPSessionStates
 from .configs import SMPPClientSMListenerConfig
 from .content import SubmitSmContent
+from .lanes import PRIORITIES, SubmitSmLanes, getLaneName, getLanePrefetchCount
 from .listeners import SMPPClientSMListener
+from .retrials import declareRetrialTiers
 
 LOG_CATEGORY = "jasmin-pb-client-mgmt"
 
@@ -238,21 +241,28 @@ class SMPPClientManagerPB(pb.Avatar):
         # Declare queues
         # First declare the messaging exchange (has no effect if its already declared)
         yield self.amqpBroker.chan.exchange_declare(exchange='messaging', type='topic')
-        # submit.sm queue declaration and binding
-        submit_sm_queue = 'submit.sm.%s' % c.id
-        routing_key = 'submit.sm.%s' % c.id
-        self.log.info('Binding %s queue to %s route_key', submit_sm_queue, routing_key)
-        yield self.amqpBroker.named_queue_declare(queue=submit_sm_queue)
-        yield self.amqpBroker.chan.queue_bind(queue=submit_sm_queue,
-                                              exchange="messaging",
-                                              routing_key=routing_key)
+        # submit.sm queues (one lane per priority) declaration and binding
+        for priority in PRIORITIES:
+            submit_sm_queue = getLaneName('submit.sm.%s' % c.id, priority)
+            routing_key = getLaneName('submit.sm.%s' % c.id, priority)
+            self.log.info('Binding %s queue to %s route_key', submit_sm_queue, routing_key)
+            yield self.amqpBroker.named_queue_declare(queue=submit_sm_queue)
+            yield self.amqpBroker.chan.queue_bind(queue=submit_sm_queue,
+                                                  exchange="messaging",
+                                                  routing_key=routing_key)
+
+        # Instanciate a SM listener config
+        smListenerConfig = SMPPClientSMListenerConfig(self.config.config_file)
+
+        # submit.sm retrial tiers, dead-lettering to the messaging exchange
+        yield declareRetrialTiers(self.amqpBroker, smListenerConfig.submit_retrial_tiers)
 
         # Instanciate smpp client service manager
         serviceManager = SMPPClientService(c, self.config)
 
         # Instanciate a SM listener
         smListener = SMPPClientSMListener(
-            config=SMPPClientSMListenerConfig(self.config.config_file),
+            config=smListenerConfig,
             SMPPClientFactory=serviceManager.SMPPClientFactory,
             amqpBroker=self.amqpBroker,
             redisClient=self.redisClient,
@@ -356,29 +366,40 @@ class SMPPClientManagerPB(pb.Avatar):
         # Start the queue consumer
         self.log.debug('Starting submit_sm_q consumer in connector [%s]', cid)
 
-        # Subscribe to submit.sm.%cid queue
+        # Subscribe to submit.sm.%cid queues (one lane per priority)
         # check jasmin.queues.test.test_amqp.PublishConsumeTestCase.test_simple_publish_consume_by_topic
-        submit_sm_queue = 'submit.sm.%s' % connector['id']
         consumerTag = 'SMPPClientFactory-%s' % (connector['id'])
 
         try:
             # Using the same consumerTag will prevent getting multiple consumers on the same queue
             # This can resolve the dark hole issue #234
 
-            # Stop the queue consumer if any
+            # Stop the queue consumers if any
             if connector['consumer_tag'] is not None:
                 self.log.debug('Stopping submit_sm_q consumer in connector [%s]', cid)
-                yield self.amqpBroker.chan.basic_cancel(consumer_tag=connector['consumer_tag'])
-
-            # Start a new consumer
-            yield self.amqpBroker.chan.basic_consume(queue=submit_sm_queue,
-                                                     no_ack=False, consumer_tag=consumerTag)
+                yield self.cancelSubmitSmConsumers(connector['consumer_tag'])
+
+            # Start new consumers, a non global basic_qos will only apply to consumers started
+            # after it, it is reset once consuming to keep other consumers of the channel unlimited
+            prefetch_count = getLanePrefetchCount(connector['config'].prefetch_count)
+            if prefetch_count > 0:
+                yield self.amqpBroker.chan.basic_qos(prefetch_count=prefetch_count, global_=False)
+            for priority in PRIORITIES:
+                submit_sm_queue = getLaneName('submit.sm.%s' % connector['id'], priority)
+                yield self.amqpBroker.chan.basic_consume(queue=submit_sm_queue, no_ack=False,
+                                                         consumer_tag=getLaneName(consumerTag, priority))
+            if prefetch_count > 0:
+                yield self.amqpBroker.chan.basic_qos(prefetch_count=0, global_=False)
         except Exception, e:
             self.log.error('Error consuming from queue %s: %s', submit_sm_queue, e)
             defer.returnValue(False)
 
-        submit_sm_q = yield self.amqpBroker.client.queue(consumerTag)
-        self.log.info('%s is consuming from queue: %s', consumerTag, submit_sm_queue)
+        queues = {}
+        for priority in PRIORITIES:
+            queues[priority] = yield self.amqpBroker.client.queue(getLaneName(consumerTag, priority))
+        submit_sm_q = SubmitSmLanes(queues, connector['sm_listener'].config.submit_priority_weights)
+        self.log.info('%s is consuming from queues: submit.sm.%s (%s lanes)',
+                      consumerTag, connector['id'], len(queues))
 
         # Set callbacks for every consumed message from submit_sm_queue queue
         d = submit_sm_q.get()
@@ -397,6 +418,12 @@ class SMPPClientManagerPB(pb.Avatar):
 
         defer.returnValue(True)
 
+    @defer.inlineCallbacks
+    def cancelSubmitSmConsumers(self, consumerTag):
+        """Cancel the consumers of every submit.sm lane"""
+        for priority in PRIORITIES:
+            yield self.amqpBroker.chan.basic_cancel(consumer_tag=getLaneName(consumerTag, priority))
+
     @defer.inlineCallbacks
     def perspective_connector_stop(self, cid, delQueues=False):
         """This will stop a service by detaching IService to IServiceCollection
@@ -412,7 +439,7 @@ class SMPPClientManagerPB(pb.Avatar):
         # Stop the queue consumer
         if connector['consumer_tag'] is not None:
             self.log.debug('Stopping submit_sm_q consumer in connector [%s]', cid)
-            yield self.amqpBroker.chan.basic_cancel(consumer_tag=connector['consumer_tag'])
+            yield self.cancelSubmitSmConsumers(connector['consumer_tag'])
 
             # Cleaning
             self.log.debug('Cleaning objects in connector [%s]', cid)
@@ -424,26 +451,17 @@ class SMPPClientManagerPB(pb.Avatar):
             defer.returnValue(False)
 
         if delQueues:
-            submitSmQueueName = 'submit.sm.%s' % cid
-            self.log.debug('Deleting queue [%s]', submitSmQueueName)
-            yield self.amqpBroker.chan.queue_delete(queue=submitSmQueueName)
-
-        # Reject & requeue any pending message to avoid loosing messages after
-        # clearing timers
-        if len(connector['sm_listener'].rejectTimers) > 0:
-            for msgid, timer in connector['sm_listener'].rejectTimers.items():
-                if timer.active():
-                    func = timer.func
-                    kw = timer.kw
-                    timer.cancel()
-                    del connector['sm_listener'].rejectTimers[msgid]
-
-                    self.log.debug('Rejecting/requeuing msgid [%s] before stopping connector', msgid)
-                    yield func(**kw)
+            for priority in PRIORITIES:
+                submitSmQueueName = getLaneName('submit.sm.%s' % cid, priority)
+                self.log.debug('Deleting queue [%s]', submitSmQueueName)
+                yield self.amqpBroker.chan.queue_delete(queue=submitSmQueueName)
 
         # Stop timers in message listeners
         self.log.debug('Clearing sm_listener timers in connector [%s]', cid)
         connector['sm_listener'].clearAllTimers()
+
+        # Requeue messages delivered to the consumer and not yet consumed from submit_sm_q
+        yield connector['sm_listener'].rejectAndRequeuePendingMessages()
         connector['sm_listener'].submit_sm_q = None
 
         # Stop SMPP connector
@@ -558,8 +576,8 @@ class SMPPClientManagerPB(pb.Avatar):
             self.log.error('AMQP Broker is not connected')
             defer.returnValue(False)
 
-        # Define the destination and response queue names
-        pubQueueName = "submit.sm.%s" % cid
+        # Define the destination (the lane of priority) and response queue names
+        pubQueueName = getLaneName("submit.sm.%s" % cid, priority)
         responseQueueName = "submit.sm.resp.%s" % cid
 
         # Pickle SubmitSmPDU if it's not pickled
@@ -570,20 +588,38 @@ class SMPPClientManagerPB(pb.Avatar):
                 self.log.warn('Removing schedule_delivery_time from SubmitSmPDU.')
 
             PickledSubmitSmPDU = pickle.dumps(SubmitSmPDU, self.pickleProtocol)
-            submit_sm_bill = pickle.dumps(submit_sm_bill, self.pickleProtocol)
+            PickledSubmitSmBill = pickle.dumps(submit_sm_bill, self.pickleProtocol)
         else:
             PickledSubmitSmPDU = SubmitSmPDU
+            PickledSubmitSmBill = submit_sm_bill
             SubmitSmPDU = pickle.loads(PickledSubmitSmPDU)
 
-        # Publishing a pickled PDU
+        body = PickledSubmitSmPDU
+        bill = PickledSubmitSmBill
+        compact = False
+        if self.amqpBroker.config.wire_format == 'compact':
+            if pickled:
+                submit_sm_bill = pickle.loads(PickledSubmitSmBill)
+
+            try:
+                body = wire.dumpPDU(SubmitSmPDU)
+                bill = wire.dumpBill(submit_sm_bill)
+                compact = True
+            except wire.WireFormatError, e:
+                self.log.debug('Publishing a pickled SubmitSmPDU: %s', e)
+                body = PickledSubmitSmPDU
+                bill = PickledSubmitSmBill
+
+        # Publishing a pickled (or compact) PDU
         self.log.debug('Publishing SubmitSmPDU with routing_key=%s, priority=%s', pubQueueName, priority)
         c = SubmitSmContent(
-            body=PickledSubmitSmPDU,
+            body=body,
             replyto=responseQueueName,
-            submit_sm_bill=submit_sm_bill,
+            submit_sm_bill=bill,
             priority=priority,
             expiration=validity_period,
-            source_connector='httpapi' if source_connector == 'httpapi' else 'smppsapi')
+            source_connector='httpapi' if source_connector == 'httpapi' else 'smppsapi',
+            compact=compact)
         yield self.amqpBroker.publish(exchange='messaging', routing_key=pubQueueName, content=c)
 
         if source_connector == 'httpapi' and dlr_url is not None:
@@ -597,16 +633,14 @@ class SMPPClientManagerPB(pb.Avatar):
                                dlr_level,
                                c.properties['message-id'],
                                connector['config'].dlr_expiry)
-                # Set values and callback expiration setting
+                # Set values and expiration setting
                 hashKey = "dlr:%s" % (c.properties['message-id'])
                 hashValues = {'sc': 'httpapi',
                               'url': dlr_url,
                               'level': dlr_level,
                               'method': dlr_method,
                               'expiry': connector['config'].dlr_expiry}
-                self.redisClient.hmset(hashKey, hashValues).addCallback(
-                    lambda response: self.redisClient.expire(
-                        hashKey, connector['config'].dlr_expiry))
+                self.redisClient.hmset_expire(hashKey, hashValues, connector['config'].dlr_expiry)
         elif (isinstance(source_connector, SMPPServerProtocol) and
               SubmitSmPDU.params['registered_delivery'].receipt != RegisteredDeliveryReceipt.NO_SMSC_DELIVERY_RECEIPT_REQUESTED):
             # If submit_sm is successfully sent from a SMPPServerProtocol connector and DLR is
@@ -622,7 +656,7 @@ class SMPPClientManagerPB(pb.Avatar):
                     c.properties['message-id'],
                     SubmitSmPDU.params['registered_delivery'],
                     source_connector.factory.config.dlr_expiry)
-                # Set values and callback expiration setting
+                # Set values and expiration setting
                 hashKey = "dlr:%s" % (c.properties['message-id'])
                 hashValues = {'sc': 'smppsapi',
                               'system_id': source_connector.system_id,
@@ -635,8 +669,6 @@ class SMPPClientManagerPB(pb.Avatar):
                               'sub_date': datetime.datetime.now(),
                               'rd_receipt': '%s' % SubmitSmPDU.params['registered_delivery'].receipt,
                               'expiry': source_connector.factory.config.dlr_expiry}
-                self.redisClient.hmset(hashKey, hashValues).addCallback(
-                    lambda response: self.redisClient.expire(
-                        hashKey, source_connector.factory.config.dlr_expiry))
+                self.redisClient.hmset_expire(hashKey, hashValues, source_connector.factory.config.dlr_expiry)
 
         defer.returnValue(c.properties['message-id'])
@@ -58,6 +58,24 @@ class SMPPClientSMListenerConfig(ConfigFile):
                     'ESME_RINVSCHED':       {'count': 2,  'delay': 300},
                 }"""))
 
+        # Adapt the submit_sm rate of connectors (up to their submit_throughput) to the SMSC's
+        # throttling errors and response times
+        self.submit_aimd = self._getbool('sm-listener', 'submit_aimd', False)
+        self.submit_aimd_min_throughput = self._getfloat('sm-listener', 'submit_aimd_min_throughput', 0.1)
+        self.submit_aimd_increase = self._getfloat('sm-listener', 'submit_aimd_increase', 1.0)
+        self.submit_aimd_decrease = self._getfloat('sm-listener', 'submit_aimd_decrease', 0.5)
+        self.submit_aimd_latency_factor = self._getfloat('sm-listener', 'submit_aimd_latency_factor', 3.0)
+
+        # Weights of the submit.sm priority lanes consumption (c.f. jasmin.managers.lanes)
+        self.submit_priority_weights = ast.literal_eval(
+            self._get('sm-listener', 'submit_priority_weights', '{0: 1, 1: 2, 2: 4, 3: 8}'))
+
+        # Delays (seconds) of the broker side retrial tiers, a retrial is delayed by the shortest
+        # tier lasting at least its requested delay (c.f. jasmin.managers.retrials)
+        self.submit_retrial_tiers = ast.literal_eval(
+            self._get('sm-listener', 'submit_retrial_tiers',
+                      '[1, 5, 10, 30, 60, 120, 180, 300, 600, 1800, 3600]'))
+
         self.submit_max_age_smppc_not_ready = self._getint(
             'sm-listener', 'submit_max_age_smppc_not_ready', 1200)
 
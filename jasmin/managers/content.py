@@ -8,6 +8,8 @@ import uuid
 
 from txamqp.content import Content
 
+from jasmin.queues import wire
+
 
 class InvalidParameterError(Exception):
     """Raised when a parameter is invalid
@@ -133,10 +135,12 @@ class SubmitSmContent(PDU):
     "A SMPP SubmitSm Content"
 
     def __init__(self, body, replyto, submit_sm_bill, priority=1, expiration=None, msgid=None,
-                 source_connector='httpapi'):
+                 source_connector='httpapi', compact=False):
+        """body and submit_sm_bill are already serialized: pickled or, if compact is True,
+        with jasmin.queues.wire"""
         props = {}
 
-        # RabbitMQ does not support priority (yet), anyway, we may use any other amqp broker that supports it
+        # The priority selects the submit.sm lane (c.f. jasmin.managers.lanes)
         if not isinstance(priority, int):
             raise InvalidParameterError("Invalid priority argument: %s" % priority)
         if priority < 0 or priority > 3:
@@ -150,6 +154,8 @@ class SubmitSmContent(PDU):
         props['priority'] = priority
         props['message-id'] = msgid
         props['reply-to'] = replyto
+        if compact:
+            props['content-type'] = wire.CONTENT_TYPE
 
         props['headers'] = {'source_connector': source_connector,
                             'submit_sm_bill': submit_sm_bill}
@@ -172,11 +178,20 @@ class DeliverSmContent(PDU):
     "A SMPP DeliverSm Content"
 
     def __init__(self, body, sourceCid, pickleProtocol=2, prePickle=True,
-                 concatenated=False, will_be_concatenated=False):
+                 concatenated=False, will_be_concatenated=False, compact=False):
         props = {}
 
         props['message-id'] = randomUniqueId()
 
+        if prePickle is True and compact:
+            # Routables that cannot be serialized in the compact format are pickled
+            try:
+                body = wire.dumpRoutableDeliverSm(body)
+                props['content-type'] = wire.CONTENT_TYPE
+                prePickle = False
+            except wire.WireFormatError:
+                pass
+
         # For routing purpose, connector-id indicates the source connector of the PDU
         props['headers'] = {'try-count': 0,
                             'connector-id': sourceCid,
@@ -1,4 +1,6 @@
 import logging
+import time
+from datetime import datetime
 from logging.handlers import TimedRotatingFileHandler
 
 from twisted.internet import defer
@@ -6,10 +8,40 @@ from twisted.internet import reactor
 from txamqp.queue import Closed
 
 from jasmin.managers.content import DLRContentForHttpapi, DLRContentForSmpps
+from jasmin.managers.stats import DLRLookupStatsCollector
 from jasmin.tools.singleton import Singleton
+from jasmin.vendor.txredisapi import ResponseError
 
 LOG_CATEGORY = "dlr"
 
+# deliver_sm receipt states
+SUCCESS_STATES = ['ACCEPTD', 'DELIVRD']
+FINAL_STATES = ['DELIVRD', 'EXPIRED', 'DELETED', 'UNDELIV', 'REJECTD']
+
+# Resolves the dlr map (KEYS[1]) a queue-msgid:<smpp msgid> map points to, the dlr map is
+# deleted when it does not expect any further receipt, c.f. isLastReceipt().
+# ARGV[1] is the queue-msgid map's connector_type, ARGV[2] and ARGV[3] are '1' when the
+# receipt state is a success one, a final one.
+DLR_RESOLUTION_SCRIPT = """
+local dlr = redis.call('HGETALL', KEYS[1])
+local d = {}
+for i = 1, #dlr, 2 do d[dlr[i]] = dlr[i + 1] end
+
+local last = false
+if d['sc'] and d['sc'] == ARGV[1] then
+    if d['sc'] == 'httpapi' then
+        last = d['level'] == '2' or d['level'] == '3'
+    elseif d['sc'] == 'smppsapi' then
+        local forwarded = d['rd_receipt'] == 'SMSC_DELIVERY_RECEIPT_REQUESTED' or
+            (ARGV[2] ~= '1' and d['rd_receipt'] == 'SMSC_DELIVERY_RECEIPT_REQUESTED_FOR_FAILURE')
+        last = forwarded and ARGV[3] == '1'
+    end
+end
+if last then redis.call('DEL', KEYS[1]) end
+
+return dlr
+"""
+
 
 class RedisError(Exception):
     """Raised for any Redis connectivity problem"""
@@ -23,6 +55,31 @@ class DLRMapNotFound(Exception):
     """Raised if no dlr is found in Redis db"""
 
 
+def isReceiptForwarded(dlr, pdu_dlr_status):
+    """Return True if a deliver_sm receipt must be sent back to the smppsapi user of dlr map"""
+    return ((pdu_dlr_status in SUCCESS_STATES and
+             dlr['rd_receipt'] == 'SMSC_DELIVERY_RECEIPT_REQUESTED') or
+            (pdu_dlr_status not in SUCCESS_STATES and
+             dlr['rd_receipt'] in ['SMSC_DELIVERY_RECEIPT_REQUESTED',
+                                   'SMSC_DELIVERY_RECEIPT_REQUESTED_FOR_FAILURE']))
+
+
+def isLastReceipt(dlr, pdu_dlr_status):
+    """Return True if dlr map does not expect any further deliver_sm receipt after this one
+
+    Note: DLR_RESOLUTION_SCRIPT must behave exactly the same way
+    """
+    if dlr['sc'] == 'httpapi':
+        return dlr['level'] in [2, 3]
+    elif dlr['sc'] == 'smppsapi':
+        return isReceiptForwarded(dlr, pdu_dlr_status) and pdu_dlr_status in FINAL_STATES
+    return False
+
+
+def hashToDict(values):
+    return dict(zip(values[::2], values[1::2]))
+
+
 class DLRLookup(object):
     """
     Will consume dlr pdus (submit_sm, deliver_sm or data_sm), lookup for matching dlr maps in redis db
@@ -37,6 +94,11 @@ class DLRLookup(object):
         self.redisClient = redisClient
         self.requeue_timers = {}
         self.lookup_retrials = {}
+        # Receipts are resolved through DLR_RESOLUTION_SCRIPT unless redis cannot run it
+        self.lua_scripting = True
+
+        self.stats = DLRLookupStatsCollector().get()
+        self.stats.set('created_at', datetime.now())
 
         # Set up a dedicated logger
         self.log = logging.getLogger(LOG_CATEGORY)
@@ -101,7 +163,7 @@ class DLRLookup(object):
             # Remove retrial tracker
             del self.lookup_retrials[message.content.properties['message-id']]
 
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=requeue)
+        yield self.amqpBroker.reject(message.delivery_tag, requeue=requeue)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
@@ -110,7 +172,7 @@ class DLRLookup(object):
             # Remove retrial tracker
             del self.lookup_retrials[message.content.properties['message-id']]
 
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.ack(message.delivery_tag)
 
     def setup_callbacks(self, q):
         if self.q is None:
@@ -214,8 +276,7 @@ class DLRLookup(object):
                                    smpp_msgid, msgid, dlr_expiry)
                     hashKey = "queue-msgid:%s" % smpp_msgid
                     hashValues = {'msgid': msgid, 'connector_type': 'httpapi'}
-                    yield self.redisClient.hmset(hashKey, hashValues)
-                    yield self.redisClient.expire(hashKey, dlr_expiry)
+                    yield self.redisClient.hmset_expire(hashKey, hashValues, dlr_expiry)
             elif dlr['sc'] == 'smppsapi':
                 self.log.debug('There is a SMPPs mapping for msgid[%s] ...', msgid)
                 system_id = dlr['system_id']
@@ -259,8 +320,7 @@ class DLRLookup(object):
                                        smpp_msgid, msgid, smpps_map_expiry)
                         hashKey = "queue-msgid:%s" % smpp_msgid
                         hashValues = {'msgid': msgid, 'connector_type': 'smppsapi'}
-                        yield self.redisClient.hmset(hashKey, hashValues)
-                        yield self.redisClient.expire(hashKey, smpps_map_expiry)
+                        yield self.redisClient.hmset_expire(hashKey, hashValues, smpps_map_expiry)
         except DLRMapError as e:
             self.log.error('[msgid:%s] DLR Content: %s', msgid, e)
             yield self.rejectMessage(message)
@@ -281,6 +341,48 @@ class DLRLookup(object):
         else:
             yield self.ackMessage(message)
 
+    @defer.inlineCallbacks
+    def resolve_deliver_sm_dlr(self, smpp_msgid, pdu_dlr_status):
+        """Return the queue-msgid map of smpp_msgid and the dlr map it points to, the dlr map
+        is removed if it does not expect any further receipt (c.f. isLastReceipt())
+
+        The dlr map is got (and removed) in a single round trip through DLR_RESOLUTION_SCRIPT,
+        the same steps are run one by one when redis (or a fake one) cannot run lua scripts.
+        """
+        q = yield self.redisClient.hgetall("queue-msgid:%s" % smpp_msgid)
+        if 'msgid' not in q:
+            defer.returnValue((q, {}))
+
+        if self.lua_scripting:
+            try:
+                dlr = yield self.redisClient.run_script(
+                    DLR_RESOLUTION_SCRIPT,
+                    keys=['dlr:%s' % q['msgid']],
+                    args=[q.get('connector_type', ''),
+                          '1' if pdu_dlr_status in SUCCESS_STATES else '0',
+                          '1' if pdu_dlr_status in FINAL_STATES else '0'])
+            except AttributeError:
+                self.lua_scripting = False
+            except ResponseError as e:
+                if not str(e).startswith('unknown command'):
+                    raise
+                self.lua_scripting = False
+            else:
+                dlr = hashToDict(dlr)
+                if (len(dlr) > 0 and dlr.get('sc') == q.get('connector_type') and
+                        isLastReceipt(dlr, pdu_dlr_status)):
+                    self.log.debug('Removed %s dlr map for msgid[%s]', dlr['sc'], q['msgid'])
+                defer.returnValue((q, dlr))
+
+            self.log.warn('Redis cannot run lua scripts, dlr maps will be resolved step by step')
+
+        dlr = yield self.redisClient.hgetall("dlr:%s" % q['msgid'])
+        if (len(dlr) > 0 and dlr.get('sc') == q.get('connector_type') and
+                isLastReceipt(dlr, pdu_dlr_status)):
+            self.log.debug('Removing %s dlr map for msgid[%s]', dlr['sc'], q['msgid'])
+            yield self.redisClient.delete("dlr:%s" % q['msgid'])
+        defer.returnValue((q, dlr))
+
     @defer.inlineCallbacks
     def deliver_sm_dlr_callback(self, message):
         msgid = message.content.properties['message-id']
@@ -300,16 +402,31 @@ class DLRLookup(object):
             if self.redisClient.connected != 1:
                 raise RedisError('RC is offline !')
 
-            q = yield self.redisClient.hgetall("queue-msgid:%s" % msgid)
+            # Get queue-msgid and dlr maps, the latter is removed if this is its last receipt
+            self.stats.inc('deliver_sm_lookup_count')
+            self.stats.set('last_deliver_sm_lookup_at', datetime.now())
+            lookup_at = time.time()
+            try:
+                q, dlr = yield self.resolve_deliver_sm_dlr(msgid, pdu_dlr_status)
+            except Exception:
+                self.stats.inc('deliver_sm_lookup_error_count')
+                raise
+            finally:
+                lookup_time = int((time.time() - lookup_at) * 1000000)
+                self.stats.inc('deliver_sm_lookup_time', lookup_time)
+                if lookup_time > self.stats.get('deliver_sm_lookup_max_time'):
+                    self.stats.set('deliver_sm_lookup_max_time', lookup_time)
+
             if len(q) != 2 or 'msgid' not in q or 'connector_type' not in q:
+                self.stats.inc('deliver_sm_lookup_not_found_count')
                 raise DLRMapNotFound('Got a DLR for an unknown message id: %s (coded:%s)' % (pdu_dlr_id, msgid))
 
             submit_sm_queue_id = q['msgid']
             connector_type = q['connector_type']
 
-            # Get dlr and ensure it's sc (source_connector) is same as q['connector_type']
-            dlr = yield self.redisClient.hgetall("dlr:%s" % submit_sm_queue_id)
+            # Ensure dlr's sc (source_connector) is same as q['connector_type']
             if dlr is None or len(dlr) == 0:
+                self.stats.inc('deliver_sm_lookup_not_found_count')
                 raise DLRMapNotFound('Got a DLR for an unknown message id: %s (coded:%s)' % (pdu_dlr_id, msgid))
             if len(dlr) > 0 and dlr['sc'] != connector_type:
                 raise DLRMapError('Found a dlr for msgid:%s with diffrent sc: %s' % (submit_sm_queue_id, dlr['sc']))
@@ -340,9 +457,6 @@ class DLRLookup(object):
                                                                                err=pdu_dlr_err,
                                                                                text=pdu_dlr_text,
                                                                                method=dlr_method))
-
-                    self.log.debug('Removing HTTP dlr map for msgid[%s]', submit_sm_queue_id)
-                    yield self.redisClient.delete('dlr:%s' % submit_sm_queue_id)
             elif connector_type == 'smppsapi':
                 self.log.debug('There is a SMPPs mapping for msgid[%s] ...', msgid)
                 system_id = dlr['system_id']
@@ -355,14 +469,8 @@ class DLRLookup(object):
                 sub_date = dlr['sub_date']
                 registered_delivery_receipt = dlr['rd_receipt']
 
-                success_states = ['ACCEPTD', 'DELIVRD']
-                final_states = ['DELIVRD', 'EXPIRED', 'DELETED', 'UNDELIV', 'REJECTD']
                 # Do we need to forward the receipt to the original sender ?
-                if ((pdu_dlr_status in success_states and
-                             registered_delivery_receipt == 'SMSC_DELIVERY_RECEIPT_REQUESTED') or
-                        (pdu_dlr_status not in success_states and
-                                 registered_delivery_receipt in ['SMSC_DELIVERY_RECEIPT_REQUESTED',
-                                                                 'SMSC_DELIVERY_RECEIPT_REQUESTED_FOR_FAILURE'])):
+                if isReceiptForwarded(dlr, pdu_dlr_status):
                     self.log.debug(
                         'Got DLR information for msgid[%s], registered_deliver%s, system_id:%s',
                         submit_sm_queue_id, registered_delivery_receipt, system_id)
@@ -376,10 +484,6 @@ class DLRLookup(object):
                                                                              source_addr, destination_addr, sub_date,
                                                                              source_addr_ton, source_addr_npi,
                                                                              dest_addr_ton, dest_addr_npi))
-
-                    if pdu_dlr_status in final_states:
-                        self.log.debug('Removing SMPPs dlr map for msgid[%s]', submit_sm_queue_id)
-                        yield self.redisClient.delete('dlr:%s' % submit_sm_queue_id)
         except DLRMapError as e:
             self.log.error('[msgid:%s] DLRMapError: %s', msgid, e)
             yield self.rejectMessage(message)
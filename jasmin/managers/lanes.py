@@ -0,0 +1,142 @@
+"""
+Priority lanes of submit.sm queues
+
+Every client connector has one submit.sm queue (a lane) per SubmitSmContent priority, the
+priority 0 lane is the historical submit.sm.<cid> queue and the others are
+submit.sm.<cid>.p<priority>, they are consumed together through a SubmitSmLanes scheduler.
+"""
+
+import datetime
+import time
+
+from twisted.internet import defer
+
+PRIORITIES = [0, 1, 2, 3]
+
+
+def getLaneName(name, priority):
+    """Return the queue name (or routing key, consumer tag) of a lane from the priority 0 one"""
+    if priority == 0:
+        return name
+    else:
+        return '%s.p%s' % (name, priority)
+
+
+def getLanePrefetchCount(prefetch_count):
+    """Return the prefetch_count of each lane, the connector's prefetch_count is shared across
+    its lanes (at least one message per lane), 0 stays unlimited"""
+    if prefetch_count <= 0:
+        return 0
+    else:
+        return max(1, prefetch_count // len(PRIORITIES))
+
+
+def getCreatedAt(message):
+    """Return the timestamp of the message's created_at header (c.f. jasmin.managers.content),
+    None if it is missing"""
+    try:
+        created_at = message.content.properties['headers']['created_at']
+    except (AttributeError, KeyError):
+        return None
+
+    _datetime, _, microseconds = created_at.partition('.')
+    return (time.mktime(datetime.datetime.strptime(_datetime, '%Y-%m-%d %H:%M:%S').timetuple()) +
+            float('0.%s' % (microseconds or '0')))
+
+
+class SubmitSmLanes(object):
+    """Weighted scheduler of the priority lanes of a connector
+
+    It is used the same way as a single txamqp queue: get() fires with the next message of the
+    lanes, lanes having pending messages are served through a smooth weighted round robin, when
+    all of them are backlogged a lane gets weight / total weights of the consumed messages while
+    empty lanes are skipped.
+
+    Per lane metrics are kept in metrics:
+      - depth: messages delivered by the broker and waiting to be consumed,
+      - count: consumed messages,
+      - wait_time: average time (seconds) spent in queue by consumed messages.
+    """
+
+    # Weight of the last message in the wait_time average
+    wait_time_weight = 0.1
+
+    def __init__(self, queues, weights):
+        # priority -> txamqp queue consuming the lane
+        self.queues = queues
+        self.weights = dict((priority, weights.get(priority, 1)) for priority in queues)
+        self.credits = dict((priority, 0) for priority in queues)
+        self.metrics = dict((priority, {'depth': 0, 'count': 0, 'wait_time': 0})
+                            for priority in queues)
+
+    def pickLane(self):
+        """Return the next lane to consume from, None if all lanes are empty"""
+        lanes = [priority for priority, queue in self.queues.iteritems() if len(queue.pending) > 0]
+        if len(lanes) == 0:
+            return None
+
+        for priority in lanes:
+            self.credits[priority] += self.weights[priority]
+        priority = max(lanes, key=lambda p: (self.credits[p], p))
+        self.credits[priority] -= sum([self.weights[p] for p in lanes])
+
+        return priority
+
+    def get(self):
+        priority = self.pickLane()
+        if priority is not None:
+            return self.queues[priority].get().addCallback(self._consumed, priority)
+
+        # Every lane is empty: wait for the first message to come in any of them
+        d = defer.Deferred()
+        waiting = {}
+
+        def _received(message, priority):
+            for _priority, _d in waiting.iteritems():
+                if _priority != priority:
+                    _d.cancel()
+            d.callback(message)
+
+        def _failed(failure, priority):
+            if failure.check(defer.CancelledError) is not None:
+                return
+            for _priority, _d in waiting.iteritems():
+                if _priority != priority:
+                    _d.cancel()
+            d.errback(failure)
+
+        for priority, queue in self.queues.iteritems():
+            waiting[priority] = queue.get()
+        for priority, _d in waiting.items():
+            _d.addCallback(self._consumed, priority).addCallbacks(
+                _received, _failed, callbackArgs=(priority,), errbackArgs=(priority,))
+
+        return d
+
+    def _consumed(self, message, priority):
+        for _priority, queue in self.queues.iteritems():
+            self.metrics[_priority]['depth'] = len(queue.pending)
+
+        metrics = self.metrics[priority]
+        metrics['count'] += 1
+
+        created_at = getCreatedAt(message)
+        if created_at is not None:
+            wait_time = time.time() - created_at
+            metrics['wait_time'] += (wait_time - metrics['wait_time']) * self.wait_time_weight
+
+        return message
+
+    def popPending(self):
+        """Remove and return the messages delivered by the broker and not yet consumed"""
+        pending = []
+        for priority in sorted(self.queues):
+            pending.extend(self.queues[priority].pending)
+            del self.queues[priority].pending[:]
+            self.metrics[priority]['depth'] = 0
+
+        return pending
+
+    def close(self):
+        for queue in self.queues.itervalues():
+            queue.close()
@@ -2,18 +2,23 @@
 import cPickle as pickle
 import logging
 import struct
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from logging.handlers import TimedRotatingFileHandler
 
 from dateutil import parser
 from twisted.internet import defer
 from twisted.internet import reactor
-from txamqp.queue import Closed
+from txamqp.content import Content
+from txamqp.queue import Closed, TimeoutDeferredQueue
 
 from jasmin.managers.configs import SMPPClientPBConfig
 from jasmin.managers.content import SubmitSmRespContent, DeliverSmContent, SubmitSmRespBillContent, DLR
+from jasmin.managers.retrials import RETRIALS_HEADER, getRetrialTier, getRetrialTierName, getRetrials
+from jasmin.managers.throttler import TokenBucket, AIMDRateController
 from jasmin.protocols.smpp.error import *
 from jasmin.protocols.smpp.operations import SMPPOperationFactory
+from jasmin.queues import wire
 from jasmin.routing.Routables import RoutableDeliverSm
 from jasmin.routing.jasminApi import Connector
 from jasmin.vendor.smpp.pdu.operations import SubmitSM, DeliverSM
@@ -38,10 +43,11 @@ class SMPPClientSMListener(object):
         self.RouterPB = RouterPB
         self.interceptorpb_client = interceptorpb_client
         self.submit_sm_q = None
-        self.qos_last_submit_sm_at = None
-        self.rejectTimers = {}
-        self.submit_retrials = {}
+        self.throttler = None
+        self.rateController = None
         self.qosTimer = None
+        self.submit_sm_inflight = 0
+        self.submit_sm_q_paused = False
 
         # Set pickleProtocol
         self.pickleProtocol = SMPPClientPBConfig(self.config.config_file).pickle_protocol
@@ -60,19 +66,10 @@ class SMPPClientSMListener(object):
     def setSubmitSmQ(self, queue):
         self.log.debug('Setting a new submit_sm_q: %s', queue)
         self.submit_sm_q = queue
-
-    def clearRejectTimer(self, msgid):
-        if msgid in self.rejectTimers:
-            timer = self.rejectTimers[msgid]
-            if timer.active():
-                timer.cancel()
-            del self.rejectTimers[msgid]
-
-    def clearRejectTimers(self):
-        for msgid, timer in self.rejectTimers.items():
-            if timer.active():
-                timer.cancel()
-            del self.rejectTimers[msgid]
+        self.SMPPClientFactory.stats.set('priority_lanes', queue.metrics)
+        # New queue is already being consumed (c.f. SMPPClientManagerPB.perspective_connector_start)
+        self.submit_sm_q_paused = False
+        self.clearQosTimer()
 
     def clearQosTimer(self):
         if self.qosTimer is not None and self.qosTimer.called is False:
@@ -81,44 +78,146 @@ class SMPPClientSMListener(object):
 
     def clearAllTimers(self):
         self.clearQosTimer()
-        self.clearRejectTimers()
+
+    @defer.inlineCallbacks
+    def rejectAndRequeuePendingMessages(self):
+        """Requeue messages delivered by the broker and still waiting in submit_sm_q, this
+        happens when consumption is paused by throttling or by a full submit_sm window"""
+        if self.submit_sm_q is None:
+            return
+
+        for message in self.submit_sm_q.popPending():
+            if message is TimeoutDeferredQueue.END:
+                continue
+
+            self.log.debug("Requeuing pending SubmitSmPDU[%s]", message.content.properties['message-id'])
+            yield self.rejectMessage(message, requeue=1)
 
     @defer.inlineCallbacks
     def rejectAndRequeueMessage(self, message, delay=True):
+        """Republish message for a later retrial and ack it, delayed retrials are held by
+        the broker in a retrial tier (c.f. jasmin.managers.retrials)"""
         msgid = message.content.properties['message-id']
 
+        # Count this retrial in a header of the republished message
+        properties = dict(message.content.properties)
+        properties['headers'] = dict(properties.get('headers') or {})
+        properties['headers'][RETRIALS_HEADER] = getRetrials(message) + 1
+        content = Content(message.content.body, properties=properties)
+
         if delay:
             # Use configured requeue_delay or specific one
             if not isinstance(delay, bool):
                 requeue_delay = delay
             else:
                 requeue_delay = self.SMPPClientFactory.config.requeue_delay
+            tier = getRetrialTier(requeue_delay, self.config.submit_retrial_tiers)
 
-            self.log.debug("Requeuing SubmitSmPDU[%s] in %s seconds",
-                           msgid, requeue_delay)
-
-            # Requeue the message with a delay
-            timer = reactor.callLater(requeue_delay,
-                                      self.rejectMessage,
-                                      message=message,
-                                      requeue=1)
-
-            # If any, clear timer before setting a new one
-            self.clearRejectTimer(msgid)
+            self.log.debug("Requeuing SubmitSmPDU[%s] in %s seconds (%s seconds requested)",
+                           msgid, tier, requeue_delay)
 
-            self.rejectTimers[msgid] = timer
-            defer.returnValue(timer)
+            # Message is dead-lettered back to its submit.sm queue once the tier's delay expired
+            yield self.amqpBroker.publish(exchange=getRetrialTierName(tier),
+                                          routing_key=message.routing_key, content=content)
         else:
             self.log.debug("Requeuing SubmitSmPDU[%s] without delay", msgid)
-            yield self.rejectMessage(message, requeue=1)
+            yield self.amqpBroker.publish(exchange='messaging',
+                                          routing_key=message.routing_key, content=content)
+
+        yield self.ackMessage(message)
 
     @defer.inlineCallbacks
     def rejectMessage(self, message, requeue=0):
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=requeue)
+        yield self.amqpBroker.reject(message.delivery_tag, requeue=requeue)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.ack(message.delivery_tag)
+
+    def isSubmitSmWindowFull(self):
+        # submit_sm_window applies to every bound session of the connector, at least one
+        # session is counted so messages keep being consumed (and requeued) while unbound
+        bound_count = 1
+        if hasattr(self.SMPPClientFactory, 'getBoundCount'):
+            bound_count = max(1, self.SMPPClientFactory.getBoundCount())
+        submit_sm_window = self.SMPPClientFactory.config.submit_sm_window * bound_count
+        return submit_sm_window > 0 and self.submit_sm_inflight >= submit_sm_window
+
+    def getThrottler(self):
+        """Return the token bucket throttling submit_sm consumption, None for unlimited throughput"""
+        submit_sm_throughput = self.SMPPClientFactory.config.submit_sm_throughput
+        submit_sm_burst = self.SMPPClientFactory.config.submit_sm_burst
+
+        if submit_sm_throughput <= 0:
+            return None
+
+        if self.config.submit_aimd:
+            # Send at the adapted rate, bounded by submit_sm_throughput
+            if self.rateController is None:
+                self.rateController = AIMDRateController(
+                    submit_sm_throughput,
+                    min_rate=self.config.submit_aimd_min_throughput,
+                    increase=self.config.submit_aimd_increase,
+                    decrease=self.config.submit_aimd_decrease,
+                    latency_factor=self.config.submit_aimd_latency_factor)
+            elif self.rateController.max_rate != submit_sm_throughput:
+                self.rateController.setMaxRate(submit_sm_throughput)
+            submit_sm_throughput = self.rateController.rate
+
+        if self.throttler is None:
+            self.throttler = TokenBucket(submit_sm_throughput, submit_sm_burst)
+        elif self.throttler.rate != submit_sm_throughput or self.throttler.burst != submit_sm_burst:
+            # Connector config were updated
+            self.throttler.setRate(submit_sm_throughput, submit_sm_burst)
+        self.SMPPClientFactory.stats.set('throttling_rate', self.throttler.rate)
+
+        return self.throttler
+
+    def adaptRate(self, r, sent_at):
+        """Feed the rate controller with a submit_sm_resp received for a submit_sm sent at sent_at"""
+        if self.rateController is None:
+            return r
+
+        if r.response.status == CommandStatus.ESME_RTHROTTLED:
+            changed = self.rateController.throttled()
+        else:
+            changed = self.rateController.responded(time.time() - sent_at)
+
+        if changed:
+            self.log.debug('Adapted submit_sm rate of [cid:%s] to %s messages per second',
+                           self.SMPPClientFactory.config.id, self.rateController.rate)
+        return r
+
+    def consumeSubmitSm(self):
+        """Get the next message from submit_sm_q unless the submit_sm window is full, consuming
+        will be resumed by submit_sm_callback once a pending submit_sm is done.
+
+        When submit_sm_throughput is reached, consuming is delayed until a token is available,
+        messages are kept in queue (and in order) instead of being rejected and requeued.
+        """
+        if self.submit_sm_q is None:
+            return
+
+        if self.isSubmitSmWindowFull():
+            self.log.debug('submit_sm window is full (%s pending submit_sm), pausing submit_sm_q consumption',
+                           self.submit_sm_inflight)
+            self.submit_sm_q_paused = True
+            return
+
+        throttler = self.getThrottler()
+        if throttler is not None:
+            qos_slow_down = throttler.getWaitTime()
+            if qos_slow_down > 0:
+                self.log.debug("QoS: submit_sm_throughput (%s) reached, slowing down %ss before consuming.",
+                               throttler.rate, qos_slow_down)
+                stats = self.SMPPClientFactory.stats
+                stats.set('throttling_tokens', throttler.tokens)
+                stats.set('throttling_wait_time', stats.get('throttling_wait_time') + qos_slow_down)
+
+                self.qosTimer = reactor.callLater(qos_slow_down, self.consumeSubmitSm)
+                return
+
+        self.submit_sm_q.get().addCallback(self.submit_sm_callback).addErrback(self.submit_sm_errback)
 
     @defer.inlineCallbacks
     def submit_sm_callback(self, message):
@@ -127,44 +226,22 @@ class SMPPClientSMListener(object):
         c.f. test_amqp.ConsumeTestCase for use cases
         """
         msgid = None
+        self.submit_sm_inflight += 1
         try:
             msgid = message.content.properties['message-id']
-            SubmitSmPDU = pickle.loads(message.content.body)
+            SubmitSmPDU = wire.loads(message.content, message.content.body, wire.loadPDU)
 
-            self.submit_sm_q.get().addCallback(self.submit_sm_callback).addErrback(self.submit_sm_errback)
+            throttler = self.getThrottler()
+            if throttler is not None:
+                throttler.consume()
+                self.SMPPClientFactory.stats.set('throttling_tokens', throttler.tokens)
 
-            self.log.debug("Callbacked a submit_sm with a SubmitSmPDU[%s] (?): %s", msgid, SubmitSmPDU)
+            self.consumeSubmitSm()
 
-            # Update submit_sm retrial tracker
-            if msgid in self.submit_retrials:
-                self.submit_retrials[msgid] += 1
-            else:
-                self.submit_retrials[msgid] = 1
-
-            if self.qos_last_submit_sm_at is None:
-                self.qos_last_submit_sm_at = datetime(1970, 1, 1)
-
-            if self.SMPPClientFactory.config.submit_sm_throughput > 0:
-                # QoS throttling
-                qos_throughput_second = 1 / float(self.SMPPClientFactory.config.submit_sm_throughput)
-                qos_throughput_ysecond_td = timedelta(microseconds=qos_throughput_second * 1000000)
-                qos_delay = datetime.now() - self.qos_last_submit_sm_at
-                if qos_delay < qos_throughput_ysecond_td:
-                    qos_slow_down = float((qos_throughput_ysecond_td - qos_delay).microseconds) / 1000000
-                    # We're faster than submit_sm_throughput,
-                    # slow down before taking a new message from the queue
-                    self.log.debug(
-                        "QoS: submit_sm_callback faster (%s) than throughput (%s), slowing down %ss (requeuing).",
-                        qos_delay, qos_throughput_ysecond_td, qos_slow_down)
-
-                    # Relaunch queue callbacking after qos_slow_down seconds
-                    # self.qosTimer = task.deferLater(reactor, qos_slow_down, self.submit_sm_q.get)
-                    # self.qosTimer.addCallback(self.submit_sm_callback).addErrback(self.submit_sm_errback)
-                    # Requeue the message
-                    yield self.rejectAndRequeueMessage(message, delay=qos_slow_down)
-                    defer.returnValue(False)
+            self.log.debug("Callbacked a submit_sm with a SubmitSmPDU[%s] (?): %s", msgid, SubmitSmPDU)
 
-                self.qos_last_submit_sm_at = datetime.now()
+            # Number of this submit_sm attempt
+            submit_retrials = getRetrials(message) + 1
 
             # Verify if message is a SubmitSm PDU
             if isinstance(SubmitSmPDU, SubmitSM) is False:
@@ -181,14 +258,15 @@ class SMPPClientSMListener(object):
                         "Discarding expired message[%s]: expiration is %s", msgid, expiration_datetime)
                     yield self.rejectMessage(message)
                     defer.returnValue(False)
-            # SMPP Client should be already connected
-            if self.SMPPClientFactory.smpp is None:
+            # SMPP Client should be already connected, smpp is the least busy of the bound sessions
+            smpp = self.SMPPClientFactory.smpp
+            if smpp is None:
                 created_at = parser.parse(message.content.properties['headers']['created_at'])
                 msgAge = datetime.now() - created_at
                 if msgAge.seconds > self.config.submit_max_age_smppc_not_ready:
                     self.log.error(
                         "SMPPC [cid:%s] is not connected: Discarding (#%s) SubmitSmPDU[%s], over-aged %s seconds.",
-                        self.SMPPClientFactory.config.id, self.submit_retrials[msgid],
+                        self.SMPPClientFactory.config.id, submit_retrials,
                         msgid, msgAge.seconds)
                     yield self.rejectMessage(message)
                     defer.returnValue(False)
@@ -199,19 +277,19 @@ class SMPPClientSMListener(object):
                         delay_str = ''
                     self.log.error(
                         "SMPPC [cid:%s] is not connected: Requeuing (#%s) SubmitSmPDU[%s]%s, aged %s seconds.",
-                        self.SMPPClientFactory.config.id, self.submit_retrials[msgid],
+                        self.SMPPClientFactory.config.id, submit_retrials,
                         msgid, delay_str, msgAge.seconds)
                     yield self.rejectAndRequeueMessage(message,
                                                        delay=self.config.submit_retrial_delay_smppc_not_ready)
                     defer.returnValue(False)
             # SMPP Client should be already bound as transceiver or transmitter
-            if self.SMPPClientFactory.smpp.isBound() is False:
+            if smpp.isBound() is False:
                 created_at = parser.parse(message.content.properties['headers']['created_at'])
                 msgAge = datetime.now() - created_at
                 if msgAge.seconds > self.config.submit_max_age_smppc_not_ready:
                     self.log.error(
                         "SMPPC [cid:%s] is not bound: Discarding (#%s) SubmitSmPDU[%s], over-aged %s seconds.",
-                        self.SMPPClientFactory.config.id, self.submit_retrials[msgid],
+                        self.SMPPClientFactory.config.id, submit_retrials,
                         msgid, msgAge.seconds)
                     yield self.rejectMessage(message)
                     defer.returnValue(False)
@@ -221,7 +299,7 @@ class SMPPClientSMListener(object):
                     else:
                         delay_str = ''
                     self.log.error("SMPPC [cid:%s] is not bound: Requeuing (#%s) SubmitSmPDU[%s]%s, aged %s seconds.",
-                                   self.SMPPClientFactory.config.id, self.submit_retrials[msgid],
+                                   self.SMPPClientFactory.config.id, submit_retrials,
                                    msgid, delay_str, msgAge)
                     yield self.rejectAndRequeueMessage(
                         message, delay=self.config.submit_retrial_delay_smppc_not_ready)
@@ -230,7 +308,8 @@ class SMPPClientSMListener(object):
             # Finally: send the sms !
             self.log.debug("Sending SubmitSmPDU[%s] through SMPPClientFactory [cid:%s]",
                            msgid, self.SMPPClientFactory.config.id)
-            d = self.SMPPClientFactory.smpp.sendDataRequest(SubmitSmPDU)
+            d = smpp.sendDataRequest(SubmitSmPDU)
+            d.addCallback(self.adaptRate, time.time())
             d.addCallback(self.submit_sm_resp_event, message)
             yield d
         except SMPPRequestTimoutError:
@@ -248,6 +327,12 @@ class SMPPClientSMListener(object):
                               msgid, self.SMPPClientFactory.config.id, type(e), e)
             self.rejectMessage(message)
             defer.returnValue(False)
+        finally:
+            # This submit_sm is done (responded, requeued or rejected)
+            self.submit_sm_inflight -= 1
+            if self.submit_sm_q_paused:
+                self.submit_sm_q_paused = False
+                self.consumeSubmitSm()
 
     @defer.inlineCallbacks
     def submit_sm_resp_event(self, r, amqpMessage):
@@ -256,13 +341,11 @@ class SMPPClientSMListener(object):
         will_be_retried = False
 
         try:
-            submit_sm_resp_bill = pickle.loads(
-                amqpMessage.content.properties['headers']['submit_sm_bill']).getSubmitSmRespBill()
+            submit_sm_resp_bill = wire.loads(
+                amqpMessage.content, amqpMessage.content.properties['headers']['submit_sm_bill'],
+                wire.loadBill).getSubmitSmRespBill()
 
             if r.response.status == CommandStatus.ESME_ROK:
-                # No more retrials !
-                del self.submit_retrials[msgid]
-
                 # Get bill information
                 total_bill_amount = 0.0
                 if submit_sm_resp_bill is not None and submit_sm_resp_bill.getTotalAmounts() > 0:
@@ -325,13 +408,10 @@ class SMPPClientSMListener(object):
                     retrial = self.config.submit_error_retrial[str(r.response.status)]
 
                     # Still have some retries to go ?
-                    if self.submit_retrials[msgid] < retrial['count']:
+                    if getRetrials(amqpMessage) + 1 < retrial['count']:
                         # Requeue the message for later redelivery
                         yield self.rejectAndRequeueMessage(amqpMessage, delay=retrial['delay'])
                         will_be_retried = True
-                    else:
-                        # Prevent this list from over-growing
-                        del self.submit_retrials[msgid]
 
                 # Log the message
                 self.log.info(
@@ -352,9 +432,6 @@ class SMPPClientSMListener(object):
 
             # It is a final submit_sm_resp !
             if not will_be_retried:
-                # Cancel any mapped rejectTimer to this message
-                # (in case this message was rejected in the past)
-                self.clearRejectTimer(msgid)
                 self.log.debug("ACKing amqpMessage [%s] having routing_key [%s]",
                                msgid, amqpMessage.routing_key)
                 # ACK the message in queue, this will remove it from the queue
@@ -593,7 +670,8 @@ class SMPPClientSMListener(object):
             content = DeliverSmContent(routable,
                                        self.SMPPClientFactory.config.id,
                                        pickleProtocol=self.pickleProtocol,
-                                       concatenated=concatenated)
+                                       concatenated=concatenated,
+                                       compact=self.amqpBroker.config.wire_format == 'compact')
             msgid = content.properties['message-id']
 
             if routable.pdu.dlr is None:
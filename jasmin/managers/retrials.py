@@ -0,0 +1,49 @@
+"""
+Broker side delayed retrials of submit_sm
+
+A submit_sm to be retried is republished to the retrial tier matching its delay: a fanout
+exchange and a queue having the tier's delay as message TTL and dead-lettering expired
+messages back to the 'messaging' exchange, they are then routed with their original routing
+key to the submit.sm lane they came from.
+
+The number of retrials is kept in the message's submit_retrials header, delayed messages
+are held by the broker: they survive a restart of Jasmin and do not grow its memory.
+"""
+
+from twisted.internet import defer
+
+RETRIALS_HEADER = 'submit_retrials'
+
+
+def getRetrialTier(delay, tiers):
+    """Return the shortest tier (seconds) lasting at least delay, the longest tier if none"""
+    tiers = sorted(tiers)
+    for tier in tiers:
+        if tier >= delay:
+            return tier
+    return tiers[-1]
+
+
+def getRetrialTierName(tier):
+    """Return the exchange and queue name of a retrial tier"""
+    return 'submit.sm.retrial.%ss' % tier
+
+
+def getRetrials(message):
+    """Return the number of times message was already retried"""
+    try:
+        return int(message.content.properties['headers'].get(RETRIALS_HEADER, 0))
+    except (AttributeError, KeyError):
+        return 0
+
+
+@defer.inlineCallbacks
+def declareRetrialTiers(amqpBroker, tiers):
+    """Declare the retrial tiers (has no effect if they are already declared)"""
+    for tier in tiers:
+        name = getRetrialTierName(tier)
+        yield amqpBroker.chan.exchange_declare(exchange=name, type='fanout')
+        yield amqpBroker.named_queue_declare(
+            queue=name,
+            arguments={'x-message-ttl': int(tier * 1000), 'x-dead-letter-exchange': 'messaging'})
+        yield amqpBroker.chan.queue_bind(queue=name, exchange=name)
@@ -0,0 +1,39 @@
+from jasmin.tools.singleton import Singleton
+from jasmin.tools.stats import Stats
+
+class DLRLookupStatistics(Stats):
+    "DLRLookup statistics holder"
+
+    def __init__(self, lookup_id):
+        self.lookup_id = lookup_id
+
+        self.init()
+
+    def init(self):
+        self._stats = {
+            'created_at': 0,
+            # deliver_sm receipts lookups (queue-msgid then dlr map resolution)
+            'deliver_sm_lookup_count': 0,
+            'deliver_sm_lookup_not_found_count': 0,
+            'deliver_sm_lookup_error_count': 0,
+            # Cumulated and maximum lookup latency, in microseconds
+            'deliver_sm_lookup_time': 0,
+            'deliver_sm_lookup_max_time': 0,
+            'last_deliver_sm_lookup_at': 0,
+        }
+
+    def getStats(self):
+        return self._stats
+
+class DLRLookupStatsCollector(object):
+    "DLRLookup statistics collection holder"
+    __metaclass__ = Singleton
+    lookups = {}
+
+    def get(self):
+        "Return a DLRLookup's stats object or instanciate a new one"
+        lookup_id = 'main'
+        if lookup_id not in self.lookups:
+            self.lookups[lookup_id] = DLRLookupStatistics(lookup_id)
+
+        return self.lookups[lookup_id]
@@ -0,0 +1,210 @@
+"""
+Test cases for DLRLookup's deliver_sm receipts resolution
+"""
+
+import mock
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from jasmin.managers.configs import DLRLookupConfig
+from jasmin.managers.dlr import DLRLookup, DLR_RESOLUTION_SCRIPT, isLastReceipt
+from jasmin.managers.stats import DLRLookupStatsCollector
+from jasmin.vendor.txredisapi import ResponseError
+
+
+class FakeRedis(object):
+    "In memory redis hashes, without lua scripting"
+    connected = 1
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+
+    def hgetall(self, key):
+        return defer.succeed(dict(self.hashes.get(key, {})))
+
+    def delete(self, key):
+        return defer.succeed(1 if self.hashes.pop(key, None) is not None else 0)
+
+
+class FakeAmqpBroker(object):
+    def __init__(self):
+        self.chan = mock.Mock()
+        self.chan.exchange_declare.return_value = defer.Deferred()
+        self.publish = mock.Mock(return_value=defer.succeed(None))
+        self.ack = mock.Mock(return_value=defer.succeed(None))
+        self.reject = mock.Mock(return_value=defer.succeed(None))
+
+
+def hashToList(values):
+    return [item for k, v in values.iteritems() for item in (k, v)]
+
+
+class DLRLookupTestCase(TestCase):
+    def setUp(self):
+        self.stats = DLRLookupStatsCollector().get()
+        self.stats.init()
+
+        self.amqpBroker = FakeAmqpBroker()
+        self.redisClient = FakeRedis({})
+        self.dlrlookup = DLRLookup(DLRLookupConfig(), self.amqpBroker, self.redisClient)
+
+    def setMaps(self, dlr, smpp_msgid='0a1b2c', msgid='4a843ce6'):
+        self.redisClient.hashes['queue-msgid:%s' % smpp_msgid] = {'msgid': msgid, 'connector_type': dlr['sc']}
+        self.redisClient.hashes['dlr:%s' % msgid] = dlr
+
+    def getHttpMap(self, level=2):
+        return {'sc': 'httpapi', 'url': 'http://127.0.0.1/dlr', 'level': level, 'method': 'POST', 'expiry': 86400}
+
+    def getSmppsMap(self, rd_receipt='SMSC_DELIVERY_RECEIPT_REQUESTED'):
+        return {'sc': 'smppsapi', 'system_id': 'user1', 'source_addr_ton': 1, 'source_addr_npi': 1,
+                'source_addr': '21698700177', 'dest_addr_ton': 1, 'dest_addr_npi': 1,
+                'destination_addr': '21698700178', 'sub_date': '2017-01-01 10:00:00',
+                'rd_receipt': rd_receipt, 'expiry': 86400}
+
+    def getMessage(self, status, smpp_msgid='0a1b2c'):
+        message = mock.Mock()
+        message.content.properties = {
+            'message-id': smpp_msgid,
+            'headers': {'cid': 'abc', 'dlr_id': smpp_msgid, 'dlr_ddate': '1701011200', 'dlr_sdate': '1701011200',
+                        'dlr_sub': '001', 'dlr_err': '000', 'dlr_text': '', 'dlr_dlvrd': '001'}}
+        message.content.body = status
+        return message
+
+
+class ReceiptTestCase(DLRLookupTestCase):
+    def test_is_last_receipt(self):
+        self.assertFalse(isLastReceipt(self.getHttpMap(level=1), 'DELIVRD'))
+        self.assertTrue(isLastReceipt(self.getHttpMap(level=2), 'ACCEPTD'))
+        self.assertTrue(isLastReceipt(self.getHttpMap(level=3), 'UNDELIV'))
+
+        self.assertTrue(isLastReceipt(self.getSmppsMap(), 'DELIVRD'))
+        self.assertFalse(isLastReceipt(self.getSmppsMap(), 'ACCEPTD'))
+        self.assertTrue(isLastReceipt(self.getSmppsMap('SMSC_DELIVERY_RECEIPT_REQUESTED_FOR_FAILURE'), 'UNDELIV'))
+        self.assertFalse(isLastReceipt(self.getSmppsMap('SMSC_DELIVERY_RECEIPT_REQUESTED_FOR_FAILURE'), 'DELIVRD'))
+        self.assertFalse(isLastReceipt(self.getSmppsMap('NO_SMSC_DELIVERY_RECEIPT_REQUESTED'), 'DELIVRD'))
+
+
+class FallbackTestCase(DLRLookupTestCase):
+    "Receipts are resolved step by step when redis cannot run lua scripts"
+
+    @defer.inlineCallbacks
+    def test_http_receipt(self):
+        self.setMaps(self.getHttpMap())
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.assertFalse(self.dlrlookup.lua_scripting)
+        self.assertEqual(self.amqpBroker.publish.call_count, 1)
+        self.assertEqual(self.amqpBroker.ack.call_count, 1)
+        self.assertFalse('dlr:4a843ce6' in self.redisClient.hashes)
+        self.assertEqual(self.stats.get('deliver_sm_lookup_count'), 1)
+        self.assertEqual(self.stats.get('deliver_sm_lookup_not_found_count'), 0)
+
+    @defer.inlineCallbacks
+    def test_smpps_receipts(self):
+        "SMPPs dlr map is kept until a final receipt"
+        self.setMaps(self.getSmppsMap())
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('ACCEPTD'))
+        self.assertEqual(self.amqpBroker.publish.call_count, 1)
+        self.assertTrue('dlr:4a843ce6' in self.redisClient.hashes)
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+        self.assertEqual(self.amqpBroker.publish.call_count, 2)
+        self.assertFalse('dlr:4a843ce6' in self.redisClient.hashes)
+
+    @defer.inlineCallbacks
+    def test_connector_type_mismatch(self):
+        self.setMaps(self.getHttpMap())
+        self.redisClient.hashes['queue-msgid:0a1b2c']['connector_type'] = 'smppsapi'
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.assertEqual(self.amqpBroker.publish.call_count, 0)
+        self.assertEqual(self.amqpBroker.reject.call_count, 1)
+        self.assertTrue('dlr:4a843ce6' in self.redisClient.hashes)
+
+    @defer.inlineCallbacks
+    def test_not_found(self):
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.redisClient.hashes['queue-msgid:0a1b2c'] = {'msgid': '4a843ce6', 'connector_type': 'httpapi'}
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.assertEqual(self.amqpBroker.publish.call_count, 0)
+        self.assertEqual(self.amqpBroker.reject.call_count, 2)
+        self.assertEqual(self.stats.get('deliver_sm_lookup_count'), 2)
+        self.assertEqual(self.stats.get('deliver_sm_lookup_not_found_count'), 2)
+
+    @defer.inlineCallbacks
+    def test_unknown_command(self):
+        "Redis versions prior to 2.6 cannot run lua scripts"
+        self.setMaps(self.getHttpMap())
+        self.redisClient.run_script = mock.Mock(
+            return_value=defer.fail(ResponseError("unknown command 'EVALSHA'")))
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.assertFalse(self.dlrlookup.lua_scripting)
+        self.assertEqual(self.amqpBroker.publish.call_count, 1)
+        self.assertFalse('dlr:4a843ce6' in self.redisClient.hashes)
+
+
+class ScriptTestCase(DLRLookupTestCase):
+    "dlr maps are resolved in one call through DLR_RESOLUTION_SCRIPT"
+
+    def setUp(self):
+        DLRLookupTestCase.setUp(self)
+
+        self.redisClient.delete = mock.Mock(side_effect=AssertionError('delete must not be called'))
+        self.redisClient.run_script = mock.Mock()
+
+    def setReply(self, q, dlr):
+        if len(q) > 0:
+            self.redisClient.hashes['queue-msgid:0a1b2c'] = q
+        self.redisClient.run_script.side_effect = lambda *args, **kwargs: defer.succeed(hashToList(dlr))
+
+    @defer.inlineCallbacks
+    def test_http_receipt(self):
+        self.setReply({'msgid': '4a843ce6', 'connector_type': 'httpapi'}, self.getHttpMap())
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.redisClient.run_script.assert_called_once_with(
+            DLR_RESOLUTION_SCRIPT, keys=['dlr:4a843ce6'], args=['httpapi', '1', '1'])
+        self.assertTrue(self.dlrlookup.lua_scripting)
+        self.assertEqual(self.amqpBroker.publish.call_count, 1)
+        self.assertEqual(self.amqpBroker.publish.call_args[1]['content']['headers']['url'], 'http://127.0.0.1/dlr')
+        self.assertEqual(self.amqpBroker.ack.call_count, 1)
+
+    @defer.inlineCallbacks
+    def test_receipt_states(self):
+        self.setReply({'msgid': '4a843ce6', 'connector_type': 'smppsapi'}, self.getSmppsMap())
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('ACCEPTD'))
+        self.assertEqual(self.redisClient.run_script.call_args[1]['args'], ['smppsapi', '1', '0'])
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('UNDELIV'))
+        self.assertEqual(self.redisClient.run_script.call_args[1]['args'], ['smppsapi', '0', '1'])
+        self.assertEqual(self.amqpBroker.publish.call_count, 2)
+
+    @defer.inlineCallbacks
+    def test_not_found(self):
+        self.setReply({}, {})
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.assertEqual(self.redisClient.run_script.call_count, 0)
+        self.assertEqual(self.amqpBroker.reject.call_count, 1)
+        self.assertEqual(self.stats.get('deliver_sm_lookup_not_found_count'), 1)
+
+    @defer.inlineCallbacks
+    def test_lookup_error(self):
+        self.setReply({'msgid': '4a843ce6', 'connector_type': 'httpapi'}, {})
+        self.redisClient.run_script.side_effect = None
+        self.redisClient.run_script.return_value = defer.fail(ResponseError('ERR Error running script'))
+
+        yield self.dlrlookup.deliver_sm_dlr_callback(self.getMessage('DELIVRD'))
+
+        self.assertTrue(self.dlrlookup.lua_scripting)
+        self.assertEqual(self.amqpBroker.reject.call_count, 1)
+        self.assertEqual(self.stats.get('deliver_sm_lookup_error_count'), 1)
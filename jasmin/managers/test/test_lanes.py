@@ -0,0 +1,92 @@
+"""
+Test cases for submit.sm priority lanes
+"""
+
+import datetime
+
+import mock
+from twisted.trial.unittest import TestCase
+from txamqp.queue import Closed, TimeoutDeferredQueue
+
+from jasmin.managers.lanes import PRIORITIES, SubmitSmLanes, getLaneName, getLanePrefetchCount
+
+
+class SubmitSmLanesTestCase(TestCase):
+
+    def setUp(self):
+        self.queues = dict((priority, TimeoutDeferredQueue()) for priority in PRIORITIES)
+        self.lanes = SubmitSmLanes(self.queues, {0: 1, 1: 2, 2: 4, 3: 8})
+
+    def getMessage(self, priority, created_at=None):
+        message = mock.Mock()
+        message.priority = priority
+        message.content.properties = {'headers': {}}
+        if created_at is not None:
+            message.content.properties['headers']['created_at'] = str(created_at)
+        return message
+
+    def consume(self, count):
+        priorities = []
+        for _ in range(count):
+            self.lanes.get().addCallback(lambda message: priorities.append(message.priority))
+        return priorities
+
+    def test_lane_name(self):
+        self.assertEqual('submit.sm.abc', getLaneName('submit.sm.abc', 0))
+        self.assertEqual('submit.sm.abc.p3', getLaneName('submit.sm.abc', 3))
+
+    def test_lane_prefetch_count(self):
+        self.assertEqual(0, getLanePrefetchCount(0))
+        self.assertEqual(5, getLanePrefetchCount(20))
+        self.assertEqual(1, getLanePrefetchCount(2))
+
+    def test_weighted_consumption(self):
+        for _ in range(20):
+            self.queues[0].put(self.getMessage(0))
+            self.queues[3].put(self.getMessage(3))
+
+        # Backlogged lanes are consumed in proportion to their weights
+        priorities = self.consume(18)
+        self.assertEqual(16, priorities.count(3))
+        self.assertEqual(2, priorities.count(0))
+
+        # Empty lanes are skipped
+        self.assertEqual([0] * 18, self.consume(22)[4:])
+
+    def test_wait_for_any_lane(self):
+        d = self.lanes.get()
+        self.assertFalse(d.called)
+
+        self.queues[2].put(self.getMessage(2))
+        self.assertEqual(2, self.successResultOf(d).priority)
+
+        # Other lanes are not waited for anymore
+        for queue in self.queues.values():
+            self.assertEqual([], queue.waiting)
+
+        self.queues[1].put(self.getMessage(1))
+        self.assertEqual([1], [m.priority for m in self.queues[1].pending])
+
+    def test_close(self):
+        d = self.lanes.get()
+        self.lanes.close()
+
+        self.failureResultOf(d, Closed)
+
+    def test_metrics(self):
+        self.queues[1].put(self.getMessage(1, datetime.datetime.now() - datetime.timedelta(seconds=10)))
+        self.queues[1].put(self.getMessage(1))
+        self.queues[3].put(self.getMessage(3))
+
+        self.consume(1)
+        self.assertEqual({'depth': 0, 'count': 1, 'wait_time': 0}, self.lanes.metrics[3])
+        self.assertEqual(2, self.lanes.metrics[1]['depth'])
+
+        self.consume(1)
+        self.assertEqual(1, self.lanes.metrics[1]['depth'])
+        self.assertEqual(1, self.lanes.metrics[1]['count'])
+        self.assertAlmostEqual(1, self.lanes.metrics[1]['wait_time'], places=1)
+
+        # Messages not yet consumed are given back
+        self.assertEqual([1], [m.priority for m in self.lanes.popPending()])
+        self.assertEqual(0, self.lanes.metrics[1]['depth'])
@@ -0,0 +1,90 @@
+"""
+Test cases for broker side delayed retrials of submit_sm
+"""
+
+import mock
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from jasmin.managers.configs import SMPPClientSMListenerConfig
+from jasmin.managers.listeners import SMPPClientSMListener
+from jasmin.managers.retrials import (RETRIALS_HEADER, declareRetrialTiers, getRetrialTier,
+                                      getRetrialTierName, getRetrials)
+from jasmin.protocols.smpp.configs import SMPPClientConfig
+
+
+class RetrialTiersTestCase(TestCase):
+
+    def test_tier(self):
+        tiers = [60, 1, 10]
+        self.assertEqual(1, getRetrialTier(0, tiers))
+        self.assertEqual(10, getRetrialTier(10, tiers))
+        self.assertEqual(60, getRetrialTier(11, tiers))
+        # Longer delays are capped to the longest tier
+        self.assertEqual(60, getRetrialTier(3600, tiers))
+
+    def test_declare(self):
+        amqpBroker = mock.Mock()
+        declareRetrialTiers(amqpBroker, [1, 30])
+
+        amqpBroker.named_queue_declare.assert_called_with(
+            queue=getRetrialTierName(30),
+            arguments={'x-message-ttl': 30000, 'x-dead-letter-exchange': 'messaging'})
+        amqpBroker.chan.queue_bind.assert_called_with(queue='submit.sm.retrial.30s',
+                                                      exchange='submit.sm.retrial.30s')
+        self.assertEqual(2, amqpBroker.chan.exchange_declare.call_count)
+
+
+class RejectAndRequeueMessageTestCase(TestCase):
+
+    def setUp(self):
+        self.amqpBroker = mock.Mock()
+        self.amqpBroker.publish.return_value = defer.succeed(None)
+        self.amqpBroker.ack.return_value = defer.succeed(None)
+
+        SMPPClientFactory = mock.Mock()
+        SMPPClientFactory.config = SMPPClientConfig(id='test', requeue_delay=120)
+        self.listener = SMPPClientSMListener(SMPPClientSMListenerConfig(), SMPPClientFactory,
+                                             self.amqpBroker, None)
+
+    def getMessage(self, headers):
+        message = mock.Mock()
+        message.routing_key = 'submit.sm.test.p2'
+        message.delivery_tag = 1
+        message.content.body = 'PDU'
+        message.content.properties = {'message-id': 'msgid', 'priority': 2, 'headers': headers}
+        return message
+
+    def getPublished(self):
+        return self.amqpBroker.publish.call_args[1]
+
+    def test_delayed(self):
+        message = self.getMessage({'created_at': 'now'})
+        self.listener.rejectAndRequeueMessage(message, delay=25)
+
+        published = self.getPublished()
+        self.assertEqual(getRetrialTierName(30), published['exchange'])
+        self.assertEqual('submit.sm.test.p2', published['routing_key'])
+        self.assertEqual('PDU', published['content'].body)
+        self.assertEqual(2, published['content'].properties['priority'])
+        self.assertEqual({'created_at': 'now', RETRIALS_HEADER: 1},
+                         published['content'].properties['headers'])
+        self.amqpBroker.ack.assert_called_once_with(1)
+
+        # Original message is left unchanged
+        self.assertEqual(0, getRetrials(message))
+
+    def test_requeue_delay(self):
+        self.listener.rejectAndRequeueMessage(self.getMessage({RETRIALS_HEADER: 2}))
+
+        published = self.getPublished()
+        self.assertEqual(getRetrialTierName(120), published['exchange'])
+        self.assertEqual(3, getRetrials(mock.Mock(content=published['content'])))
+
+    def test_without_delay(self):
+        self.listener.rejectAndRequeueMessage(self.getMessage({}), delay=False)
+
+        published = self.getPublished()
+        self.assertEqual('messaging', published['exchange'])
+        self.assertEqual('submit.sm.test.p2', published['routing_key'])
+        self.amqpBroker.reject.assert_not_called()
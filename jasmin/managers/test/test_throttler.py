@@ -0,0 +1,122 @@
+"""
+Test cases for submit_sm throttling
+"""
+
+import mock
+from twisted.trial.unittest import TestCase
+
+from jasmin.managers import throttler
+from jasmin.managers.throttler import TokenBucket, AIMDRateController
+
+
+class TokenBucketTestCase(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.patcher = mock.patch.object(throttler.time, 'time', side_effect=lambda: self.now)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_strict_rate(self):
+        bucket = TokenBucket(2)
+
+        self.assertEqual(bucket.getWaitTime(), 0)
+        bucket.consume()
+        self.assertEqual(bucket.getWaitTime(), 0.5)
+
+        self.now += 0.25
+        self.assertEqual(bucket.getWaitTime(), 0.25)
+        self.now += 0.25
+        self.assertEqual(bucket.getWaitTime(), 0)
+
+        # Tokens are capped to burst
+        self.now += 10
+        self.assertEqual(bucket.getTokens(), 1)
+
+    def test_burst(self):
+        bucket = TokenBucket(10, burst=5)
+
+        for _ in range(5):
+            self.assertEqual(bucket.getWaitTime(), 0)
+            bucket.consume()
+        self.assertAlmostEqual(bucket.getWaitTime(), 0.1)
+
+    def test_fractional_rate(self):
+        bucket = TokenBucket(0.5)
+        bucket.consume()
+
+        self.assertEqual(bucket.getWaitTime(), 2)
+        self.now += 1.5
+        self.assertEqual(bucket.getWaitTime(), 0.5)
+
+    def test_set_rate(self):
+        bucket = TokenBucket(1, burst=3)
+        bucket.consume()
+        bucket.consume()
+
+        bucket.setRate(4, burst=3)
+        self.assertEqual(bucket.getTokens(), 1)
+        bucket.consume()
+        self.assertEqual(bucket.getWaitTime(), 0.25)
+
+        bucket.setRate(4, burst=1)
+        self.assertEqual(bucket.getTokens(), 0)
+
+
+class AIMDRateControllerTestCase(TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.patcher = mock.patch.object(throttler.time, 'time', side_effect=lambda: self.now)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_multiplicative_decrease(self):
+        controller = AIMDRateController(10, min_rate=2)
+
+        self.assertTrue(controller.throttled())
+        self.assertEqual(controller.rate, 5)
+
+        # Throttling responses of the same second are ignored
+        self.assertFalse(controller.throttled())
+        self.assertEqual(controller.rate, 5)
+
+        self.now += 1
+        controller.throttled()
+        self.now += 1
+        controller.throttled()
+        self.assertEqual(controller.rate, 2)
+
+    def test_additive_increase(self):
+        controller = AIMDRateController(10, increase=2)
+        controller.throttled()
+
+        self.assertFalse(controller.responded(0.1))
+        self.now += 1
+        self.assertTrue(controller.responded(0.1))
+        self.assertEqual(controller.rate, 7)
+
+        # Rate is bounded by max_rate
+        for _ in range(5):
+            self.now += 1
+            controller.responded(0.1)
+        self.assertEqual(controller.rate, 10)
+
+        controller.setMaxRate(4)
+        self.assertEqual(controller.rate, 4)
+
+    def test_latency_growth(self):
+        controller = AIMDRateController(10, latency_factor=3)
+        for _ in range(5):
+            self.now += 1
+            controller.responded(0.1)
+        self.assertEqual(controller.rate, 10)
+
+        # Response times average reaches 3 times its best value
+        self.assertFalse(controller.responded(1.0))
+        self.assertTrue(controller.responded(1.0))
+        self.assertEqual(controller.rate, 5)
@@ -0,0 +1,117 @@
+import time
+
+
+class TokenBucket(object):
+    """A token bucket throttler
+
+    Tokens are added at rate tokens per second (rate may be fractional) and are capped to burst,
+    a full bucket allows sending burst messages at once.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.time()
+
+    def refill(self):
+        now = time.time()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def setRate(self, rate, burst=1):
+        """Change rate and burst, already accumulated tokens are kept"""
+        self.refill()
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = min(float(self.burst), self.tokens)
+
+    def getTokens(self):
+        self.refill()
+        return self.tokens
+
+    def getWaitTime(self, tokens=1):
+        """Return the time (in seconds) to wait before tokens become available"""
+        self.refill()
+        if self.tokens >= tokens:
+            return 0
+
+        return (tokens - self.tokens) / self.rate
+
+    def consume(self, tokens=1):
+        self.refill()
+        self.tokens -= tokens
+
+
+class AIMDRateController(object):
+    """Additive increase, multiplicative decrease (AIMD) of a submit_sm rate
+
+    The rate is multiplied by decrease when the SMSC throttles (ESME_RTHROTTLED) or when the
+    response time average grows over latency_factor times its best known value, it is raised by
+    increase every second of healthy responses; it always stays between min_rate and max_rate.
+    """
+
+    # Weight of the last response time in the response time average
+    latency_weight = 0.2
+    # Response times under this value (in seconds) are not considered as growing
+    min_latency = 0.05
+
+    def __init__(self, max_rate, min_rate=0.1, increase=1.0, decrease=0.5, latency_factor=0):
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+
+        self.rate = self.max_rate
+        self.latency = None
+        self.best_latency = None
+        self.decreased_at = 0
+        self.increased_at = time.time()
+
+    def setMaxRate(self, max_rate):
+        """Change the rate upper bound, the current rate is capped to it"""
+        self.max_rate = float(max_rate)
+        self.min_rate = min(self.min_rate, self.max_rate)
+        self.rate = min(self.rate, self.max_rate)
+
+    def slowDown(self):
+        """Decrease the rate, at most once per second since the responses of submit_sm sent
+        before a decrease are still reporting the former rate"""
+        now = time.time()
+        if now - self.decreased_at < 1:
+            return False
+
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.decreased_at = self.increased_at = now
+        return True
+
+    def throttled(self):
+        """Called when the SMSC throttled a submit_sm, returns True if the rate was changed"""
+        return self.slowDown()
+
+    def responded(self, latency):
+        """Called when a submit_sm was responded in latency seconds without being throttled,
+        returns True if the rate was changed"""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += (latency - self.latency) * self.latency_weight
+
+        if self.best_latency is None or self.latency < self.best_latency:
+            self.best_latency = self.latency
+        else:
+            # Slowly follow response times so a lasting change is not taken for a congestion
+            self.best_latency += (self.latency - self.best_latency) * self.latency_weight / 10
+
+        if (self.latency_factor > 0 and
+                self.latency > max(self.best_latency, self.min_latency) * self.latency_factor):
+            return self.slowDown()
+
+        now = time.time()
+        if self.rate < self.max_rate and now - self.increased_at >= 1:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.increased_at = now
+            return True
+
+        return False
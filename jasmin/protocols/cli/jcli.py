@@ -429,7 +429,11 @@ class JCliProtocol(CmdProtocol):
               make_option(None, '--httpapi', action="store_true",
                           help="Show HTTP API stats"),
               make_option(None, '--smppsapi', action="store_true",
-                          help="Show SMPP Server API stats")], '')
+                          help="Show SMPP Server API stats"),
+              make_option(None, '--throwers', action="store_true",
+                          help="Show http throwers circuit breakers stats"),
+              make_option(None, '--dlrlookup', action="store_true",
+                          help="Show DLR lookup stats")], '')
     def do_stats(self, arg, opts=None):
         'Stats management'
 
@@ -445,5 +449,9 @@ class JCliProtocol(CmdProtocol):
             self.managers['stats'].httpapi(arg, opts)
         elif opts.smppsapi:
             self.managers['stats'].smppsapi(arg, opts)
+        elif opts.throwers:
+            self.managers['stats'].throwers(arg, opts)
+        elif opts.dlrlookup:
+            self.managers['stats'].dlrlookup(arg, opts)
         else:
             return self.sendData('Missing required option')
@@ -1,8 +1,11 @@
 import cPickle as pickle
 import json
+from datetime import datetime
 from jasmin.protocols.cli.managers import Manager
 from jasmin.protocols.smpp.stats import SMPPClientStatsCollector, SMPPServerStatsCollector
 from jasmin.protocols.http.stats import HttpAPIStatsCollector
+from jasmin.managers.stats import DLRLookupStatsCollector
+from jasmin.routing.stats import ThrowerStatsCollector
 from .usersm import UserExist
 from .smppccm import ConnectorExist
 from jasmin.vendor.tabulate import tabulate
@@ -97,8 +100,37 @@ class StatsManager(Manager):
 
             table.append(row)
 
+        sessions = sc.get(opts.smppc).sessions
+        if len(sessions) <= 1:
+            self.protocol.sendData(
+                tabulate(table, headers, tablefmt="plain", numalign="left").encode('ascii'))
+            return
+
         self.protocol.sendData(
-            tabulate(table, headers, tablefmt="plain", numalign="left").encode('ascii'))
+            tabulate(table, headers, tablefmt="plain", numalign="left").encode('ascii'), prompt=False)
+
+        # Connector having many sessions (bind_count > 1): show each session stats
+        headers = ["#Session", "Connected at", "Bound at", "Disconnected at",
+                   "Submits", "Delivers", "QoS errs", "Other errs"]
+
+        table = []
+        for session in sorted(sessions):
+            stats = sessions[session]
+            row = []
+            row.append('#%s' % session)
+            row.append(formatDateTime(stats.get('connected_at')))
+            row.append(formatDateTime(stats.get('bound_at')))
+            row.append(formatDateTime(stats.get('disconnected_at')))
+            row.append('%s/%s' % (stats.get('submit_sm_request_count'), stats.get('submit_sm_count')))
+            row.append('%s/%s' % (stats.get('deliver_sm_count'), stats.get('data_sm_count')))
+            row.append(stats.get('throttling_error_count'))
+            row.append(stats.get('other_submit_error_count'))
+
+            table.append(row)
+
+        self.protocol.sendData(
+            tabulate(table, headers, tablefmt="plain", numalign="left").encode('ascii'), prompt=False)
+        self.protocol.sendData('Total sessions: %s' % (len(table)))
 
     def smppcs(self, arg, opts):
         sc = SMPPClientStatsCollector()
@@ -148,6 +180,59 @@ class StatsManager(Manager):
 
         self.protocol.sendData(tabulate(table, headers, tablefmt="plain", numalign="left").encode('ascii'))
 
+    def dlrlookup(self, arg, opts):
+        sc = DLRLookupStatsCollector()
+        headers = ["#Item", "Value"]
+
+        stats = sc.get().getStats()
+        table = []
+        for k, v in stats.iteritems():
+            row = []
+            row.append('#%s' % k)
+            if k[-3:] == '_at':
+                row.append(formatDateTime(v))
+            else:
+                row.append(v)
+
+            table.append(row)
+
+        # Average lookup latency (in microseconds) and not found rate of deliver_sm receipts
+        lookup_count = stats['deliver_sm_lookup_count']
+        if lookup_count > 0:
+            table.append(['#deliver_sm_lookup_avg_time', stats['deliver_sm_lookup_time'] / lookup_count])
+            table.append(['#deliver_sm_lookup_not_found_rate',
+                          '%.2f' % (float(stats['deliver_sm_lookup_not_found_count']) / lookup_count)])
+        else:
+            table.append(['#deliver_sm_lookup_avg_time', 0])
+            table.append(['#deliver_sm_lookup_not_found_rate', '0.00'])
+
+        self.protocol.sendData(tabulate(table, headers, tablefmt="plain", numalign="left").encode('ascii'))
+
+    def throwers(self, arg, opts):
+        sc = ThrowerStatsCollector()
+        headers = ["#Thrower", "Baseurl", "State", "Failure rate", "Latency", "Opened", "Opened at"]
+
+        table = []
+        for name, stats in sc.throwers.iteritems():
+            for baseurl, breaker in stats.get('circuit_breakers').iteritems():
+                row = []
+                row.append('#%s' % name)
+                row.append(baseurl)
+                row.append(breaker['state'])
+                row.append('%.2f' % breaker['failure_rate'])
+                row.append('%.3fs' % breaker['latency'])
+                row.append(breaker['opened_count'])
+                if breaker['opened_at'] is None:
+                    row.append(formatDateTime(0))
+                else:
+                    row.append(formatDateTime(datetime.fromtimestamp(breaker['opened_at'])))
+
+                table.append(row)
+
+        self.protocol.sendData(
+            tabulate(table, headers, tablefmt="plain", numalign="left").encode('ascii'), prompt=False)
+        self.protocol.sendData('Total circuit breakers: %s' % (len(table)))
+
     def smppsapi(self, arg, opts):
         """As of Jasmin's 0.6 version, there can be only one SMPPs API, the smpp server id
         is set for later evolution to handle multiple APIs, this is why the id is hard coded
@@ -129,6 +129,7 @@ class BasicTestCases(HappySMSCTestCase):
         yield self.add_connector('jcli : ', extraCommands)
 
         expectedList = ['ripf 0',
+                        'bind_count 1',
                         'con_fail_delay 10',
                         'dlr_expiry 86400', 'coding 0',
                         'logrotate midnight',
@@ -137,6 +138,7 @@ class BasicTestCases(HappySMSCTestCase):
                         'bind_to 30',
                         'port 2775',
                         'con_fail_retry yes',
+                        'submit_window 0',
                         'password password',
                         'src_addr None',
                         'bind_npi 0',
@@ -147,6 +149,7 @@ class BasicTestCases(HappySMSCTestCase):
                         'priority 0',
                         'con_loss_retry yes',
                         'username smppclient',
+                        'submit_burst 1',
                         'dst_npi 1',
                         'validity None',
                         'requeue_delay 120',
@@ -162,6 +165,7 @@ class BasicTestCases(HappySMSCTestCase):
                         'proto_id None',
                         'dlr_msgid 0',
                         'con_loss_delay 10',
+                        'prefetch_count 0',
                         'bind_ton 0',
                         'pdu_red_to 10',
                         'src_ton 2']
@@ -206,6 +210,7 @@ class BasicTestCases(HappySMSCTestCase):
         yield self._test(r'jcli : ', commands)
 
         expectedList = ['ripf 0',
+                        'bind_count 1',
                         'con_fail_delay 10',
                         'dlr_expiry 86400', 'coding 0',
                         'logrotate midnight',
@@ -214,6 +219,7 @@ class BasicTestCases(HappySMSCTestCase):
                         'bind_to 30',
                         'port 122223',
                         'con_fail_retry yes',
+                        'submit_window 0',
                         'password password',
                         'src_addr None',
                         'bind_npi 0',
@@ -224,6 +230,7 @@ class BasicTestCases(HappySMSCTestCase):
                         'priority 0',
                         'con_loss_retry yes',
                         'username smppclient',
+                        'submit_burst 1',
                         'dst_npi 1',
                         'validity None',
                         'requeue_delay 120',
@@ -239,6 +246,7 @@ class BasicTestCases(HappySMSCTestCase):
                         'proto_id None',
                         'dlr_msgid 0',
                         'con_loss_delay 10',
+                        'prefetch_count 0',
                         'bind_ton 0',
                         'pdu_red_to 10',
                         'src_ton 2']
@@ -3,6 +3,7 @@ from twisted.internet import defer
 from test_jcli import jCliWithoutAuthTestCases
 from .test_userm import UserTestCases
 from .test_smppccm import SmppccmTestCases
+from jasmin.managers.stats import DLRLookupStatsCollector
 
 class BasicTestCases(jCliWithoutAuthTestCases):
 
@@ -34,6 +35,7 @@ class BasicTestCases(jCliWithoutAuthTestCases):
         expectedList = ['#Item                     Value',
                         '#server_error_count       0',
                         '#charging_error_count     0',
+                        '#auth_cache_miss_count    0',
                         '#throughput_error_count   0',
                         '#success_count            0',
                         '#last_success_at          ND',
@@ -41,6 +43,7 @@ class BasicTestCases(jCliWithoutAuthTestCases):
                         '#route_error_count        0',
                         '#created_at               ND',
                         '#auth_error_count         0',
+                        '#auth_cache_hit_count     0',
                         '#request_count            0',
                         '#interceptor_count        0',
                         '#interceptor_error_count  0']
@@ -54,6 +57,7 @@ class BasicTestCases(jCliWithoutAuthTestCases):
                         '#submit_sm_count           0',
                         '#last_received_pdu_at      ND',
                         '#last_received_elink_at    ND',
+                        '#auth_cache_miss_count     0',
                         '#connected_count           0',
                         '#bound_trx_count           0',
                         '#submit_sm_request_count   0',
@@ -65,6 +69,7 @@ class BasicTestCases(jCliWithoutAuthTestCases):
                         '#last_sent_pdu_at          ND',
                         '#bind_tx_count             0',
                         '#bind_rx_count             0',
+                        '#auth_cache_hit_count      0',
                         '#deliver_sm_count          0',
                         '#bound_rx_count            0',
                         '#bind_trx_count            0',
@@ -76,6 +81,49 @@ class BasicTestCases(jCliWithoutAuthTestCases):
         commands = [{'command': 'stats --smppsapi', 'expect': expectedList}]
         return self._test(r'jcli : ', commands)
 
+    def test_throwers(self):
+        expectedList = ['#Thrower\s+Baseurl\s+State\s+Failure rate\s+Latency\s+Opened\s+Opened at',
+                        'Total circuit breakers: 0']
+        commands = [{'command': 'stats --throwers', 'expect': expectedList}]
+        return self._test(r'jcli : ', commands)
+
+    def test_dlrlookup(self):
+        stats = DLRLookupStatsCollector().get()
+        stats.init()
+
+        expectedList = ['#Item\s+Value',
+                        '#created_at\s+ND',
+                        '#deliver_sm_lookup_count\s+0',
+                        '#deliver_sm_lookup_error_count\s+0',
+                        '#deliver_sm_lookup_not_found_count\s+0',
+                        '#last_deliver_sm_lookup_at\s+ND',
+                        '#deliver_sm_lookup_max_time\s+0',
+                        '#deliver_sm_lookup_time\s+0',
+                        '#deliver_sm_lookup_avg_time\s+0',
+                        '#deliver_sm_lookup_not_found_rate\s+0.00']
+        commands = [{'command': 'stats --dlrlookup', 'expect': expectedList}]
+        return self._test(r'jcli : ', commands)
+
+    def test_dlrlookup_rates(self):
+        stats = DLRLookupStatsCollector().get()
+        stats.init()
+        stats.set('deliver_sm_lookup_count', 4)
+        stats.set('deliver_sm_lookup_not_found_count', 1)
+        stats.set('deliver_sm_lookup_time', 2000)
+
+        expectedList = ['#Item\s+Value',
+                        '#created_at\s+ND',
+                        '#deliver_sm_lookup_count\s+4',
+                        '#deliver_sm_lookup_error_count\s+0',
+                        '#deliver_sm_lookup_not_found_count\s+1',
+                        '#last_deliver_sm_lookup_at\s+ND',
+                        '#deliver_sm_lookup_max_time\s+0',
+                        '#deliver_sm_lookup_time\s+2000',
+                        '#deliver_sm_lookup_avg_time\s+500',
+                        '#deliver_sm_lookup_not_found_rate\s+0.25']
+        commands = [{'command': 'stats --dlrlookup', 'expect': expectedList}]
+        return self._test(r'jcli : ', commands)
+
 class UserStatsTestCases(UserTestCases):
     def test_users(self):
         extraCommands = [{'command': 'uid test_users'}]
@@ -153,10 +201,14 @@ class SmppcStatsTestCases(SmppccmTestCases):
                         '#elink_count               0',
                         '#deliver_sm_count          0',
                         '#last_sent_pdu_at          ND',
+                        '#throttling_rate           0',
                         '#disconnected_count        0',
                         '#connected_at              ND',
                         '#data_sm_count             0',
                         '#created_at                \d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}',
+                        '#priority_lanes            {}',
+                        '#throttling_tokens         0',
+                        '#throttling_wait_time      0',
                         '#bound_count               0',
                         '#interceptor_count         0',
                         '#last_seqNum_at            ND',
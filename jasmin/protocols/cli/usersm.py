@@ -501,6 +501,9 @@ class UsersManager(PersistableManager):
                 else:
                     setattr(user, key, value)
 
+        # User were updated in place, its username or password may have changed
+        self.pb['router'].reindexUsers()
+
         self.protocol.sendData('Successfully updated User [%s]' % self.sessionContext['uid'], prompt=False)
         self.stopSession()
 
@@ -31,3 +31,6 @@ class HTTPApiConfig(ConfigFile):
         # Long message splitting
         self.long_content_max_parts = self._get('http-api', 'long_content_max_parts', 5)
         self.long_content_split = self._get('http-api', 'long_content_split', 'udh') # sar or udh
+
+        # Maximum number of messages (after expanding destination lists) in a /sendbulk request
+        self.bulk_max_messages = self._getint('http-api', 'bulk_max_messages', 1000)
@@ -58,6 +58,23 @@ def update_submit_sm_pdu(routable, config):
     return routable
 
 
+def json2args(values):
+    """Convert a json object to request args: every value is set as a one-item list of str,
+    None values are dropped"""
+
+    args = {}
+    for k, v in values.iteritems():
+        if v is None:
+            continue
+        elif isinstance(v, unicode):
+            v = v.encode('utf-8')
+        else:
+            v = str(v)
+        args[k.encode('utf-8')] = [v]
+
+    return args
+
+
 def hex2bin(hex_content):
     """Convert hex-content back to binary data, raise a UrlArgsValidationError on failure"""
 
@@ -85,195 +102,243 @@ class Send(Resource):
         self.opFactory = SMPPOperationFactory(long_content_max_parts=HTTPApiConfig.long_content_max_parts,
                                               long_content_split=HTTPApiConfig.long_content_split)
 
+    def get_short_message(self, args):
+        """Return short_message from content (converted to GSM 03.38 when coding is 0) or hex-content"""
+        # Do we have a hex-content ?
+        if 'hex-content' not in args:
+            # Convert utf8 to GSM 03.38
+            if args['coding'][0] == '0':
+                return gsm_encode(args['content'][0].decode('utf-8'))
+            else:
+                # Otherwise forward it as is
+                return args['content'][0]
+        else:
+            # Otherwise convert hex to bin
+            return hex2bin(args['hex-content'][0])
+
+    def authenticate(self, args):
+        """Return the authenticated User, raise AuthenticationError on failure"""
+        user = self.RouterPB.authenticateUser(
+            username=args['username'][0],
+            password=args['password'][0],
+            stats=self.stats)
+        if user is None:
+            self.stats.inc('auth_error_count')
+
+            self.log.debug(
+                "Authentication failure for username:%s and password:%s",
+                args['username'][0], args['password'][0])
+            self.log.error(
+                "Authentication failure for username:%s",
+                args['username'][0])
+            raise AuthenticationError(
+                'Authentication failure for username:%s' % args['username'][0])
+
+        return user
+
     @defer.inlineCallbacks
-    def route_routable(self, updated_request):
-        try:
-            # Do we have a hex-content ?
-            if 'hex-content' not in updated_request.args:
-                # Convert utf8 to GSM 03.38
-                if updated_request.args['coding'][0] == '0':
-                    short_message = gsm_encode(updated_request.args['content'][0].decode('utf-8'))
+    def prepare_submit_sm(self, user, updated_request, short_message):
+        """Build, intercept and route a SubmitSmPDU from updated_request args
+
+        Returns a dict holding the routable, its route and routed connector, the priority and
+        the dlr settings.
+        """
+        # Build SubmitSmPDU
+        SubmitSmPDU = self.opFactory.SubmitSM(
+            source_addr=None if 'from' not in updated_request.args else updated_request.args['from'][0],
+            destination_addr=updated_request.args['to'][0],
+            short_message=short_message,
+            data_coding=int(updated_request.args['coding'][0]))
+        self.log.debug("Built base SubmitSmPDU: %s", SubmitSmPDU)
+
+        # Make Credential validation
+        v = HttpAPICredentialValidator('Send', user, updated_request, submit_sm=SubmitSmPDU)
+        v.validate()
+
+        # Update SubmitSmPDU by default values from user MtMessagingCredential
+        SubmitSmPDU = v.updatePDUWithUserDefaults(SubmitSmPDU)
+
+        # Prepare for interception then routing
+        routable = RoutableSubmitSm(SubmitSmPDU, user)
+        self.log.debug("Built Routable %s for SubmitSmPDU: %s", routable, SubmitSmPDU)
+
+        # Should we tag the routable ?
+        tags = []
+        if 'tags' in updated_request.args:
+            tags = updated_request.args['tags'][0].split(',')
+            for tag in tags:
+                routable.addTag(tag)
+                self.log.debug('Tagged routable %s: +%s', routable, tag)
+
+        # Intercept
+        interceptor = self.RouterPB.getMTInterceptionTable().getInterceptorFor(routable)
+        if interceptor is not None:
+            self.log.debug("RouterPB selected %s interceptor for this SubmitSmPDU", interceptor)
+            if self.interceptorpb_client is None:
+                self.stats.inc('interceptor_error_count')
+                self.log.error("InterceptorPB not set !")
+                raise InterceptorNotSetError('InterceptorPB not set !')
+            if not self.interceptorpb_client.isConnected:
+                self.stats.inc('interceptor_error_count')
+                self.log.error("InterceptorPB not connected !")
+                raise InterceptorNotConnectedError('InterceptorPB not connected !')
+
+            script = interceptor.getScript()
+            self.log.debug("Interceptor script loaded: %s", script)
+
+            # Run !
+            r = yield self.interceptorpb_client.run_script(script, routable)
+            if isinstance(r, dict) and r['http_status'] != 200:
+                self.stats.inc('interceptor_error_count')
+                self.log.error('Interceptor script returned %s http_status error.', r['http_status'])
+                raise InterceptorRunError(
+                    code=r['http_status'],
+                    message='Interception specific error code %s' % r['http_status']
+                )
+            elif isinstance(r, str):
+                self.stats.inc('interceptor_count')
+                routable = pickle.loads(r)
+            else:
+                self.stats.inc('interceptor_error_count')
+                self.log.error('Failed running interception script, got the following return: %s', r)
+                raise InterceptorRunError(message='Failed running interception script, check log for details')
+
+        # Get the route
+        route = self.RouterPB.getMTRoutingTable().getRouteFor(routable)
+        if route is None:
+            self.stats.inc('route_error_count')
+            self.log.error("No route matched from user %s for SubmitSmPDU: %s", user, routable.pdu)
+            raise RouteNotFoundError("No route found")
+
+        # Get connector from selected route
+        self.log.debug("RouterPB selected %s route for this SubmitSmPDU", route)
+        routedConnector = route.getConnector()
+        # Is it a failover route ? then check for a bound connector, otherwise don't route
+        # The failover route requires at least one connector to be up, no message enqueuing will
+        # occur otherwise.
+        if repr(route) == 'FailoverMTRoute':
+            self.log.debug('Selected route is a failover, will ensure connector is bound:')
+            while True:
+                c = self.SMPPClientManagerPB.perspective_connector_details(routedConnector.cid)
+                if c:
+                    self.log.debug('Connector [%s] is: %s', routedConnector.cid, c['session_state'])
                 else:
-                    # Otherwise forward it as is
-                    short_message = updated_request.args['content'][0]
+                    self.log.debug('Connector [%s] is not found', routedConnector.cid)
+
+                if c and c['session_state'][:6] == 'BOUND_':
+                    # Choose this connector
+                    break
+                else:
+                    # Check next connector, None if no more connectors are available
+                    routedConnector = route.getConnector()
+                    if routedConnector is None:
+                        break
+
+        if routedConnector is None:
+            self.stats.inc('route_error_count')
+            self.log.error("Failover route has no bound connector to handle SubmitSmPDU: %s", routable.pdu)
+            raise ConnectorNotFoundError("Failover route has no bound connectors")
+
+        # Re-update SubmitSmPDU with parameters from the route's connector
+        connector_config = self.SMPPClientManagerPB.perspective_connector_config(routedConnector.cid)
+        if connector_config:
+            connector_config = pickle.loads(connector_config)
+            routable = update_submit_sm_pdu(routable=routable, config=connector_config)
+
+        # Set priority
+        priority = 0
+        if 'priority' in updated_request.args:
+            priority = int(updated_request.args['priority'][0])
+            routable.pdu.params['priority_flag'] = priority_flag_value_map[priority]
+        self.log.debug("SubmitSmPDU priority is set to %s", priority)
+
+        # Set validity_period
+        if 'validity-period' in updated_request.args:
+            delta = timedelta(minutes=int(updated_request.args['validity-period'][0]))
+            routable.pdu.params['validity_period'] = datetime.today() + delta
+            self.log.debug(
+                "SubmitSmPDU validity_period is set to %s (+%s minutes)",
+                routable.pdu.params['validity_period'],
+                updated_request.args['validity-period'][0])
+
+        # Set DLR bit mask on the last pdu
+        _last_pdu = routable.pdu
+        while True:
+            if hasattr(_last_pdu, 'nextPdu'):
+                _last_pdu = _last_pdu.nextPdu
             else:
-                # Otherwise convert hex to bin
-                short_message = hex2bin(updated_request.args['hex-content'][0])
+                break
+        # DLR setting is clearly described in #107
+        _last_pdu.params['registered_delivery'] = RegisteredDelivery(
+            RegisteredDeliveryReceipt.NO_SMSC_DELIVERY_RECEIPT_REQUESTED)
+        if updated_request.args['dlr'][0] == 'yes':
+            _last_pdu.params['registered_delivery'] = RegisteredDelivery(
+                RegisteredDeliveryReceipt.SMSC_DELIVERY_RECEIPT_REQUESTED)
+            self.log.debug(
+                "SubmitSmPDU registered_delivery is set to %s",
+                str(_last_pdu.params['registered_delivery']))
+
+            dlr_level = int(updated_request.args['dlr-level'][0])
+            if 'dlr-url' in updated_request.args:
+                dlr_url = updated_request.args['dlr-url'][0]
+            else:
+                dlr_url = None
+            if updated_request.args['dlr-level'][0] == '1':
+                dlr_level_text = 'SMS-C'
+            elif updated_request.args['dlr-level'][0] == '2':
+                dlr_level_text = 'Terminal'
+            else:
+                dlr_level_text = 'All'
+            dlr_method = updated_request.args['dlr-method'][0]
+        else:
+            dlr_url = None
+            dlr_level = 0
+            dlr_level_text = 'No'
+            dlr_method = None
 
-            # Authentication
-            user = self.RouterPB.authenticateUser(
-                username=updated_request.args['username'][0],
-                password=updated_request.args['password'][0])
-            if user is None:
-                self.stats.inc('auth_error_count')
+        # Get number of PDUs to be sent (for billing purpose)
+        _pdu = routable.pdu
+        submit_sm_count = 1
+        while hasattr(_pdu, 'nextPdu'):
+            _pdu = _pdu.nextPdu
+            submit_sm_count += 1
+
+        defer.returnValue({
+            'routable': routable,
+            'route': route,
+            'connector': routedConnector,
+            'submit_sm_count': submit_sm_count,
+            'priority': priority,
+            'dlr_url': dlr_url,
+            'dlr_level': dlr_level,
+            'dlr_level_text': dlr_level_text,
+            'dlr_method': dlr_method})
 
-                self.log.debug(
-                    "Authentication failure for username:%s and password:%s",
-                    updated_request.args['username'][0], updated_request.args['password'][0])
-                self.log.error(
-                    "Authentication failure for username:%s",
-                    updated_request.args['username'][0])
-                raise AuthenticationError(
-                    'Authentication failure for username:%s' % updated_request.args['username'][0])
+    @defer.inlineCallbacks
+    def route_routable(self, updated_request):
+        routedConnector = None # init
+        try:
+            short_message = self.get_short_message(updated_request.args)
+
+            # Authentication
+            user = self.authenticate(updated_request.args)
 
             # Update CnxStatus
             user.getCnxStatus().httpapi['connects_count'] += 1
             user.getCnxStatus().httpapi['submit_sm_request_count'] += 1
             user.getCnxStatus().httpapi['last_activity_at'] = datetime.now()
 
-            # Build SubmitSmPDU
-            SubmitSmPDU = self.opFactory.SubmitSM(
-                source_addr=None if 'from' not in updated_request.args else updated_request.args['from'][0],
-                destination_addr=updated_request.args['to'][0],
-                short_message=short_message,
-                data_coding=int(updated_request.args['coding'][0]))
-            self.log.debug("Built base SubmitSmPDU: %s", SubmitSmPDU)
-
-            # Make Credential validation
-            v = HttpAPICredentialValidator('Send', user, updated_request, submit_sm=SubmitSmPDU)
-            v.validate()
-
-            # Update SubmitSmPDU by default values from user MtMessagingCredential
-            SubmitSmPDU = v.updatePDUWithUserDefaults(SubmitSmPDU)
-
-            # Prepare for interception then routing
-            routedConnector = None # init
-            routable = RoutableSubmitSm(SubmitSmPDU, user)
-            self.log.debug("Built Routable %s for SubmitSmPDU: %s", routable, SubmitSmPDU)
-
-            # Should we tag the routable ?
-            tags = []
-            if 'tags' in updated_request.args:
-                tags = updated_request.args['tags'][0].split(',')
-                for tag in tags:
-                    routable.addTag(tag)
-                    self.log.debug('Tagged routable %s: +%s', routable, tag)
-
-            # Intercept
-            interceptor = self.RouterPB.getMTInterceptionTable().getInterceptorFor(routable)
-            if interceptor is not None:
-                self.log.debug("RouterPB selected %s interceptor for this SubmitSmPDU", interceptor)
-                if self.interceptorpb_client is None:
-                    self.stats.inc('interceptor_error_count')
-                    self.log.error("InterceptorPB not set !")
-                    raise InterceptorNotSetError('InterceptorPB not set !')
-                if not self.interceptorpb_client.isConnected:
-                    self.stats.inc('interceptor_error_count')
-                    self.log.error("InterceptorPB not connected !")
-                    raise InterceptorNotConnectedError('InterceptorPB not connected !')
-
-                script = interceptor.getScript()
-                self.log.debug("Interceptor script loaded: %s", script)
-
-                # Run !
-                r = yield self.interceptorpb_client.run_script(script, routable)
-                if isinstance(r, dict) and r['http_status'] != 200:
-                    self.stats.inc('interceptor_error_count')
-                    self.log.error('Interceptor script returned %s http_status error.', r['http_status'])
-                    raise InterceptorRunError(
-                        code=r['http_status'],
-                        message='Interception specific error code %s' % r['http_status']
-                    )
-                elif isinstance(r, str):
-                    self.stats.inc('interceptor_count')
-                    routable = pickle.loads(r)
-                else:
-                    self.stats.inc('interceptor_error_count')
-                    self.log.error('Failed running interception script, got the following return: %s', r)
-                    raise InterceptorRunError(message='Failed running interception script, check log for details')
-
-            # Get the route
-            route = self.RouterPB.getMTRoutingTable().getRouteFor(routable)
-            if route is None:
-                self.stats.inc('route_error_count')
-                self.log.error("No route matched from user %s for SubmitSmPDU: %s", user, routable.pdu)
-                raise RouteNotFoundError("No route found")
-
-            # Get connector from selected route
-            self.log.debug("RouterPB selected %s route for this SubmitSmPDU", route)
-            routedConnector = route.getConnector()
-            # Is it a failover route ? then check for a bound connector, otherwise don't route
-            # The failover route requires at least one connector to be up, no message enqueuing will
-            # occur otherwise.
-            if repr(route) == 'FailoverMTRoute':
-                self.log.debug('Selected route is a failover, will ensure connector is bound:')
-                while True:
-                    c = self.SMPPClientManagerPB.perspective_connector_details(routedConnector.cid)
-                    if c:
-                        self.log.debug('Connector [%s] is: %s', routedConnector.cid, c['session_state'])
-                    else:
-                        self.log.debug('Connector [%s] is not found', routedConnector.cid)
-
-                    if c and c['session_state'][:6] == 'BOUND_':
-                        # Choose this connector
-                        break
-                    else:
-                        # Check next connector, None if no more connectors are available
-                        routedConnector = route.getConnector()
-                        if routedConnector is None:
-                            break
-
-            if routedConnector is None:
-                self.stats.inc('route_error_count')
-                self.log.error("Failover route has no bound connector to handle SubmitSmPDU: %s", routable.pdu)
-                raise ConnectorNotFoundError("Failover route has no bound connectors")
-
-            # Re-update SubmitSmPDU with parameters from the route's connector
-            connector_config = self.SMPPClientManagerPB.perspective_connector_config(routedConnector.cid)
-            if connector_config:
-                connector_config = pickle.loads(connector_config)
-                routable = update_submit_sm_pdu(routable=routable, config=connector_config)
-
-            # Set priority
-            priority = 0
-            if 'priority' in updated_request.args:
-                priority = int(updated_request.args['priority'][0])
-                routable.pdu.params['priority_flag'] = priority_flag_value_map[priority]
-            self.log.debug("SubmitSmPDU priority is set to %s", priority)
-
-            # Set validity_period
-            if 'validity-period' in updated_request.args:
-                delta = timedelta(minutes=int(updated_request.args['validity-period'][0]))
-                routable.pdu.params['validity_period'] = datetime.today() + delta
-                self.log.debug(
-                    "SubmitSmPDU validity_period is set to %s (+%s minutes)",
-                    routable.pdu.params['validity_period'],
-                    updated_request.args['validity-period'][0])
-
-            # Set DLR bit mask on the last pdu
-            _last_pdu = routable.pdu
-            while True:
-                if hasattr(_last_pdu, 'nextPdu'):
-                    _last_pdu = _last_pdu.nextPdu
-                else:
-                    break
-            # DLR setting is clearly described in #107
-            _last_pdu.params['registered_delivery'] = RegisteredDelivery(
-                RegisteredDeliveryReceipt.NO_SMSC_DELIVERY_RECEIPT_REQUESTED)
-            if updated_request.args['dlr'][0] == 'yes':
-                _last_pdu.params['registered_delivery'] = RegisteredDelivery(
-                    RegisteredDeliveryReceipt.SMSC_DELIVERY_RECEIPT_REQUESTED)
-                self.log.debug(
-                    "SubmitSmPDU registered_delivery is set to %s",
-                    str(_last_pdu.params['registered_delivery']))
-
-                dlr_level = int(updated_request.args['dlr-level'][0])
-                if 'dlr-url' in updated_request.args:
-                    dlr_url = updated_request.args['dlr-url'][0]
-                else:
-                    dlr_url = None
-                if updated_request.args['dlr-level'][0] == '1':
-                    dlr_level_text = 'SMS-C'
-                elif updated_request.args['dlr-level'][0] == '2':
-                    dlr_level_text = 'Terminal'
-                else:
-                    dlr_level_text = 'All'
-                dlr_method = updated_request.args['dlr-method'][0]
-            else:
-                dlr_url = None
-                dlr_level = 0
-                dlr_level_text = 'No'
-                dlr_method = None
+            # Build, intercept and route SubmitSmPDU
+            submit_sm = yield self.prepare_submit_sm(user, updated_request, short_message)
+            routable = submit_sm['routable']
+            route = submit_sm['route']
+            routedConnector = submit_sm['connector']
+            submit_sm_count = submit_sm['submit_sm_count']
+            priority = submit_sm['priority']
+            dlr_url = submit_sm['dlr_url']
+            dlr_level = submit_sm['dlr_level']
+            dlr_level_text = submit_sm['dlr_level_text']
+            dlr_method = submit_sm['dlr_method']
 
             # QoS throttling
             if user.mt_credential.getQuota('http_throughput') >= 0 and user.getCnxStatus().httpapi['qos_last_submit_sm_at'] != 0:
@@ -291,17 +356,12 @@ class Send(Resource):
                     raise ThroughputExceededError("User throughput exceeded")
             user.getCnxStatus().httpapi['qos_last_submit_sm_at'] = datetime.now()
 
-            # Get number of PDUs to be sent (for billing purpose)
-            _pdu = routable.pdu
-            submit_sm_count = 1
-            while hasattr(_pdu, 'nextPdu'):
-                _pdu = _pdu.nextPdu
-                submit_sm_count += 1
-
             # Pre-sending submit_sm: Billing processing
             bill = route.getBillFor(user)
             self.log.debug("SubmitSmBill [bid:%s] [ttlamounts:%s] generated for this SubmitSmPDU (x%s)",
                            bill.bid, bill.getTotalAmounts(), submit_sm_count)
+            # Shared quotas are charged from leases, wait for them to be refilled if needed
+            yield self.RouterPB.leaseUserQuotasForSubmitSms(user, bill, submit_sm_count)
             charging_requirements = []
             u_balance = user.mt_credential.getQuota('balance')
             u_subsm_count = user.mt_credential.getQuota('submit_sm_count')
@@ -379,6 +439,67 @@ class Send(Resource):
             updated_request.write(_return)
             updated_request.finish()
 
+    def validate_request(self, updated_request):
+        """Set default values to updated_request args and validate them, raise a
+        UrlArgsValidationError on failure"""
+
+        # Validation (must have almost the same params as /rate service)
+        fields = {'to'          : {'optional': False, 'pattern': re.compile(r'^\+{0,1}\d+$')},
+                  'from'        : {'optional': True},
+                  'coding'      : {'optional': True, 'pattern': re.compile(r'^(0|1|2|3|4|5|6|7|8|9|10|13|14){1}$')},
+                  'username'    : {'optional': False, 'pattern': re.compile(r'^.{1,15}$')},
+                  'password'    : {'optional': False, 'pattern': re.compile(r'^.{1,8}$')},
+                  # Priority validation pattern can be validated/filtered further more
+                  # through HttpAPICredentialValidator
+                  'priority'    : {'optional': True, 'pattern': re.compile(r'^[0-3]$')},
+                  # Validity period validation pattern can be validated/filtered further more
+                  # through HttpAPICredentialValidator
+                  'validity-period' : {'optional': True, 'pattern': re.compile(r'^\d+$')},
+                  'dlr'         : {'optional': False, 'pattern': re.compile(r'^(yes|no)$')},
+                  'dlr-url'     : {'optional': True, 'pattern': re.compile(r'^(http|https)\://.*$')},
+                  # DLR Level validation pattern can be validated/filtered further more
+                  # through HttpAPICredentialValidator
+                  'dlr-level'   : {'optional': True, 'pattern': re.compile(r'^[1-3]$')},
+                  'dlr-method'  : {'optional': True, 'pattern': re.compile(r'^(get|post)$', re.IGNORECASE)},
+                  'tags'        : {'optional': True, 'pattern': re.compile(r'^([-a-zA-Z0-9,])*$')},
+                  'content'     : {'optional': True},
+                  'hex-content' : {'optional': True}}
+
+        # Default coding is 0 when not provided
+        if 'coding' not in updated_request.args:
+            updated_request.args['coding'] = ['0']
+
+        # Set default for undefined updated_request.arguments
+        if 'dlr-url' in updated_request.args or 'dlr-level' in updated_request.args:
+            updated_request.args['dlr'] = ['yes']
+        if 'dlr' not in updated_request.args:
+            # Setting DLR updated_request to 'no'
+            updated_request.args['dlr'] = ['no']
+
+        # Set default values
+        if updated_request.args['dlr'][0] == 'yes':
+            if 'dlr-level' not in updated_request.args:
+                # If DLR is requested and no dlr-level were provided, assume minimum level (1)
+                updated_request.args['dlr-level'] = [1]
+            if 'dlr-method' not in updated_request.args:
+                # If DLR is requested and no dlr-method were provided, assume default (POST)
+                updated_request.args['dlr-method'] = ['POST']
+
+        # DLR method must be uppercase
+        if 'dlr-method' in updated_request.args:
+            updated_request.args['dlr-method'][0] = updated_request.args['dlr-method'][0].upper()
+
+        # Make validation
+        v = UrlArgsValidator(updated_request, fields)
+        v.validate()
+
+        # Check if have content --OR-- hex-content
+        # @TODO: make this inside UrlArgsValidator !
+        if 'content' not in updated_request.args and 'hex-content' not in updated_request.args:
+            raise UrlArgsValidationError("content or hex-content not present.")
+        elif 'content' in updated_request.args and 'hex-content' in updated_request.args:
+            raise UrlArgsValidationError("content and hex-content cannot be used both in same request.")
+
     def render(self, request):
         """
         /send request processing
@@ -398,65 +519,274 @@ class Send(Resource):
         updated_request = request
 
         try:
-            # Validation (must have almost the same params as /rate service)
-            fields = {'to'          : {'optional': False, 'pattern': re.compile(r'^\+{0,1}\d+$')},
-                      'from'        : {'optional': True},
-                      'coding'      : {'optional': True, 'pattern': re.compile(r'^(0|1|2|3|4|5|6|7|8|9|10|13|14){1}$')},
-                      'username'    : {'optional': False, 'pattern': re.compile(r'^.{1,15}$')},
-                      'password'    : {'optional': False, 'pattern': re.compile(r'^.{1,8}$')},
-                      # Priority validation pattern can be validated/filtered further more
-                      # through HttpAPICredentialValidator
-                      'priority'    : {'optional': True, 'pattern': re.compile(r'^[0-3]$')},
-                      # Validity period validation pattern can be validated/filtered further more
-                      # through HttpAPICredentialValidator
-                      'validity-period' : {'optional': True, 'pattern': re.compile(r'^\d+$')},
-                      'dlr'         : {'optional': False, 'pattern': re.compile(r'^(yes|no)$')},
-                      'dlr-url'     : {'optional': True, 'pattern': re.compile(r'^(http|https)\://.*$')},
-                      # DLR Level validation pattern can be validated/filtered further more
-                      # through HttpAPICredentialValidator
-                      'dlr-level'   : {'optional': True, 'pattern': re.compile(r'^[1-3]$')},
-                      'dlr-method'  : {'optional': True, 'pattern': re.compile(r'^(get|post)$', re.IGNORECASE)},
-                      'tags'        : {'optional': True, 'pattern': re.compile(r'^([-a-zA-Z0-9,])*$')},
-                      'content'     : {'optional': True},
-                      'hex-content' : {'optional': True}}
+            self.validate_request(updated_request)
 
-            # Default coding is 0 when not provided
-            if 'coding' not in updated_request.args:
-                updated_request.args['coding'] = ['0']
-
-            # Set default for undefined updated_request.arguments
-            if 'dlr-url' in updated_request.args or 'dlr-level' in updated_request.args:
-                updated_request.args['dlr'] = ['yes']
-            if 'dlr' not in updated_request.args:
-                # Setting DLR updated_request to 'no'
-                updated_request.args['dlr'] = ['no']
-
-            # Set default values
-            if updated_request.args['dlr'][0] == 'yes':
-                if 'dlr-level' not in updated_request.args:
-                    # If DLR is requested and no dlr-level were provided, assume minimum level (1)
-                    updated_request.args['dlr-level'] = [1]
-                if 'dlr-method' not in updated_request.args:
-                    # If DLR is requested and no dlr-method were provided, assume default (POST)
-                    updated_request.args['dlr-method'] = ['POST']
-
-            # DLR method must be uppercase
-            if 'dlr-method' in updated_request.args:
-                updated_request.args['dlr-method'][0] = updated_request.args['dlr-method'][0].upper()
+            # Continue routing in a separate thread
+            reactor.callFromThread(self.route_routable, updated_request=updated_request)
+        except Exception, e:
+            self.log.error("Error: %s", e)
+
+            if hasattr(e, 'code'):
+                response = {'return': e.message, 'status': e.code}
+            else:
+                response = {'return': "Unknown error: %s" % e, 'status': 500}
+
+            self.log.debug("Returning %s to %s.", response, updated_request.getClientIP())
+            updated_request.setResponseCode(response['status'])
+
+            return 'Error "%s"' % response['return']
+        else:
+            return NOT_DONE_YET
+
+
+class BulkMessage(object):
+    """A message of a /sendbulk request, holds its /send arguments the way a request does"""
+
+    def __init__(self, request, args):
+        self.request = request
+        self.args = args
+
+    def getClientIP(self):
+        return self.request.getClientIP()
+
+
+class SendBulk(Send):
+    isleaf = True
+
+    def __init__(self, HTTPApiConfig, RouterPB, SMPPClientManagerPB, stats, log, interceptorpb_client):
+        Send.__init__(self, HTTPApiConfig, RouterPB, SMPPClientManagerPB, stats, log, interceptorpb_client)
+
+        self.bulk_max_messages = HTTPApiConfig.bulk_max_messages
+
+    def get_messages(self, request):
+        """Return the BulkMessages of request's json body, raise a UrlArgsValidationError on failure
+
+        The body holds a messages list (/send arguments, 'to' can be a list of destinations)
+        and optional globals (/send arguments shared by all messages), every message is given
+        the request's username and password.
+        """
+
+        try:
+            body = json.loads(request.content.read())
+        except Exception:
+            raise UrlArgsValidationError("Invalid json body.")
+        if (not isinstance(body, dict) or not isinstance(body.get('messages'), list)
+            or len(body['messages']) == 0):
+            raise UrlArgsValidationError("Json body must hold a non empty messages list.")
+        if not isinstance(body.get('globals', {}), dict):
+            raise UrlArgsValidationError("Json body globals must be an object.")
+
+        messages = []
+        for message in body['messages']:
+            if not isinstance(message, dict):
+                raise UrlArgsValidationError("Json body messages must be objects.")
+
+            values = dict(body.get('globals', {}))
+            values.update(message)
+            destinations = values.get('to')
+            if not isinstance(destinations, list):
+                destinations = [destinations]
+
+            for destination in destinations:
+                values['to'] = destination
+                args = json2args(values)
+                args['username'] = list(request.args['username'])
+                args['password'] = list(request.args['password'])
+                messages.append(BulkMessage(request, args))
+
+            if len(messages) > self.bulk_max_messages:
+                raise UrlArgsValidationError("Too many messages, maximum is %s." % self.bulk_max_messages)
+
+        return messages
+
+    @defer.inlineCallbacks
+    def route_routables(self, request, messages):
+        try:
+            # Authentication
+            user = self.authenticate(request.args)
+
+            # Update CnxStatus
+            user.getCnxStatus().httpapi['connects_count'] += 1
+            user.getCnxStatus().httpapi['submit_sm_request_count'] += len(messages)
+            user.getCnxStatus().httpapi['last_activity_at'] = datetime.now()
+
+            # Make Credential validation, messages are validated one by one later
+            v = HttpAPICredentialValidator('SendBulk', user, request)
+            v.validate()
+
+            # QoS throttling: the request is accepted if the user's throughput allows its first
+            # message, the next messages are accounted as if they were sent at that throughput
+            qos_throughput_ysecond_td = timedelta(0)
+            if user.mt_credential.getQuota('http_throughput') >= 0:
+                qos_throughput_second = 1 / float(user.mt_credential.getQuota('http_throughput'))
+                qos_throughput_ysecond_td = timedelta(microseconds=qos_throughput_second * 1000000)
+                if user.getCnxStatus().httpapi['qos_last_submit_sm_at'] != 0:
+                    qos_delay = datetime.now() - user.getCnxStatus().httpapi['qos_last_submit_sm_at']
+                    if qos_delay < qos_throughput_ysecond_td:
+                        self.stats.inc('throughput_error_count')
+                        self.log.error(
+                            "QoS: submit_sm_event is faster (%s) than fixed throughput (%s), user:%s, "
+                            "rejecting bulk of %s messages.",
+                            qos_delay,
+                            qos_throughput_ysecond_td,
+                            user,
+                            len(messages))
+
+                        raise ThroughputExceededError("User throughput exceeded")
+            user.getCnxStatus().httpapi['qos_last_submit_sm_at'] = (
+                datetime.now() + qos_throughput_ysecond_td * (len(messages) - 1))
+        except Exception, e:
+            self.log.error("Error: %s", e)
+
+            if hasattr(e, 'code'):
+                response = {'return': e.message, 'status': e.code}
+            else:
+                response = {'return': "Unknown error: %s" % e, 'status': 500}
+
+            self.log.debug("Returning %s to %s.", response, request.getClientIP())
+            request.setResponseCode(response['status'])
+            request.write('Error "%s"' % response['return'])
+            request.finish()
+            return
+
+        try:
+            # Validate, intercept and route every message, results are either prepared submit_sms
+            # or the exception raised for the message
+            results = []
+            for message in messages:
+                try:
+                    self.validate_request(message)
+                    short_message = self.get_short_message(message.args)
+
+                    submit_sm = yield self.prepare_submit_sm(user, message, short_message)
+                    submit_sm['short_message'] = short_message
+                    submit_sm['bill'] = submit_sm['route'].getBillFor(user)
+                    self.log.debug("SubmitSmBill [bid:%s] [ttlamounts:%s] generated for this SubmitSmPDU (x%s)",
+                                   submit_sm['bill'].bid, submit_sm['bill'].getTotalAmounts(),
+                                   submit_sm['submit_sm_count'])
+                    results.append(submit_sm)
+                except Exception, e:
+                    self.log.error("Error: %s", e)
+                    results.append(e)
+
+            # Pre-sending submit_sms: Billing processing, the user is charged once for the whole bulk
+            charges = [(r['bill'], r['submit_sm_count']) for r in results if isinstance(r, dict)]
+            if len(charges) > 0:
+                # Shared quotas are charged from leases, wait for them to be refilled if needed
+                yield self.RouterPB.leaseUserQuotasForSubmitSmBulk(user, charges)
+                total_amounts = sum([bill.getTotalAmounts() * count for bill, count in charges])
+                total_decrement = sum([bill.getAction('decrement_submit_sm_count') * count for bill, count in charges])
+                charging_requirements = []
+                u_balance = user.mt_credential.getQuota('balance')
+                u_subsm_count = user.mt_credential.getQuota('submit_sm_count')
+                if u_balance is not None and total_amounts > 0:
+                    # Ensure user have enough balance to pay submit_sms and submit_sm_resps
+                    charging_requirements.append({
+                        'condition': total_amounts <= u_balance,
+                        'error_message': 'Not enough balance (%s) for charging: %s' % (
+                            u_balance, total_amounts)})
+                if u_subsm_count is not None:
+                    # Ensure user have enough submit_sm_count to to cover
+                    # the bills action (decrement_submit_sm_count)
+                    charging_requirements.append({
+                        'condition': total_decrement <= u_subsm_count,
+                        'error_message': 'Not enough submit_sm_count (%s) for charging: %s' % (
+                            u_subsm_count, total_decrement)})
+
+                if self.RouterPB.chargeUserForSubmitSmBulk(user, charges, charging_requirements) is None:
+                    self.stats.inc('charging_error_count')
+                    self.log.error('Charging user %s failed, [ttlamounts:%s] bulk of %s SubmitSmPDUs',
+                                   user, total_amounts, len(charges))
+                    error = ChargingError('Cannot charge submit_sm, check RouterPB log file for details')
+                    results = [error if isinstance(r, dict) else r for r in results]
+
+            # Send SubmitSmPDUs through smpp client manager PB server without waiting for each
+            # other's result
+            for r in results:
+                if isinstance(r, dict):
+                    self.log.debug("Connector '%s' is set to be a route for this SubmitSmPDU", r['connector'].cid)
+                    r['result'] = defer.maybeDeferred(
+                        self.SMPPClientManagerPB.perspective_submit_sm,
+                        cid=r['connector'].cid,
+                        SubmitSmPDU=r['routable'].pdu,
+                        submit_sm_bill=r['bill'],
+                        priority=r['priority'],
+                        pickled=False,
+                        dlr_url=r['dlr_url'],
+                        dlr_level=r['dlr_level'],
+                        dlr_method=r['dlr_method'])
+
+            # Stream back one line per message, in the request's order
+            request.setResponseCode(200)
+            for message, r in zip(messages, results):
+                if isinstance(r, dict):
+                    try:
+                        message_id = yield r['result']
+                    except Exception, e:
+                        self.log.error('Error: %s', e)
+                        message_id = None
+
+                    if not message_id:
+                        self.stats.inc('server_error_count')
+                        self.log.error('Failed to send SubmitSmPDU to [cid:%s]', r['connector'].cid)
+                        r = ServerError('Cannot send submit_sm, check SMPPClientManagerPB log file for details')
+                    else:
+                        self.stats.inc('success_count')
+                        self.stats.set('last_success_at', datetime.now())
+                        self.log.debug('SubmitSmPDU sent to [cid:%s], result = %s', r['connector'].cid, message_id)
+                        self.log.info(
+                            'SMS-MT [uid:%s] [cid:%s] [msgid:%s] [prio:%s] [dlr:%s] [from:%s] [to:%s] [content:%s]',
+                            user.uid,
+                            r['connector'].cid,
+                            message_id,
+                            r['priority'],
+                            r['dlr_level_text'],
+                            r['routable'].pdu.params['source_addr'],
+                            message.args['to'][0],
+                            re.sub(r'[^\x20-\x7E]+', '.', r['short_message']))
+                        request.write('Success "%s"\n' % message_id)
+                        continue
+
+                if hasattr(r, 'code'):
+                    request.write('Error "%s"\n' % r.message)
+                else:
+                    request.write('Error "Unknown error: %s"\n' % r)
+        except Exception, e:
+            self.log.error("Error: %s", e)
+            request.write('Error "Unknown error: %s"\n' % e)
+        finally:
+            self.log.debug("Returned %s results to %s.", len(messages), request.getClientIP())
+            request.finish()
+
+    def render(self, request):
+        """
+        /sendbulk request processing
+
+        Messages are given in a json body, c.f. get_messages(), and are processed the same way
+        /send does except for authentication, throttling and charging which are made once for
+        the whole request; one line per message is returned.
+        """
+
+        self.log.debug("Rendering /sendbulk response with args: %s from %s", request.args, request.getClientIP())
+        request.responseHeaders.addRawHeader(b"content-type", b"text/plain")
+        response = {'return': None, 'status': 200}
+
+        self.stats.inc('request_count')
+        self.stats.set('last_request_at', datetime.now())
+
+        try:
+            # Validation
+            fields = {'username'    : {'optional': False, 'pattern': re.compile(r'^.{1,15}$')},
+                      'password'    : {'optional': False, 'pattern': re.compile(r'^.{1,8}$')}}
 
             # Make validation
-            v = UrlArgsValidator(updated_request, fields)
+            v = UrlArgsValidator(request, fields)
             v.validate()
 
-            # Check if have content --OR-- hex-content
-            # @TODO: make this inside UrlArgsValidator !
-            if 'content' not in request.args and 'hex-content' not in request.args:
-                raise UrlArgsValidationError("content or hex-content not present.")
-            elif 'content' in request.args and 'hex-content' in request.args:
-                raise UrlArgsValidationError("content and hex-content cannot be used both in same request.")
+            messages = self.get_messages(request)
 
             # Continue routing in a separate thread
-            reactor.callFromThread(self.route_routable, updated_request=updated_request)
+            reactor.callFromThread(self.route_routables, request=request, messages=messages)
         except Exception, e:
             self.log.error("Error: %s", e)
 
@@ -465,8 +795,8 @@ class Send(Resource):
             else:
                 response = {'return': "Unknown error: %s" % e, 'status': 500}
 
-            self.log.debug("Returning %s to %s.", response, updated_request.getClientIP())
-            updated_request.setResponseCode(response['status'])
+            self.log.debug("Returning %s to %s.", response, request.getClientIP())
+            request.setResponseCode(response['status'])
 
             return 'Error "%s"' % response['return']
         else:
@@ -506,7 +836,8 @@ class Rate(Resource):
             # Authentication
             user = self.RouterPB.authenticateUser(
                 username=request.args['username'][0],
-                password=request.args['password'][0]
+                password=request.args['password'][0],
+                stats=self.stats
             )
             if user is None:
                 self.stats.inc('auth_error_count')
@@ -740,7 +1071,8 @@ class Balance(Resource):
             # Authentication
             user = self.RouterPB.authenticateUser(
                 username=request.args['username'][0],
-                password=request.args['password'][0]
+                password=request.args['password'][0],
+                stats=self.stats
             )
             if user is None:
                 self.stats.inc('auth_error_count')
@@ -832,6 +1164,8 @@ class HTTPApi(Resource):
         # Set http url routings
         log.debug("Setting http url routing for /send")
         self.putChild('send', Send(config, RouterPB, SMPPClientManagerPB, stats, log, interceptor))
+        log.debug("Setting http url routing for /sendbulk")
+        self.putChild('sendbulk', SendBulk(config, RouterPB, SMPPClientManagerPB, stats, log, interceptor))
         log.debug("Setting http url routing for /rate")
         self.putChild('rate', Rate(config, RouterPB, stats, log, interceptor))
         log.debug("Setting http url routing for /balance")
@@ -15,6 +15,8 @@ class HttpAPIStatistics(Stats):
             'request_count': 0,
             'last_request_at': 0,
             'auth_error_count': 0,
+            'auth_cache_hit_count': 0,
+            'auth_cache_miss_count': 0,
             'route_error_count': 0,
             'interceptor_error_count': 0,
             'interceptor_count': 0,
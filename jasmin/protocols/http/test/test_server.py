@@ -1,4 +1,5 @@
 import base64
+import cPickle as pickle
 import json
 from datetime import datetime
 
@@ -25,10 +26,8 @@ class HTTPApiTestCases(TestCase):
         self.RouterPB_f = RouterPB(RouterPBConfigInstance)
 
         # Provision Router with User and Route
-        self.g1 = Group(1)
-        self.u1 = User(1, self.g1, 'nathalie', 'correct')
-        self.RouterPB_f.groups.append(self.g1)
-        self.RouterPB_f.users.append(self.u1)
+        self.u1 = self.provision_user(User(1, Group(1), 'nathalie', 'correct'))
+        self.g1 = self.RouterPB_f.getGroup(1)
         self.RouterPB_f.mt_routing_table.add(DefaultRoute(SmppClientConnector('abc')), 0)
 
         # Instanciate a SMPPClientManagerPB (a requirement for HTTPApi)
@@ -42,6 +41,15 @@ class HTTPApiTestCases(TestCase):
     def tearDown(self):
         self.RouterPB_f.cancelPersistenceTimer()
 
+    def provision_user(self, user):
+        """Provision RouterPB with user (and its group if missing) and return RouterPB's own copy
+        of it, this is normally done through jcli API"""
+        if self.RouterPB_f.getGroup(user.group.gid) is None:
+            self.RouterPB_f.perspective_group_add(pickle.dumps(user.group, pickle.HIGHEST_PROTOCOL))
+        self.RouterPB_f.perspective_user_add(pickle.dumps(user, pickle.HIGHEST_PROTOCOL))
+
+        return self.RouterPB_f.getUser(user.uid)
+
 
 class PingTestCases(HTTPApiTestCases):
     @defer.inlineCallbacks
@@ -347,6 +355,96 @@ class SendTestCases(HTTPApiTestCases):
                          "Error \"Invalid hex-content data: ")
 
 
+class SendBulkTestCases(HTTPApiTestCases):
+    username = 'nathalie'
+
+    def setUp(self):
+        HTTPApiTestCases.setUp(self)
+
+        self.u1.mt_credential.setAuthorization('http_bulk', True)
+
+        # Provision Router with an additional User on a rated Route
+        u2 = User(2, Group(2), 'user2', 'correct')
+        u2.mt_credential.setAuthorization('http_bulk', True)
+        u2.mt_credential.setQuota('balance', 2.0)
+        self.u2 = self.provision_user(u2)
+        route = StaticMTRoute([GroupFilter(Group(2))], SmppClientConnector('abc'), 1.5)
+        self.RouterPB_f.mt_routing_table.add(route, 2)
+
+    def sendbulk(self, body, username='nathalie'):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        return self.web.post("sendbulk", {'username': username, 'password': 'correct'}, body)
+
+    @defer.inlineCallbacks
+    def test_sendbulk_not_authorized(self):
+        self.u1.mt_credential.setAuthorization('http_bulk', False)
+
+        response = yield self.sendbulk({'messages': [{'to': '06155423', 'content': 'anycontent'}]})
+        self.assertEqual(response.responseCode, 400)
+        self.assertEqual(response.value(),
+                         "Error \"Authorization failed for user [%s] (Cannot send bulk MT messages).\"" % self.u1)
+
+    @defer.inlineCallbacks
+    def test_sendbulk_with_incorrect_args(self):
+        response = yield self.web.post("sendbulk", {'username': self.username, 'passwd': 'correct'},
+                                       json.dumps({'messages': [{'to': '06155423', 'content': 'anycontent'}]}))
+        self.assertEqual(response.responseCode, 400)
+        self.assertEqual(response.value(), "Error \"Mandatory argument [password] is not found.\"")
+
+    @defer.inlineCallbacks
+    def test_sendbulk_with_incorrect_body(self):
+        for body in ['not json', {}, {'messages': []}, {'messages': ['06155423']},
+                     {'globals': 'anycontent', 'messages': [{'to': '06155423'}]}]:
+            response = yield self.sendbulk(body)
+            self.assertEqual(response.responseCode, 400)
+            self.assertEqual(response.value()[:7], "Error \"")
+
+    @defer.inlineCallbacks
+    def test_sendbulk_too_many_messages(self):
+        response = yield self.sendbulk({'globals': {'content': 'anycontent'},
+                                        'messages': [{'to': ['06155423'] * 1001}]})
+        self.assertEqual(response.responseCode, 400)
+        self.assertEqual(response.value(), "Error \"Too many messages, maximum is 1000.\"")
+
+    @defer.inlineCallbacks
+    def test_sendbulk_results(self):
+        "One result line is returned per message and destination, in order"
+        _submit_sm_request_count = self.u1.getCnxStatus().httpapi['submit_sm_request_count']
+
+        response = yield self.sendbulk({'globals': {'content': 'anycontent'},
+                                        'messages': [{'to': ['06155423', '06155424']},
+                                                     {'to': 'abc'},
+                                                     {'to': '06155425', 'hex-content': '00'}]})
+        self.assertEqual(response.responseCode, 200)
+        # Sending fails since SMPPClientManagerPB is not really running
+        self.assertEqual(response.value().split('\n'), [
+            "Error \"Cannot send submit_sm, check SMPPClientManagerPB log file for details\"",
+            "Error \"Cannot send submit_sm, check SMPPClientManagerPB log file for details\"",
+            "Error \"Argument [to] has an invalid value: [abc].\"",
+            "Error \"content and hex-content cannot be used both in same request.\"",
+            ""])
+        self.assertEqual(self.u1.getCnxStatus().httpapi['submit_sm_request_count'], _submit_sm_request_count + 4)
+
+    @defer.inlineCallbacks
+    def test_sendbulk_charging(self):
+        "User is charged for all messages or for none of them"
+        response = yield self.sendbulk({'globals': {'content': 'anycontent'},
+                                        'messages': [{'to': ['06155423', '06155424']}]}, 'user2')
+        self.assertEqual(response.responseCode, 200)
+        self.assertEqual(response.value().split('\n'), [
+            "Error \"Cannot charge submit_sm, check RouterPB log file for details\"",
+            "Error \"Cannot charge submit_sm, check RouterPB log file for details\"",
+            ""])
+        self.assertEqual(self.u2.mt_credential.getQuota('balance'), 2)
+
+        response = yield self.sendbulk({'messages': [{'to': '06155423', 'content': 'anycontent'}]}, 'user2')
+        self.assertEqual(response.responseCode, 200)
+        self.assertEqual(response.value(),
+                         "Error \"Cannot send submit_sm, check SMPPClientManagerPB log file for details\"\n")
+        self.assertEqual(self.u2.mt_credential.getQuota('balance'), 0.5)
+
+
 class RateTestCases(HTTPApiTestCases):
     def setUp(self):
         HTTPApiTestCases.setUp(self)
@@ -355,8 +453,8 @@ class RateTestCases(HTTPApiTestCases):
         u2 = User(2, Group(2), 'user2', 'correct')
         u3 = User(3, Group(2), 'user3', 'correct')
         u3.mt_credential.setQuota('balance', 10)
-        self.RouterPB_f.users.append(u2)
-        self.RouterPB_f.users.append(u3)
+        self.provision_user(u2)
+        self.provision_user(u3)
         filters = [GroupFilter(Group(2))]
         route = StaticMTRoute(filters, SmppClientConnector('abc'), 1.5)
         self.RouterPB_f.mt_routing_table.add(route, 2)
@@ -452,8 +550,8 @@ class BalanceTestCases(HTTPApiTestCases):
         u2.mt_credential.setQuota('submit_sm_count', 30)
         u3 = User(3, Group(2), 'user3', 'correct')
         u3.mt_credential.setQuota('balance', 10)
-        self.RouterPB_f.users.append(u2)
-        self.RouterPB_f.users.append(u3)
+        self.provision_user(u2)
+        self.provision_user(u3)
 
     @defer.inlineCallbacks
     def test_balance_with_correct_args(self):
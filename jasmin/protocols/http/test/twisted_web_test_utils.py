@@ -1,13 +1,16 @@
 # https://gist.github.com/1873035#file_twisted_web_test_utils.py
 
+from StringIO import StringIO
+
 from twisted.internet.defer import succeed
 from twisted.web import server
 from twisted.web.test.test_web import DummyRequest
 
 class SmartDummyRequest(DummyRequest):
-    def __init__(self, method, url, args=None):
+    def __init__(self, method, url, args=None, content=''):
         DummyRequest.__init__(self, url.split('/'))
         self.method = method
+        self.content = StringIO(content)
 
         # set args
         args = args or {}
@@ -24,12 +27,12 @@ class DummySite(server.Site):
         return self._request("GET", url, args)
 
 
-    def post(self, url, args=None):
-        return self._request("POST", url, args)
+    def post(self, url, args=None, content=''):
+        return self._request("POST", url, args, content)
 
 
-    def _request(self, method, url, args):
-        request = SmartDummyRequest(method, url, args)
+    def _request(self, method, url, args, content=''):
+        request = SmartDummyRequest(method, url, args, content)
         resource = self.getResourceFor(request)
         result = resource.render(request)
         return self._resolveResult(request, result)
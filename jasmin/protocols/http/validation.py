@@ -92,6 +92,13 @@ class HttpAPICredentialValidator(AbstractCredentialValidator):
             raise CredentialValidationError(
                 'Authorization failed for user [%s] (Setting hex content not authorized).' % self.user)
 
+    def _checkSendBulkAuthorizations(self):
+        """Bulk MT Authorizations check"""
+
+        if not self.user.mt_credential.getAuthorization('http_bulk'):
+            raise CredentialValidationError(
+                'Authorization failed for user [%s] (Cannot send bulk MT messages).' % self.user)
+
     def _checkBalanceAuthorizations(self):
         """Balance Authorizations check"""
 
@@ -151,6 +158,8 @@ class HttpAPICredentialValidator(AbstractCredentialValidator):
         if self.action == 'Send':
             self._checkSendAuthorizations()
             self._checkSendFilters()
+        elif self.action == 'SendBulk':
+            self._checkSendBulkAuthorizations()
         elif self.action == 'Rate':
             self._checkRateAuthorizations()
         elif self.action == 'Balance':
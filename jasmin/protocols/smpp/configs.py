@@ -185,6 +185,25 @@ class SMPPClientConfig(object):
         if (not isinstance(self.submit_sm_throughput, int)
                 and not isinstance(self.submit_sm_throughput, float)):
             raise TypeMismatch('submit_sm_throughput must be an integer or float')
+        # Number of submit_sm that can be sent at once (without throttling) when throughput
+        # was not reached for a while
+        self.submit_sm_burst = kwargs.get('submit_sm_burst', 1)
+        if not isinstance(self.submit_sm_burst, int) or self.submit_sm_burst < 1:
+            raise TypeMismatch('submit_sm_burst must be an integer greater than 0')
+        # Maximum number of submit_sm pdus sent and still waiting for their submit_sm_resp,
+        # consuming from submit.sm queue is paused when the window is full, 0 for unlimited
+        self.submit_sm_window = kwargs.get('submit_sm_window', 0)
+        if not isinstance(self.submit_sm_window, int) or self.submit_sm_window < 0:
+            raise TypeMismatch('submit_sm_window must be a positive integer')
+        # Number of parallel sessions (binds) opened by the connector, submit_sm are sent through
+        # the bound session having the least outstanding transactions
+        self.bind_count = kwargs.get('bind_count', 1)
+        if not isinstance(self.bind_count, int) or self.bind_count < 1:
+            raise TypeMismatch('bind_count must be an integer greater than 0')
+        # AMQP prefetch count (basic_qos) of submit.sm queue consumer, 0 for unlimited
+        self.prefetch_count = kwargs.get('prefetch_count', 0)
+        if not isinstance(self.prefetch_count, int) or self.prefetch_count < 0:
+            raise TypeMismatch('prefetch_count must be a positive integer')
 
         # DLR Message id bases from submit_sm_resp to deliver_sm, possible values:
         # [0] (default) : submit_sm_resp and deliver_sm messages IDs are on the same base.
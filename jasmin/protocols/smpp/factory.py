@@ -10,7 +10,7 @@ from twisted.internet import defer, reactor, ssl
 from twisted.internet.protocol import ClientFactory
 
 from jasmin.routing.Routables import RoutableSubmitSm
-from jasmin.vendor.smpp.twisted.protocol import DataHandlerResponse
+from jasmin.vendor.smpp.twisted.protocol import DataHandlerResponse, SMPPSessionStates
 from jasmin.vendor.smpp.twisted.server import SMPPBindManager as _SMPPBindManager
 from jasmin.vendor.smpp.twisted.server import SMPPServerFactory as _SMPPServerFactory
 from .error import *
@@ -32,14 +32,15 @@ class SmppClientIsNotConnected(Exception):
 class SMPPClientFactory(ClientFactory):
     protocol = SMPPClientProtocol
 
-    def __init__(self, config, msgHandler=None):
+    def __init__(self, config, msgHandler=None, session=0):
         self.reconnectTimer = None
         self.smpp = None
         self.connectionRetry = True
         self.config = config
+        self.session = session
 
-        # Setup statistics collector
-        self.stats = SMPPClientStatsCollector().get(cid=self.config.id)
+        # Setup statistics collector, session statistics are aggregated in the connector's ones
+        self.stats = SMPPClientStatsCollector().get(cid=self.config.id).getSession(session)
         self.stats.set('created_at', datetime.now())
 
         # Set up a dedicated logger
@@ -188,6 +189,136 @@ class SMPPClientFactory(ClientFactory):
         else:
             return self.smpp.sessionState
 
+    def getOutstandingCount(self):
+        """Number of requests sent and still waiting for their response"""
+        if self.smpp is None:
+            return 0
+        else:
+            return len(self.smpp.outTxns)
+
+
+class SMPPClientSessionPool(object):
+    """Sessions (binds) of one client connector
+
+    The connector opens config.bind_count parallel sessions, each one is a SMPPClientFactory
+    reconnecting on its own, this pool is used the same way as a single SMPPClientFactory:
+      - smpp is the bound session having the least outstanding transactions,
+      - getSessionState() is the most advanced state of all sessions,
+      - msgHandler is set on every session.
+    """
+
+    def __init__(self, config, msgHandler=None):
+        self.config = config
+        self.stats = SMPPClientStatsCollector().get(cid=self.config.id)
+        self.factories = []
+        self._msgHandler = msgHandler
+
+        self.resize()
+        self.log = self.factories[0].log
+
+    def resize(self):
+        """Open or drop sessions to have config.bind_count of them, dropped sessions are
+        disconnected"""
+        while len(self.factories) < self.config.bind_count:
+            self.factories.append(
+                SMPPClientFactory(self.config, self._msgHandler, session=len(self.factories)))
+
+        for factory in self.factories[self.config.bind_count:]:
+            factory.disconnectAndDontRetryToConnect()
+        del self.factories[self.config.bind_count:]
+
+    def getMsgHandler(self):
+        return self.factories[0].msgHandler
+
+    def setMsgHandler(self, msgHandler):
+        self._msgHandler = msgHandler
+        for factory in self.factories:
+            factory.msgHandler = msgHandler
+
+    msgHandler = property(getMsgHandler, setMsgHandler)
+
+    @property
+    def smpp(self):
+        """The bound session having the least outstanding transactions, or any connected session
+        if none is bound (None if no session is connected)
+
+        Sessions having submit_sm_window outstanding transactions are skipped unless all bound
+        sessions are full."""
+        connected = [f for f in self.factories if f.smpp is not None]
+        if len(connected) == 0:
+            return None
+
+        bound = [f for f in connected if f.smpp.isBound()]
+        if len(bound) == 0:
+            return connected[0].smpp
+
+        if self.config.submit_sm_window > 0:
+            available = [f for f in bound if f.getOutstandingCount() < self.config.submit_sm_window]
+            if len(available) > 0:
+                bound = available
+
+        return min(bound, key=lambda f: f.getOutstandingCount()).smpp
+
+    def getBoundCount(self):
+        """Number of currently bound sessions"""
+        return len([f for f in self.factories if f.smpp is not None and f.smpp.isBound()])
+
+    def getConfig(self):
+        return self.config
+
+    def getSessionState(self):
+        """Return the state of the most advanced session, a connector is bound if any of its
+        sessions is bound"""
+        states = [f.getSessionState() for f in self.factories]
+        for state in [SMPPSessionStates.BOUND_TRX, SMPPSessionStates.BOUND_TX,
+                      SMPPSessionStates.BOUND_RX, SMPPSessionStates.BIND_TRX_PENDING,
+                      SMPPSessionStates.BIND_TX_PENDING, SMPPSessionStates.BIND_RX_PENDING,
+                      SMPPSessionStates.OPEN, SMPPSessionStates.UNBIND_PENDING,
+                      SMPPSessionStates.UNBIND_RECEIVED]:
+            if state in states:
+                return state
+
+        for state in states:
+            if state is not None:
+                return state
+
+        return None
+
+    def getSessionStates(self):
+        return [f.getSessionState() for f in self.factories]
+
+    def getExitDeferred(self):
+        """Get a Deferred firing when every session is disconnected and exited"""
+        return defer.DeferredList([f.getExitDeferred() for f in self.factories])
+
+    def connectAndBind(self):
+        """Connect and bind every session, the returned deferred is callbacked once a session
+        is bound and errbacked if all of them failed"""
+        self.resize()
+
+        d = defer.DeferredList([f.connectAndBind() for f in self.factories],
+                               fireOnOneCallback=True, consumeErrors=True)
+
+        def _bound(result):
+            if isinstance(result, tuple):
+                # (result, index) of the first bound session
+                return result[0]
+
+            # Every session failed, errback with the first failure
+            return result[0][1]
+        return d.addCallback(_bound)
+
+    def disconnect(self):
+        return defer.DeferredList([defer.maybeDeferred(f.disconnect) for f in self.factories])
+
+    def stopConnectionRetrying(self):
+        for factory in self.factories:
+            factory.stopConnectionRetrying()
+
+    def disconnectAndDontRetryToConnect(self):
+        return defer.DeferredList(
+            [defer.maybeDeferred(f.disconnectAndDontRetryToConnect) for f in self.factories])
+
 
 class CtxFactory(ssl.ClientContextFactory):
 
@@ -314,6 +445,7 @@ class SMPPServerFactory(_SMPPServerFactory):
         else:
             return self.submit_sm_post_interception(routable=routable, system_id=system_id, proto=proto)
 
+    @defer.inlineCallbacks
     def submit_sm_post_interception(self, *args, **kw):
         """This event handler will deliver the submit_sm to the right smppc connector.
         Note that Jasmin deliver submit_sm messages like this:
@@ -415,6 +547,8 @@ class SMPPServerFactory(_SMPPServerFactory):
             bill = route.getBillFor(routable.user)
             self.log.debug("SubmitSmBill [bid:%s] [ttlamounts:%s] generated for this SubmitSmPDU",
                            bill.bid, bill.getTotalAmounts())
+            # Shared quotas are charged from leases, wait for them to be refilled if needed
+            yield self.RouterPB.leaseUserQuotasForSubmitSms(routable.user, bill)
             charging_requirements = []
             u_balance = routable.user.mt_credential.getQuota('balance')
             u_subsm_count = routable.user.mt_credential.getQuota('submit_sm_count')
@@ -492,9 +626,9 @@ class SMPPServerFactory(_SMPPServerFactory):
             status = pdu_types.CommandStatus.ESME_ROK
         finally:
             if message_id is not None:
-                return DataHandlerResponse(status=status, message_id=c.result)
+                defer.returnValue(DataHandlerResponse(status=status, message_id=c.result))
             elif status is not None:
-                return DataHandlerResponse(status=status)
+                defer.returnValue(DataHandlerResponse(status=status))
 
     def buildProtocol(self, addr):
         """Provision protocol with the dedicated logger
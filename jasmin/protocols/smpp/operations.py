@@ -19,21 +19,104 @@ gsm_chars_ext = (u"````````````````````^```````````````````{}`````\\````````````
                  u"|````````````````````````````````````€``````````````````````````")
 
 
+class _GsmEncodingTable(dict):
+    "unicode.translate() table deleting the characters it does not hold"
+
+    def __missing__(self, key):
+        return None
+
+
+def _gsm_tables():
+    """Build gsm_encode() and gsm_decode() translation tables, the extension table
+    (escaped by \\x1b) is used for characters missing from the default alphabet"""
+    encoding = _GsmEncodingTable()
+    decoding = dict((i, u'?') for i in range(256))
+    decoding_ext = {}
+
+    for idx, c in enumerate(gsm_chars):
+        encoding[ord(c)] = unichr(idx)
+        decoding[idx] = c
+    for idx, c in enumerate(gsm_chars_ext):
+        if c == u'`':
+            # Not in the extension table
+            continue
+        encoding.setdefault(ord(c), u'\x1b' + unichr(idx))
+        decoding_ext[chr(idx)] = c
+
+    return encoding, decoding, decoding_ext
+
+gsm_encoding_table, gsm_decoding_table, gsm_decoding_ext_table = _gsm_tables()
+
+
 def gsm_encode(plaintext):
-    """Will encode plaintext to gsm 338
-    Taken from
-    http://stackoverflow.com/questions/2452861/python-library-for-converting-plain-text-ascii-into-gsm-7-bit-character-set
+    """Will encode plaintext to gsm 338, characters having no gsm 338 representation are dropped
+
+    Every character is a septet (one byte), characters from the extension table are two septets
+    (escaped with \\x1b)
     """
-    res = ""
-    for c in plaintext:
-        idx = gsm_chars.find(c)
-        if idx != -1:
-            res += chr(idx)
+    return unicode(plaintext).translate(gsm_encoding_table).encode('ascii')
+
+
+def gsm_decode(data):
+    """Will decode gsm 338 data (one septet per byte) to unicode, an escaped septet missing
+    from the extension table is decoded from the default alphabet"""
+    parts = data.split('\x1b')
+    res = [parts[0].decode('latin-1').translate(gsm_decoding_table)]
+    for part in parts[1:]:
+        if part == '':
+            # Escape followed by another escape or ending data
             continue
-        idx = gsm_chars_ext.find(c)
-        if idx != -1:
-            res += chr(27) + chr(idx)
-    return res
+        res.append(gsm_decoding_ext_table.get(part[0], gsm_decoding_table[ord(part[0])]))
+        res.append(part[1:].decode('latin-1').translate(gsm_decoding_table))
+    return u''.join(res)
+
+
+def gsm_septets_length(plaintext):
+    "Returns the number of septets plaintext is taking once encoded to gsm 338"
+    return len(unicode(plaintext).translate(gsm_encoding_table))
+
+
+def gsm_split(data, length):
+    """Slice gsm 338 data into segments of at most length septets, escaped septets
+    (extension table characters) are never split across two segments"""
+    segments = []
+    start = 0
+    while start < len(data):
+        end = start + length
+        segment = data[start:end]
+        if end < len(data) and (len(segment) - len(segment.rstrip('\x1b'))) % 2 == 1:
+            # Segment is ending with an escape, keep it for the next segment
+            segment = segment[:-1]
+        segments.append(segment)
+        start += len(segment)
+    return segments
+
+
+def gsm_pack_septets(data):
+    """Pack data septets (one per byte) into octets as defined in 3GPP TS 23.038 (the first
+    septet is in the lowest bits of the first octet)"""
+    if len(data) == 0:
+        return ''
+
+    # Septets are packed in a single integer, first septet in the lowest bits
+    value = 0
+    for septet in reversed(bytearray(data)):
+        value = (value << 7) | (septet & 0x7f)
+
+    length = (len(data) * 7 + 7) / 8
+    return ('%0*x' % (length * 2, value)).decode('hex')[::-1]
+
+
+def gsm_unpack_septets(data, count=None):
+    """Unpack octets packed by gsm_pack_septets() to septets (one per byte), count is the number
+    of packed septets (defaults to every septet data can hold)"""
+    if count is None:
+        count = len(data) * 8 / 7
+    if count == 0:
+        return ''
+
+    value = int(data[::-1].encode('hex'), 16)
+    return str(bytearray((value >> (7 * i)) & 0x7f for i in xrange(count)))
 
 
 message_state_map = {
@@ -185,7 +268,18 @@ class SMPPOperationFactory(object):
         # if SM is longer than maxSmLength, build multiple SubmitSMs
         # and link them
         if smLength > maxSmLength:
-            total_segments = int(math.ceil(smLength / float(slicedMaxSmLength)))
+            if kwargs['data_coding'] == 0:
+                # GSM 03.38 escaped septets are not split across segments
+                segments = gsm_split(longMessage, slicedMaxSmLength)
+            else:
+                if bits == 16:
+                    slicedLength = slicedMaxSmLength * 2
+                else:
+                    slicedLength = slicedMaxSmLength
+                segments = [longMessage[slicedLength * i:slicedLength * (i + 1)]
+                            for i in range(int(math.ceil(smLength / float(slicedMaxSmLength))))]
+
+            total_segments = len(segments)
             # Obey to configured longContentMaxParts
             if total_segments > self.long_content_max_parts:
                 total_segments = self.long_content_max_parts
@@ -202,10 +296,7 @@ class SMPPOperationFactory(object):
                 except NameError:
                     previousPdu = None
 
-                if bits == 16:
-                    kwargs['short_message'] = longMessage[slicedMaxSmLength * i * 2:slicedMaxSmLength * (i + 1) * 2]
-                else:
-                    kwargs['short_message'] = longMessage[slicedMaxSmLength * i:slicedMaxSmLength * (i + 1)]
+                kwargs['short_message'] = segments[i]
                 tmpPdu = self._setConfigParamsInPDU(SubmitSM(**kwargs), kwargs)
                 if self.long_content_split == 'sar':
                     # Slice short_message and create the PDU using SAR options
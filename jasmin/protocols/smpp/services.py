@@ -1,6 +1,6 @@
 import logging
 from logging.handlers import TimedRotatingFileHandler
-from jasmin.protocols.smpp.factory import SMPPClientFactory
+from jasmin.protocols.smpp.factory import SMPPClientSessionPool
 from twisted.application import service
 from .configs import SMPPClientServiceConfig
 
@@ -12,7 +12,8 @@ class SMPPClientService(service.Service):
         self.stopCounter = 0
         self.config = config
         self.SMPPClientConfig = SMPPClientConfig
-        self.SMPPClientFactory = SMPPClientFactory(SMPPClientConfig)
+        # One SMPPClientFactory per session (bind), c.f. SMPPClientConfig.bind_count
+        self.SMPPClientFactory = SMPPClientSessionPool(SMPPClientConfig)
         self.SMPPClientServiceConfig = SMPPClientServiceConfig(self.config.getConfigFile())
 
         # Set up a dedicated logger
@@ -34,13 +34,50 @@ class ClientConnectorStatistics(ConnectorStatistics):
             "data_sm_count": 0,
             "elink_count": 0,
             "throttling_error_count": 0,
+            "throttling_tokens": 0,
+            "throttling_wait_time": 0,
+            "throttling_rate": 0,
+            "priority_lanes": {},
             "other_submit_error_count": 0,
             "interceptor_error_count": 0,
             "interceptor_count": 0}
 
+        # Statistics of every session (bind) of the connector, c.f. bind_count
+        self.sessions = {}
+
     def getStats(self):
         return self._stats
 
+    def getSession(self, session):
+        """Return a session's stats object or instanciate a new one"""
+        if session not in self.sessions:
+            self.sessions[session] = ClientSessionStatistics(self, session)
+
+        return self.sessions[session]
+
+
+class ClientSessionStatistics(ClientConnectorStatistics):
+    """One client connector session statistics holder, they are aggregated in the
+    connector statistics"""
+
+    def __init__(self, connector, session):
+        self.connector = connector
+        self.session = session
+
+        ClientConnectorStatistics.__init__(self, connector.cid)
+
+    def set(self, key, value):
+        ClientConnectorStatistics.set(self, key, value)
+        self.connector.set(key, value)
+
+    def inc(self, key, inc=1):
+        ClientConnectorStatistics.inc(self, key, inc)
+        self.connector.inc(key, inc)
+
+    def dec(self, key, inc=1):
+        ClientConnectorStatistics.dec(self, key, inc)
+        self.connector.dec(key, inc)
+
 
 class ServerConnectorStatistics(ConnectorStatistics):
     """One server connector statistics holder"""
@@ -61,6 +98,8 @@ class ServerConnectorStatistics(ConnectorStatistics):
             "bind_rx_count": 0,
             "bind_tx_count": 0,
             "unbind_count": 0,
+            "auth_cache_hit_count": 0,
+            "auth_cache_miss_count": 0,
             "submit_sm_request_count": 0,
             "submit_sm_count": 0,
             "deliver_sm_count": 0,
@@ -5,7 +5,7 @@ Test cases for jasmin.protocols.smpp.configs module.
 from twisted.trial.unittest import TestCase
 
 from jasmin.protocols.smpp.configs import ConfigUndefinedIdError, ConfigInvalidIdError
-from jasmin.protocols.smpp.configs import SMPPClientConfig
+from jasmin.protocols.smpp.configs import SMPPClientConfig, TypeMismatch
 
 
 class SMPPClientConfigCases(TestCase):
@@ -16,3 +16,29 @@ class SMPPClientConfigCases(TestCase):
         invalidValues = ['zzz s', '', 'a,', 'r#r', '9a', '&"()=+~#{[|\`\^@]}', 'a123456789012345678901234-', 'aa']
         for invalidValue in invalidValues:
             self.assertRaises(ConfigInvalidIdError, SMPPClientConfig, id=invalidValue)
+
+    def test_submit_sm_window_and_prefetch_count(self):
+        config = SMPPClientConfig(id='abc')
+        self.assertEqual(config.submit_sm_window, 0)
+        self.assertEqual(config.prefetch_count, 0)
+
+        config = SMPPClientConfig(id='abc', submit_sm_window=10, prefetch_count=20)
+        self.assertEqual(config.submit_sm_window, 10)
+        self.assertEqual(config.prefetch_count, 20)
+
+        for invalidValue in [-1, 1.5, '10']:
+            self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', submit_sm_window=invalidValue)
+            self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', prefetch_count=invalidValue)
+
+    def test_submit_sm_burst(self):
+        self.assertEqual(SMPPClientConfig(id='abc').submit_sm_burst, 1)
+
+        for invalidValue in [0, -1, 1.5, '10']:
+            self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', submit_sm_burst=invalidValue)
+
+    def test_bind_count(self):
+        self.assertEqual(SMPPClientConfig(id='abc').bind_count, 1)
+        self.assertEqual(SMPPClientConfig(id='abc', bind_count=4).bind_count, 4)
+
+        for invalidValue in [0, -1, 1.5, '10']:
+            self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', bind_count=invalidValue)
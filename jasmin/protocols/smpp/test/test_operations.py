@@ -1,3 +1,4 @@
+# -*- coding: utf-8 -*-
 """
 Test cases for jasmin.protocols.smpp.operations module.
 """
@@ -5,7 +6,9 @@ Test cases for jasmin.protocols.smpp.operations module.
 import binascii
 from twisted.trial.unittest import TestCase
 from jasmin.protocols.smpp.configs import SMPPClientConfig
-from jasmin.protocols.smpp.operations import SMPPOperationFactory, UnknownMessageStatusError
+from jasmin.protocols.smpp.operations import (SMPPOperationFactory, UnknownMessageStatusError, gsm_encode,
+                                              gsm_decode, gsm_septets_length, gsm_split, gsm_pack_septets,
+                                              gsm_unpack_septets)
 from jasmin.vendor.smpp.pdu.pdu_types import CommandId, CommandStatus, MessageState
 from jasmin.vendor.smpp.pdu.operations import SubmitSM, DeliverSM, DataSM
 
@@ -93,6 +96,53 @@ class SubmitTest(OperationsTest):
         # The last seqNum shall be equal to total segments
         self.assertEquals(lastSeqNum, pdu.params['sar_total_segments'])
 
+    def test_encode_gsm_long_escaped(self):
+        "Extension table characters are not split across parts"
+        sm = gsm_encode(u'a' * 152 + u'€' + u'b' * 10)
+        pdu = self.buildSubmitSmTest(sm)
+
+        self.assertEquals(pdu.params['short_message'], 'a' * 152)
+        self.assertEquals(pdu.nextPdu.params['short_message'], '\x1be' + 'b' * 10)
+        self.assertEquals(pdu.params['sar_total_segments'], 2)
+
+class GsmTest(TestCase):
+    def test_encode(self):
+        self.assertEquals(gsm_encode(u'Hello @ £5 {ok} €'), 'Hello \x00 \x015 \x1b(ok\x1b) \x1be')
+        self.assertEquals(gsm_encode('ascii'), 'ascii')
+
+    def test_encode_unknown(self):
+        "Characters out of GSM 03.38 alphabet (extension table fillers included) are dropped"
+        self.assertEquals(gsm_encode(u'a\u4e2db`c'), 'abc')
+
+    def test_decode(self):
+        self.assertEquals(gsm_decode('Hello \x00 \x015 \x1b(ok\x1b) \x1be'), u'Hello @ £5 {ok} €')
+        # Escaped septet missing from the extension table and trailing escape
+        self.assertEquals(gsm_decode('\x1ba\x1b'), u'a')
+
+    def test_roundtrip(self):
+        text = u'@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ^{}\\[~]|€'
+        self.assertEquals(gsm_decode(gsm_encode(text)), text)
+
+    def test_septets_length(self):
+        self.assertEquals(gsm_septets_length(u'[Hello]'), 9)
+        self.assertEquals(gsm_septets_length(u'Hello\u4e2d'), 5)
+
+    def test_split(self):
+        self.assertEquals(gsm_split('abc\x1b(d', 4), ['abc', '\x1b(d'])
+        self.assertEquals(gsm_split('ab\x1b(cd', 4), ['ab\x1b(', 'cd'])
+        self.assertEquals(gsm_split('abcd', 4), ['abcd'])
+
+    def test_pack_septets(self):
+        # 'hellohello' example from 3GPP TS 23.038
+        self.assertEquals(binascii.b2a_hex(gsm_pack_septets('hellohello')), 'e8329bfd4697d9ec37')
+        self.assertEquals(gsm_unpack_septets(binascii.a2b_hex('e8329bfd4697d9ec37'), 10), 'hellohello')
+        self.assertEquals(gsm_pack_septets(''), '')
+
+    def test_unpack_septets_default_count(self):
+        sm = gsm_encode(u'12345678')
+        self.assertEquals(len(gsm_pack_septets(sm)), 7)
+        self.assertEquals(gsm_unpack_septets(gsm_pack_septets(sm)), sm)
+
 class DeliveryParsingTest(OperationsTest):
 
     def test_is_delivery_standard(self):
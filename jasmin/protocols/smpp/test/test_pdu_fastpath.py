@@ -0,0 +1,199 @@
+import StringIO
+import binascii
+import pickle
+import unittest
+from datetime import datetime
+
+from jasmin.vendor.smpp.pdu.operations import *
+from jasmin.vendor.smpp.pdu.pdu_encoding import PDUEncoder
+from jasmin.vendor.smpp.pdu.pdu_types import *
+
+
+def submit_sm(seqNum=1, **kwargs):
+    params = dict(
+        service_type='',
+        source_addr_ton=AddrTon.ALPHANUMERIC,
+        source_addr_npi=AddrNpi.UNKNOWN,
+        source_addr='Jasmin',
+        dest_addr_ton=AddrTon.INTERNATIONAL,
+        dest_addr_npi=AddrNpi.ISDN,
+        destination_addr='21698700177',
+        esm_class=EsmClass(EsmClassMode.STORE_AND_FORWARD, EsmClassType.DEFAULT),
+        protocol_id=0,
+        priority_flag=PriorityFlag.LEVEL_0,
+        registered_delivery=RegisteredDelivery(RegisteredDeliveryReceipt.SMSC_DELIVERY_RECEIPT_REQUESTED),
+        replace_if_present_flag=ReplaceIfPresentFlag.DO_NOT_REPLACE,
+        data_coding=DataCoding(DataCodingScheme.DEFAULT, DataCodingDefault.SMSC_DEFAULT_ALPHABET),
+        sm_default_msg_id=0,
+        short_message='Hello world !',
+    )
+    params.update(kwargs)
+    return SubmitSM(seqNum, **params)
+
+
+def deliver_sm(seqNum=1, **kwargs):
+    params = dict(
+        service_type='',
+        source_addr_ton=AddrTon.INTERNATIONAL,
+        source_addr_npi=AddrNpi.ISDN,
+        source_addr='21698700177',
+        dest_addr_ton=AddrTon.UNKNOWN,
+        dest_addr_npi=AddrNpi.UNKNOWN,
+        destination_addr='Jasmin',
+        esm_class=EsmClass(EsmClassMode.DEFAULT, EsmClassType.SMSC_DELIVERY_RECEIPT),
+        protocol_id=0,
+        priority_flag=PriorityFlag.LEVEL_0,
+        registered_delivery=RegisteredDelivery(RegisteredDeliveryReceipt.NO_SMSC_DELIVERY_RECEIPT_REQUESTED),
+        replace_if_present_flag=ReplaceIfPresentFlag.DO_NOT_REPLACE,
+        data_coding=DataCoding(DataCodingScheme.DEFAULT, DataCodingDefault.SMSC_DEFAULT_ALPHABET),
+        sm_default_msg_id=0,
+        short_message='id:4a843ce6 sub:001 dlvrd:001 submit date:1501010000 done date:1501010001 stat:DELIVRD err:000 text:',
+    )
+    params.update(kwargs)
+    return DeliverSM(seqNum, **params)
+
+
+class FastPathTestCase(unittest.TestCase):
+    def setUp(self):
+        self.fast = PDUEncoder()
+        self.generic = PDUEncoder(fastPath=False)
+
+    def getPDUs(self):
+        return [
+            submit_sm(),
+            submit_sm(
+                seqNum=0x7FFFFFFF,
+                esm_class=EsmClass(EsmClassMode.DEFAULT, EsmClassType.DEFAULT, [EsmClassGsmFeatures.UDHI_INDICATOR_SET]),
+                data_coding=DataCoding(DataCodingScheme.GSM_MESSAGE_CLASS,
+                                       DataCodingGsmMsg(DataCodingGsmMsgCoding.DATA_8BIT, DataCodingGsmMsgClass.CLASS_1)),
+                schedule_delivery_time=datetime(2015, 1, 1, 10, 0, 0),
+                validity_period=datetime(2015, 1, 2, 10, 0, 0),
+                short_message='\x05\x00\x03\x01\x02\x01' + 'x' * 150),
+            submit_sm(
+                data_coding=DataCoding(schemeData=DataCodingDefault.UCS2),
+                sar_msg_ref_num=12, sar_total_segments=3, sar_segment_seqnum=2,
+                short_message='\x00H\x00e\x00l\x00l\x00o'),
+            submit_sm(short_message=None, message_payload='Long message ' * 30),
+            submit_sm(source_addr_ton=None, source_addr_npi=None, registered_delivery=None,
+                      short_message=''),
+            SubmitSMResp(2, message_id='4a843ce6-4a7c-4d07-b9ac-49a9c5f6d1b0'),
+            SubmitSMResp(3, status=CommandStatus.ESME_RTHROTTLED),
+            SubmitSMResp(4, status=CommandStatus.ESME_RINVDSTADR),
+            deliver_sm(),
+            deliver_sm(
+                seqNum=5,
+                receipted_message_id='4a843ce6',
+                message_state=MessageState.DELIVERED,
+                network_error_code='\x03\x00\x00'),
+            deliver_sm(
+                seqNum=6,
+                esm_class=EsmClass(EsmClassMode.DEFAULT, EsmClassType.DEFAULT),
+                source_port=1234, destination_port=5678,
+                short_message='MO message'),
+            DeliverSMResp(7),
+            DeliverSMResp(8, status=CommandStatus.ESME_RX_T_APPN),
+            DataSM(
+                9,
+                service_type='',
+                source_addr_ton=AddrTon.ALPHANUMERIC,
+                source_addr_npi=AddrNpi.UNKNOWN,
+                source_addr='Jasmin',
+                dest_addr_ton=AddrTon.INTERNATIONAL,
+                dest_addr_npi=AddrNpi.ISDN,
+                destination_addr='21698700177',
+                esm_class=EsmClass(EsmClassMode.DEFAULT, EsmClassType.DEFAULT),
+                registered_delivery=RegisteredDelivery(RegisteredDeliveryReceipt.NO_SMSC_DELIVERY_RECEIPT_REQUESTED),
+                data_coding=DataCoding(),
+                message_payload='Data sm payload',
+                more_messages_to_send=MoreMessagesToSend.MORE_MESSAGES),
+            DataSMResp(10, message_id='abcd', delivery_failure_reason=DeliveryFailureReason.DESTINATION_UNAVAILABLE),
+            EnquireLink(11),
+            EnquireLinkResp(12),
+        ]
+
+    def decode(self, encoder, data):
+        return encoder.decode(StringIO.StringIO(data))
+
+    def decodeOutcome(self, encoder, data):
+        try:
+            return self.decode(encoder, data)
+        except Exception, e:
+            return (e.__class__, getattr(e, 'status', None))
+
+    def test_encode_equivalence(self):
+        for pdu, fastPDU in zip(self.getPDUs(), self.getPDUs()):
+            self.assertNotEqual(None, self.fast.fastPath.encode(fastPDU), pdu)
+            self.assertEqual(self.generic.encode(pdu), self.fast.encode(fastPDU), pdu)
+
+    def test_decode_equivalence(self):
+        for pdu in self.getPDUs():
+            encoded = self.generic.encode(pdu)
+
+            self.assertNotEqual(None, self.fast.fastPath.decode(encoded), pdu)
+            self.assertEqual(self.decode(self.generic, encoded), self.decode(self.fast, encoded))
+
+    def test_unpickled_pdu(self):
+        "Enum values of an unpickled pdu are not the same objects as pdu_types ones"
+        for pdu in self.getPDUs():
+            unpickled = pickle.loads(pickle.dumps(pdu, pickle.HIGHEST_PROTOCOL))
+            expected = self.generic.encode(pickle.loads(pickle.dumps(pdu, pickle.HIGHEST_PROTOCOL)))
+
+            self.assertEqual(expected, self.fast.encode(unpickled))
+
+    def test_decode_file_position(self):
+        pdus = self.getPDUs()
+        data = ''.join([self.generic.encode(pdu) for pdu in pdus])
+
+        file = StringIO.StringIO(data)
+        for pdu in pdus:
+            self.assertEqual(self.decode(self.generic, self.generic.encode(pdu)), self.fast.decode(file))
+        self.assertEqual(len(data), file.tell())
+
+    def test_decode_padding(self):
+        "Padding bytes up to command_length are ignored (c.f. #124)"
+        encoded = self.generic.encode(EnquireLink(11))
+        padded = '\x00\x00\x00\x12' + encoded[4:] + '\x00\x00'
+
+        self.assertEqual(self.decode(self.generic, padded), self.decode(self.fast, padded))
+
+    def test_corrupted_pdus(self):
+        "Fast path must raise the same errors as the generic decoder"
+        for pdu in self.getPDUs():
+            encoded = self.generic.encode(pdu)
+
+            # Truncated PDUs
+            for i in range(len(encoded)):
+                self.assertEqual(self.decodeOutcome(self.generic, encoded[:i]),
+                                 self.decodeOutcome(self.fast, encoded[:i]))
+
+            # Bad values
+            for i in range(4, len(encoded)):
+                for c in ('\x00', '\x07', '\xff'):
+                    corrupted = encoded[:i] + c + encoded[i + 1:]
+                    self.assertEqual(self.decodeOutcome(self.generic, corrupted),
+                                     self.decodeOutcome(self.fast, corrupted))
+
+    def test_fallback(self):
+        pdu = BindTransceiver(1, system_id='test', password='secret', system_type='', interface_version=0x34,
+                              addr_ton=AddrTon.UNKNOWN, addr_npi=AddrNpi.UNKNOWN, address_range='')
+        encoded = self.generic.encode(pdu)
+
+        self.assertEqual(None, self.fast.fastPath.encode(pdu))
+        self.assertEqual(None, self.fast.fastPath.decode(encoded))
+        self.assertEqual(encoded, self.fast.encode(pdu))
+        self.assertEqual(pdu, self.decode(self.fast, encoded))
+
+    def test_vendor_specific_bypass(self):
+        "Unsupported vendor specific tags are silently dropped"
+        pdu = deliver_sm(seqNum=13, receipted_message_id='4a843ce6')
+        encoded = self.generic.encode(pdu)
+        tlv = '\x14\x01\x00\x02AB'
+        encoded = binascii.a2b_hex('%08x' % (len(encoded) + len(tlv))) + encoded[4:] + tlv
+
+        self.assertNotEqual(None, self.fast.fastPath.decode(encoded))
+        self.assertEqual(self.decode(self.generic, encoded), self.decode(self.fast, encoded))
+        self.assertEqual(pdu, self.decode(self.fast, encoded))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,7 +13,7 @@ from twisted.python import log
 from twisted.trial.unittest import TestCase
 
 from jasmin.protocols.smpp.configs import SMPPClientConfig
-from jasmin.protocols.smpp.factory import SMPPClientFactory
+from jasmin.protocols.smpp.factory import SMPPClientFactory, SMPPClientSessionPool
 from jasmin.protocols.smpp.operations import SMPPOperationFactory
 from jasmin.protocols.smpp.protocol import *
 from jasmin.protocols.smpp.stats import SMPPClientStatsCollector
@@ -1408,6 +1408,55 @@ class DeliverSmAckTestCase(SimulatorTestCase):
         self.assertEqual(recv1.status, CommandStatus.ESME_ROK)
         self.verifyUnbindSuccess(smpp, sent2, recv2)
 
+class SessionPoolTestCase(SimulatorTestCase):
+    @defer.inlineCallbacks
+    def test_bind_count(self):
+        self.config.id = 'test_bind_count'
+        self.config.bind_count = 2
+        client = SMPPClientSessionPool(self.config)
+        stats = SMPPClientStatsCollector().get(cid = self.config.id)
+
+        # Connect and bind every session
+        yield client.connectAndBind()
+        yield defer.DeferredList([f.connectDeferred for f in client.factories])
+
+        self.assertEqual(2, len(client.factories))
+        self.assertEqual([SMPPSessionStates.BOUND_TRX] * 2, client.getSessionStates())
+        self.assertEqual(SMPPSessionStates.BOUND_TRX, client.getSessionState())
+        self.assertEqual(2, stats.get('bound_count'))
+        self.assertEqual(1, stats.getSession(1).get('bound_count'))
+        self.assertEqual(2, client.getBoundCount())
+
+        # The least busy session is used
+        client.factories[0].getOutstandingCount = mock.Mock(return_value=3)
+        self.assertEqual(client.factories[1].smpp, client.smpp)
+
+        # A session having a full submit_sm_window is skipped
+        self.config.submit_sm_window = 4
+        client.factories[1].getOutstandingCount = mock.Mock(return_value=4)
+        self.assertEqual(client.factories[0].smpp, client.smpp)
+        self.config.submit_sm_window = 0
+
+        # A dropped session is not used anymore
+        yield client.factories[1].smpp.unbindAndDisconnect()
+        self.assertEqual(client.factories[0].smpp, client.smpp)
+        self.assertEqual(1, client.getBoundCount())
+        self.assertEqual(SMPPSessionStates.BOUND_TRX, client.getSessionState())
+
+        # Unbind & Disconnect
+        yield client.disconnectAndDontRetryToConnect()
+        self.assertFalse(client.smpp.isBound())
+        self.assertEqual(SMPPSessionStates.UNBOUND, client.getSessionState())
+
+        # Sessions are opened on (re)connection when bind_count is updated, dropped ones
+        # are disconnected
+        dropped = client.factories[1]
+        dropped.disconnectAndDontRetryToConnect = mock.Mock()
+        self.config.bind_count = 1
+        client.resize()
+        self.assertEqual(1, len(client.factories))
+        self.assertEqual(1, dropped.disconnectAndDontRetryToConnect.call_count)
+
 class StatsTestCases(SimulatorTestCase):
 
     @defer.inlineCallbacks
@@ -59,6 +59,10 @@ class SMPPClientStatsCollectorBasicTestCases(TestCase):
 			'submit_sm_count': 0,
 			'submit_sm_request_count': 0,
 			'throttling_error_count': 0,
+			'throttling_tokens': 0,
+			'throttling_wait_time': 0,
+			'throttling_rate': 0,
+			'priority_lanes': {},
  		})
 
 	def test_stats_set(self):
@@ -87,6 +91,22 @@ class SMPPClientStatsCollectorBasicTestCases(TestCase):
 		stats.set('created_at', datetime.now())
 		self.assertRaises(KeyNotIncrementable, stats.inc, 'created_at')
 
+	def test_sessions(self):
+		stats = SMPPClientStatsCollector().get(cid = 'test_sessions')
+		session0 = stats.getSession(0)
+		session1 = stats.getSession(1)
+		self.assertEqual(session1, stats.getSession(1))
+
+		# Sessions stats are aggregated in the connector stats
+		session0.inc('submit_sm_count', 2)
+		session1.inc('submit_sm_count')
+		session1.set('bound_at', 10)
+		self.assertEqual(session0.get('submit_sm_count'), 2)
+		self.assertEqual(session1.get('submit_sm_count'), 1)
+		self.assertEqual(stats.get('submit_sm_count'), 3)
+		self.assertEqual(stats.get('bound_at'), 10)
+		self.assertEqual(session0.get('bound_at'), 0)
+
 class SMPPServerStatsCollectorBasicTestCases(TestCase):
 	def test_is_singleton(self):
 		i1 = SMPPServerStatsCollector()
@@ -138,6 +158,8 @@ class SMPPServerStatsCollectorBasicTestCases(TestCase):
 			'submit_sm_request_count': 0,
 			'throttling_error_count': 0,
 			'unbind_count': 0,
+			'auth_cache_hit_count': 0,
+			'auth_cache_miss_count': 0,
 			'interceptor_count': 0,
 			'interceptor_error_count': 0,
  		})
@@ -0,0 +1,107 @@
+"""
+Acknowledgement coalescing for AMQP consumers
+"""
+
+from twisted.internet import defer, reactor
+
+
+class AckCoalescer(object):
+    """Accumulate basic_ack delivery tags and flush them with a single multiple=True
+    basic_ack after batch_size acks or batch_delay seconds, whichever comes first.
+
+    A multiple=True ack will acknowledge every unacknowledged delivery up to the given
+    tag, so all deliveries of the channel are tracked (through delivered()) and the multi
+    ack will only cover tags lower than the oldest unsettled delivery (a message still
+    being processed, waiting for a delayed requeue or not yet consumed from the local
+    queue); remaining acks are sent one by one.
+
+    Setting batch_size to 1 will disable coalescing.
+    """
+
+    def __init__(self, batch_size=1, batch_delay=0.05, log=None):
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.log = log
+        self.chan = None
+        self.flushTimer = None
+
+        # Delivered and not yet acked (or rejected) tags
+        self.unsettled = set()
+        # Acked tags waiting to be flushed
+        self.pending = set()
+
+    def isEnabled(self):
+        return self.batch_size > 1
+
+    def clearFlushTimer(self):
+        if self.flushTimer is not None and self.flushTimer.active():
+            self.flushTimer.cancel()
+        self.flushTimer = None
+
+    def reset(self, chan=None):
+        """Called when a channel is (re)opened or lost: delivery tags are channel-scoped,
+        pending acks of a lost channel are meaningless since messages will be redelivered
+        """
+        self.clearFlushTimer()
+        self.chan = chan
+        self.unsettled = set()
+        self.pending = set()
+
+    def delivered(self, delivery_tag):
+        if self.isEnabled():
+            self.unsettled.add(delivery_tag)
+
+    def ack(self, delivery_tag):
+        if delivery_tag not in self.unsettled:
+            # Coalescing is disabled or delivery is not tracked
+            return self.chan.basic_ack(delivery_tag=delivery_tag)
+
+        self.unsettled.remove(delivery_tag)
+        self.pending.add(delivery_tag)
+
+        if len(self.pending) >= self.batch_size:
+            return self.flush()
+        elif self.flushTimer is None:
+            self.flushTimer = reactor.callLater(self.batch_delay, self._timedFlush)
+
+        return defer.succeed(None)
+
+    def reject(self, delivery_tag, requeue=0):
+        self.unsettled.discard(delivery_tag)
+
+        # Acks requested before this reject are sent first
+        self.flush()
+        return self.chan.basic_reject(delivery_tag=delivery_tag, requeue=requeue)
+
+    def flush(self):
+        """Send pending acks to the broker"""
+        self.clearFlushTimer()
+
+        if len(self.pending) == 0:
+            return defer.succeed(None)
+
+        pending = sorted(self.pending)
+        self.pending = set()
+
+        # Only tags lower than the oldest unsettled delivery can be acked with multiple=True
+        if len(self.unsettled) > 0:
+            oldest_unsettled = min(self.unsettled)
+            covered = [tag for tag in pending if tag < oldest_unsettled]
+            remaining = pending[len(covered):]
+        else:
+            covered = pending
+            remaining = []
+
+        acks = []
+        if len(covered) > 0:
+            acks.append(self.chan.basic_ack(delivery_tag=covered[-1], multiple=len(covered) > 1))
+        for tag in remaining:
+            acks.append(self.chan.basic_ack(delivery_tag=tag))
+
+        return defer.DeferredList(acks, fireOnOneErrback=True, consumeErrors=True)
+
+    def _timedFlush(self):
+        self.flushTimer = None
+        d = self.flush()
+        if self.log is not None:
+            d.addErrback(lambda e: self.log.error('Error while flushing acks: %s', e))
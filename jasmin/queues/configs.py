@@ -41,6 +41,13 @@ class AmqpConfig(ConfigFile):
         self.reconnectOnConnectionFailureDelay = self._getint(
             'amqp-broker', 'connection_failure_retry_delay', 10)
 
+        # Acknowledgements coalescing
+        self.ack_batch_size = self._getint('amqp-broker', 'ack_batch_size', 1)
+        self.ack_batch_delay = self._getint('amqp-broker', 'ack_batch_delay_ms', 50) / 1000.0
+
+        # Wire format of published messages: pickle or compact
+        self.wire_format = self._get('amqp-broker', 'wire_format', 'pickle')
+
     def getSpec(self):
         """Will return the specifications from self.spec file"""
 
@@ -3,8 +3,8 @@ import logging
 from logging.handlers import TimedRotatingFileHandler
 from twisted.internet.protocol import ClientFactory
 from twisted.internet import defer, reactor
-from txamqp.client import TwistedDelegate
-from jasmin.queues.protocol import AmqpProtocol
+from jasmin.queues.acks import AckCoalescer
+from jasmin.queues.protocol import AmqpProtocol, AmqpDelegate
 
 LOG_CATEGORY = "jasmin-amqp-factory"
 
@@ -18,7 +18,7 @@ class AmqpFactory(ClientFactory):
         self.config = config
         self.channelReady = None
 
-        self.delegate = TwistedDelegate()
+        self.delegate = AmqpDelegate()
 
         self.amqp = None # The protocol instance.
         self.client = None # Alias for protocol instance
@@ -36,6 +36,8 @@ class AmqpFactory(ClientFactory):
             self.log.addHandler(handler)
             self.log.propagate = False
 
+        self.acks = AckCoalescer(config.ack_batch_size, config.ack_batch_delay, self.log)
+
     def preConnect(self):
         """Initiate deferreds before connecting
         these deferreds are initiated separately and not within self._connect()
@@ -96,6 +98,7 @@ class AmqpFactory(ClientFactory):
         """
         self.log.error("Connection lost. Reason: %s", str(reason))
         self.connected = False
+        self.acks.reset()
 
         self.client = None
 
@@ -155,6 +158,7 @@ class AmqpFactory(ClientFactory):
 
         self.chan = chan
         self.queues = []
+        self.acks.reset(chan)
 
         d = self.chan.channel_open()
         d.addCallback(self._channel_open)
@@ -181,7 +185,12 @@ class AmqpFactory(ClientFactory):
         self.channelReady = False
 
         if self.client is not None:
-            return self.client.close(reason)
+            # Pending acks must not be lost on shutdown, close once they are sent, the client
+            # is kept since the connection may be lost (and self.client cleared) meanwhile
+            client = self.client
+            d = self.acks.flush()
+            d.addBoth(lambda _: client.close(reason))
+            return d
 
         return None
 
@@ -217,6 +226,20 @@ class AmqpFactory(ClientFactory):
 
         return self.chan.basic_publish(**args)
 
+    def ack(self, delivery_tag):
+        """This is a wrapper to channel's basic_ack method
+        acks may be coalesced, c.f. AckCoalescer
+        """
+
+        return self.acks.ack(delivery_tag)
+
+    def reject(self, delivery_tag, requeue=0):
+        """This is a wrapper to channel's basic_reject method
+        pending acks are flushed before rejecting
+        """
+
+        return self.acks.reject(delivery_tag, requeue)
+
     def stopConnectionRetrying(self):
         """This will stop the factory from reconnecting
         It is used whenever a service stop has been requested, the connectionRetry flag
@@ -1,5 +1,14 @@
+from twisted.internet import defer
+from txamqp.client import TwistedDelegate
 from txamqp.protocol import AMQClient
 
+class AmqpDelegate(TwistedDelegate):
+    @defer.inlineCallbacks
+    def basic_deliver(self, ch, msg):
+        # Track delivery before it gets queued, c.f. AckCoalescer
+        self.client.factory.acks.delivered(msg.delivery_tag)
+        (yield self.client.queue(msg.consumer_tag)).put(msg)
+
 class AmqpProtocol(AMQClient):
     def connectionMade(self):
         """Called when a connection has been made."""
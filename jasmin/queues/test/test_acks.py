@@ -0,0 +1,176 @@
+"""
+Test cases for AckCoalescer
+"""
+
+from twisted.internet import defer, reactor
+from twisted.trial.unittest import TestCase
+
+from jasmin.queues.acks import AckCoalescer
+from jasmin.queues.configs import AmqpConfig
+from jasmin.queues.factory import AmqpFactory
+
+
+@defer.inlineCallbacks
+def waitFor(seconds):
+    # Wait seconds
+    waitDeferred = defer.Deferred()
+    reactor.callLater(seconds, waitDeferred.callback, None)
+    yield waitDeferred
+
+
+class RecordingChannel(object):
+    """Records basic_ack and basic_reject calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.calls.append(('ack', delivery_tag, multiple))
+        return defer.succeed(None)
+
+    def basic_reject(self, delivery_tag, requeue):
+        self.calls.append(('reject', delivery_tag, requeue))
+        return defer.succeed(None)
+
+
+class SlowChannel(RecordingChannel):
+    """basic_ack calls are settled by firing self.ackDeferred"""
+
+    def __init__(self):
+        RecordingChannel.__init__(self)
+        self.ackDeferred = defer.Deferred()
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        RecordingChannel.basic_ack(self, delivery_tag, multiple)
+        return self.ackDeferred
+
+
+class RecordingClient(object):
+    """Records close calls"""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self, reason):
+        self.closed = True
+        return defer.succeed(None)
+
+
+class AckCoalescerTestCase(TestCase):
+
+    def setUp(self):
+        self.chan = RecordingChannel()
+        self.acks = AckCoalescer(batch_size=3, batch_delay=0.1)
+        self.acks.reset(self.chan)
+
+    def tearDown(self):
+        self.acks.clearFlushTimer()
+
+    def deliver(self, *tags):
+        for tag in tags:
+            self.acks.delivered(tag)
+
+    def test_disabled(self):
+        acks = AckCoalescer(batch_size=1)
+        acks.reset(self.chan)
+        acks.delivered(1)
+        acks.ack(1)
+
+        self.assertEqual(self.chan.calls, [('ack', 1, False)])
+        self.assertEqual(acks.unsettled, set())
+
+    def test_flush_on_batch_size(self):
+        self.deliver(1, 2, 3, 4)
+        self.acks.ack(2)
+        self.acks.ack(1)
+        self.assertEqual(self.chan.calls, [])
+
+        self.acks.ack(3)
+        self.assertEqual(self.chan.calls, [('ack', 3, True)])
+        self.assertEqual(self.acks.unsettled, set([4]))
+
+    @defer.inlineCallbacks
+    def test_flush_on_delay(self):
+        self.deliver(1, 2)
+        self.acks.ack(1)
+        self.acks.ack(2)
+        self.assertEqual(self.chan.calls, [])
+
+        yield waitFor(0.2)
+        self.assertEqual(self.chan.calls, [('ack', 2, True)])
+
+    def test_multiple_does_not_cover_unsettled(self):
+        "Tag 2 is still being processed, it must not be acked by a multiple ack"
+        self.deliver(1, 2, 3, 4)
+        self.acks.ack(1)
+        self.acks.ack(3)
+        self.acks.ack(4)
+
+        self.assertEqual(self.chan.calls, [('ack', 1, False), ('ack', 3, False), ('ack', 4, False)])
+
+    def test_reject_flushes_pending_acks(self):
+        self.deliver(1, 2, 3)
+        self.acks.ack(1)
+        self.acks.reject(2, requeue=1)
+        self.acks.ack(3)
+
+        self.assertEqual(self.chan.calls, [('ack', 1, False), ('reject', 2, 1)])
+        self.acks.flush()
+        self.assertEqual(self.chan.calls[-1], ('ack', 3, False))
+        self.assertEqual(self.acks.unsettled, set())
+
+    def test_untracked_delivery(self):
+        "Acks for deliveries of another channel are sent right away"
+        self.acks.ack(7)
+        self.assertEqual(self.chan.calls, [('ack', 7, False)])
+
+    def test_reset(self):
+        self.deliver(1, 2)
+        self.acks.ack(1)
+        self.acks.reset(RecordingChannel())
+
+        self.assertEqual(self.acks.pending, set())
+        self.assertEqual(self.acks.unsettled, set())
+        self.assertEqual(self.acks.flushTimer, None)
+        self.acks.flush()
+        self.assertEqual(self.chan.calls, [])
+
+
+class AmqpFactoryDisconnectTestCase(TestCase):
+
+    def test_disconnect_waits_for_pending_acks(self):
+        config = AmqpConfig()
+        config.ack_batch_size = 10
+        factory = AmqpFactory(config)
+        chan = SlowChannel()
+        factory.acks.reset(chan)
+        factory.client = RecordingClient()
+
+        factory.acks.delivered(1)
+        factory.acks.ack(1)
+        factory.disconnect()
+
+        # Connection is closed only once pending acks are sent
+        self.assertEqual(chan.calls, [('ack', 1, False)])
+        self.assertFalse(factory.client.closed)
+        chan.ackDeferred.callback(None)
+        self.assertTrue(factory.client.closed)
+
+    def test_connection_lost_while_flushing(self):
+        config = AmqpConfig()
+        config.ack_batch_size = 10
+        factory = AmqpFactory(config)
+        chan = SlowChannel()
+        factory.acks.reset(chan)
+        client = RecordingClient()
+        factory.client = client
+
+        factory.acks.delivered(1)
+        factory.acks.ack(1)
+        d = factory.disconnect()
+
+        # The client being closed is the one the flush started with
+        factory.client = None
+        chan.ackDeferred.callback(None)
+        self.assertTrue(client.closed)
+        return d
@@ -0,0 +1,239 @@
+"""
+Test cases for the compact wire format
+"""
+
+import cPickle as pickle
+from datetime import datetime
+
+from twisted.trial.unittest import TestCase
+
+from jasmin.managers.content import SubmitSmContent, DeliverSmContent
+from jasmin.protocols.smpp.configs import SMPPClientConfig
+from jasmin.protocols.smpp.operations import SMPPOperationFactory
+from jasmin.queues import wire
+from jasmin.routing.Bills import SubmitSmBill
+from jasmin.routing.Routables import RoutableDeliverSm
+from jasmin.routing.content import RoutedDeliverSmContent
+from jasmin.routing.jasminApi import *
+from jasmin.vendor.smpp.pdu.operations import SubmitSM, DeliverSM
+from jasmin.vendor.smpp.pdu.pdu_encoding import PDUEncoder
+from jasmin.vendor.smpp.pdu.pdu_types import MessageState
+
+
+def pickled(value):
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+class WireTestCase(TestCase):
+    def setUp(self):
+        self.opFactory = SMPPOperationFactory(SMPPClientConfig(id='test-id'))
+
+    def getSubmitSm(self, short_message='Hello world !'):
+        return self.opFactory.SubmitSM(
+            source_addr='Jasmin', destination_addr='21698700177', short_message=short_message)
+
+    def getRoutable(self):
+        pdu = DeliverSM(
+            source_addr='21698700177', destination_addr='Jasmin', short_message='Hello Jasmin !',
+            receipted_message_id='4a843ce6', message_state=MessageState.DELIVERED)
+        pdu.dlr = None
+        routable = RoutableDeliverSm(pdu, Connector('abc'), datetime(2017, 1, 1, 10, 0, 0, 123))
+        routable.addTag(12)
+        return routable
+
+    def getBill(self):
+        bill = SubmitSmBill(User('u1', Group('g1'), 'foo', 'bar'))
+        bill.setAmount('submit_sm', 1.5)
+        bill.setAmount('submit_sm_resp', 0.25)
+        bill.setAction('decrement_submit_sm_count', 1)
+        return bill
+
+    def encode(self, pdu):
+        "Unpickled PDUs are compared through their SMPP bytes, their enum values are not pdu_types ones"
+        return PDUEncoder().encode(pdu)
+
+    def assertPDUsEqual(self, expected, pdu):
+        while expected is not None:
+            self.assertEqual(expected, pdu)
+            self.assertEqual(expected.__dict__.keys(), pdu.__dict__.keys())
+            expected = getattr(expected, 'nextPdu', None)
+            pdu = getattr(pdu, 'nextPdu', None)
+        self.assertEqual(None, pdu)
+
+
+class ValueTestCase(WireTestCase):
+    def test_values(self):
+        value = {'none': None, 'bool': [True, False], 'int': -3, 'long': 2 ** 40, 'float': 0.1,
+                 'str': '\x00\xff', 'unicode': u'\u0639\u0631\u0628\u064a',
+                 'datetime': datetime(2017, 1, 1, 0, 0, 1, 5), 'nested': {1: [{}]}}
+
+        self.assertEqual(value, wire.loadValue(wire.dumpValue(value))[0])
+
+    def test_unsupported_value(self):
+        self.assertRaises(wire.WireFormatError, wire.dumpValue, (1, 2))
+        self.assertRaises(wire.WireFormatError, wire.dumpValue, {'connector': Connector('abc')})
+
+    def test_corrupted_value(self):
+        data = wire.dumpValue({'key': 'value'})
+
+        self.assertRaises(wire.WireFormatError, wire.loadValue, data[:-2])
+        self.assertRaises(wire.WireFormatError, wire.loadValue, 'x' + data[1:])
+
+
+class PDUTestCase(WireTestCase):
+    def test_submit_sm(self):
+        pdu = self.getSubmitSm()
+
+        self.assertPDUsEqual(pdu, wire.loadPDU(wire.dumpPDU(pdu)))
+
+    def test_null_params(self):
+        "None params are not decoded to their default values"
+        pdu = SubmitSM(seqNum=None, source_addr=None, destination_addr='21698700177', short_message=None,
+                       message_payload=None)
+        loaded = wire.loadPDU(wire.dumpPDU(pdu))
+
+        self.assertPDUsEqual(pdu, loaded)
+        self.assertEqual(None, loaded.params['source_addr'])
+        self.assertEqual(None, loaded.params['source_addr_ton'])
+
+    def test_long_submit_sm(self):
+        pdu = self.getSubmitSm('0123456789' * 50)
+        self.assertTrue(hasattr(pdu.nextPdu, 'nextPdu'))
+
+        self.assertPDUsEqual(pdu, wire.loadPDU(wire.dumpPDU(pdu)))
+
+    def test_unpickled_pdu(self):
+        pdu = self.getSubmitSm('0123456789' * 50)
+        unpickled = pickle.loads(pickled(pdu))
+
+        self.assertEqual(wire.dumpPDU(pdu), wire.dumpPDU(unpickled))
+        self.assertPDUsEqual(pdu, wire.loadPDU(wire.dumpPDU(unpickled)))
+
+    def test_int_data_coding(self):
+        "SMPPOperationFactory.SubmitSM sets an int data_coding"
+        pdu = self.getSubmitSm()
+        pdu.params['data_coding'] = 8
+        loaded = wire.loadPDU(wire.dumpPDU(pdu))
+
+        self.assertPDUsEqual(pdu, loaded)
+        self.assertEqual(8, loaded.params['data_coding'])
+
+    def test_unencodable_pdu(self):
+        pdu = self.getSubmitSm()
+        pdu.params['short_message'] = 'x' * 300
+
+        self.assertRaises(wire.WireFormatError, wire.dumpPDU, pdu)
+
+    def test_size(self):
+        pdu = self.getSubmitSm()
+
+        self.assertTrue(len(wire.dumpPDU(pdu)) < len(pickled(pdu)) / 4)
+
+
+class RoutableTestCase(WireTestCase):
+    def test_routable(self):
+        routable = self.getRoutable()
+        loaded = wire.loadRoutableDeliverSm(wire.dumpRoutableDeliverSm(routable))
+
+        self.assertPDUsEqual(routable.pdu, loaded.pdu)
+        self.assertEqual(None, loaded.pdu.dlr)
+        self.assertEqual(RoutableDeliverSm, type(loaded))
+        self.assertEqual(Connector, type(loaded.connector))
+        self.assertEqual('abc', loaded.connector.cid)
+        self.assertEqual(routable.datetime, loaded.datetime)
+        self.assertEqual(['12'], loaded.getTags())
+
+    def test_dlr(self):
+        routable = self.getRoutable()
+        routable.pdu.dlr = {'id': '4a843ce6', 'stat': 'DELIVRD', 'err': None}
+        loaded = wire.loadRoutableDeliverSm(wire.dumpRoutableDeliverSm(routable))
+
+        self.assertEqual(routable.pdu.dlr, loaded.pdu.dlr)
+
+    def test_extra_attribute(self):
+        routable = self.getRoutable()
+        routable.foo = 'bar'
+
+        self.assertRaises(wire.WireFormatError, wire.dumpRoutableDeliverSm, routable)
+
+
+class BillTestCase(WireTestCase):
+    def test_bill(self):
+        bill = self.getBill()
+        loaded = wire.loadBill(wire.dumpBill(bill))
+
+        self.assertEqual(bill.bid, loaded.bid)
+        self.assertEqual('u1', loaded.user.uid)
+        self.assertEqual(bill.amounts, loaded.amounts)
+        self.assertEqual(bill.actions, loaded.actions)
+        self.assertEqual(0.25, loaded.getSubmitSmRespBill().getTotalAmounts())
+        self.assertEqual('u1', loaded.getSubmitSmRespBill().user.uid)
+
+    def test_credentials_are_not_serialized(self):
+        self.assertFalse('bar' in wire.dumpBill(self.getBill()))
+
+
+class ConnectorsTestCase(WireTestCase):
+    def test_connectors(self):
+        dcs = [HttpConnector('http1', 'http://127.0.0.1/send', 'POST'), SmppServerSystemIdConnector('sys1')]
+        loaded = wire.loadConnectors(wire.dumpConnectors(dcs))
+
+        self.assertEqual([HttpConnector, SmppServerSystemIdConnector], [type(dc) for dc in loaded])
+        self.assertEqual(['http', 'POST', 'sys1'], [loaded[0].type, loaded[0].method, loaded[1].system_id])
+        self.assertEqual('http://127.0.0.1/send', loaded[0].baseurl)
+        self.assertEqual([repr(dc) for dc in dcs], [repr(dc) for dc in loaded])
+
+    def test_unsupported_connector(self):
+        self.assertRaises(wire.WireFormatError, wire.dumpConnectors, [SmppClientConnector('abc')])
+
+
+class ContentTestCase(WireTestCase):
+    def test_submit_sm_content(self):
+        pdu = self.getSubmitSm()
+        bill = self.getBill()
+
+        c = SubmitSmContent(wire.dumpPDU(pdu), 'any.route', wire.dumpBill(bill), compact=True)
+        self.assertEqual(wire.CONTENT_TYPE, c['content-type'])
+        self.assertPDUsEqual(pdu, wire.loads(c, c.body, wire.loadPDU))
+        self.assertEqual(bill.bid, wire.loads(c, c['headers']['submit_sm_bill'], wire.loadBill).bid)
+
+    def test_pickled_submit_sm_content(self):
+        "Messages published with the pickle wire format are still readable"
+        pdu = self.getSubmitSm()
+        bill = self.getBill()
+
+        c = SubmitSmContent(pickled(pdu), 'any.route', pickled(bill))
+        self.assertFalse('content-type' in c.properties)
+        loaded = wire.loads(c, c.body, wire.loadPDU)
+        self.assertEqual(sorted(pdu.params), sorted(loaded.params))
+        self.assertEqual(pdu.params['short_message'], loaded.params['short_message'])
+        self.assertEqual(bill.bid, wire.loads(c, c['headers']['submit_sm_bill'], wire.loadBill).bid)
+
+    def test_deliver_sm_content(self):
+        routable = self.getRoutable()
+
+        c = DeliverSmContent(routable, 'abc', compact=True)
+        self.assertEqual(wire.CONTENT_TYPE, c['content-type'])
+        self.assertPDUsEqual(routable.pdu, wire.loads(c, c.body, wire.loadRoutableDeliverSm).pdu)
+
+        # Routable cannot be serialized, it is pickled
+        routable.foo = 'bar'
+        c = DeliverSmContent(routable, 'abc', compact=True)
+        self.assertFalse('content-type' in c.properties)
+        self.assertEqual('bar', wire.loads(c, c.body, wire.loadRoutableDeliverSm).foo)
+
+    def test_routed_deliver_sm_content(self):
+        routable = self.getRoutable()
+        dcs = [SmppServerSystemIdConnector('sys1')]
+
+        for compact in [True, False]:
+            c = RoutedDeliverSmContent(routable.pdu, 'msgid', 'abc', dcs, compact=compact)
+            self.assertEqual(compact, c.properties.get('content-type') == wire.CONTENT_TYPE)
+            self.assertEqual(self.encode(routable.pdu), self.encode(wire.loads(c, c.body, wire.loadPDU)))
+            self.assertEqual('sys1', wire.loads(c, c['headers']['dst-connectors'], wire.loadConnectors)[0].cid)
+
+    def test_unsupported_content_type(self):
+        c = SubmitSmContent('body', 'any.route', 'bill')
+        c['content-type'] = 'application/json'
+
+        self.assertRaises(wire.WireFormatError, wire.loads, c, c.body, wire.loadPDU)
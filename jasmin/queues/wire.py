@@ -0,0 +1,302 @@
+"""
+Compact serialization of AMQP message bodies and headers
+
+Messages published with the 'compact' wire format are flagged with the CONTENT_TYPE
+content-type property:
+  - PDUs are serialized as raw SMPP bytes (long messages parts follow each other), they
+    are preceded by a typed map holding what SMPP cannot carry: params set to None (they
+    would be decoded to their default values), int data_coding and extra PDU attributes,
+  - Routables are serialized as their PDU, connector id, datetime and tags,
+  - Bills are serialized as scalars (bid, user's uid, amounts and actions),
+  - Destination connectors are serialized as their type and constructor arguments.
+
+Messages without content-type property are pickled (the default wire format and the
+one used by Jasmin versions prior to the compact format), loads() will unpickle them.
+"""
+
+import StringIO
+import cPickle as pickle
+import struct
+from datetime import datetime
+
+from jasmin.routing.Bills import SubmitSmBill
+from jasmin.routing.Routables import RoutableDeliverSm
+from jasmin.routing.jasminApi import Connector, HttpConnector, SmppServerSystemIdConnector
+from jasmin.vendor.smpp.pdu.pdu_encoding import PDUEncoder
+
+CONTENT_TYPE = 'application/vnd.jasmin.compact.v1'
+
+# PDU attributes serialized in SMPP bytes
+PDU_ATTRIBUTES = ['id', 'seqNum', 'status', 'params', 'nextPdu']
+
+_encoder = PDUEncoder()
+
+
+class WireFormatError(Exception):
+    """Raised when a value cannot be serialized or deserialized with the compact wire format
+    """
+
+
+class BilledUser(object):
+    """Stands for the billed User of a deserialized Bill, only the uid is serialized"""
+
+    def __init__(self, uid):
+        self.uid = uid
+
+    def __repr__(self):
+        return '<BilledUser (uid=%s)>' % self.uid
+
+
+def _dumpValue(value, out):
+    if value is None:
+        out.append('N')
+    elif value is True:
+        out.append('T')
+    elif value is False:
+        out.append('F')
+    elif isinstance(value, (int, long)):
+        out.append('i' + struct.pack('!q', value))
+    elif isinstance(value, float):
+        out.append('f' + struct.pack('!d', value))
+    elif isinstance(value, str):
+        out.append('s' + struct.pack('!L', len(value)) + value)
+    elif isinstance(value, unicode):
+        value = value.encode('utf-8')
+        out.append('u' + struct.pack('!L', len(value)) + value)
+    elif isinstance(value, datetime):
+        if value.tzinfo is not None:
+            raise WireFormatError('Cannot serialize timezone aware datetime: %s' % value)
+        out.append('d' + struct.pack('!HBBBBBL', value.year, value.month, value.day, value.hour,
+                                     value.minute, value.second, value.microsecond))
+    elif isinstance(value, list):
+        out.append('l' + struct.pack('!H', len(value)))
+        for item in value:
+            _dumpValue(item, out)
+    elif isinstance(value, dict):
+        out.append('m' + struct.pack('!H', len(value)))
+        for k, v in value.iteritems():
+            _dumpValue(k, out)
+            _dumpValue(v, out)
+    else:
+        raise WireFormatError('Cannot serialize %s value: %r' % (type(value), value))
+
+
+def _loadValue(data, offset):
+    kind = data[offset]
+    offset += 1
+    if kind == 'N':
+        return None, offset
+    elif kind == 'T':
+        return True, offset
+    elif kind == 'F':
+        return False, offset
+    elif kind == 'i':
+        return struct.unpack_from('!q', data, offset)[0], offset + 8
+    elif kind == 'f':
+        return struct.unpack_from('!d', data, offset)[0], offset + 8
+    elif kind in 'su':
+        length = struct.unpack_from('!L', data, offset)[0]
+        offset += 4
+        value = data[offset:offset + length]
+        if len(value) != length:
+            raise WireFormatError('Truncated string value')
+        if kind == 'u':
+            value = value.decode('utf-8')
+        return value, offset + length
+    elif kind == 'd':
+        return datetime(*struct.unpack_from('!HBBBBBL', data, offset)), offset + 11
+    elif kind == 'l':
+        count = struct.unpack_from('!H', data, offset)[0]
+        offset += 2
+        value = []
+        for _ in xrange(count):
+            item, offset = _loadValue(data, offset)
+            value.append(item)
+        return value, offset
+    elif kind == 'm':
+        count = struct.unpack_from('!H', data, offset)[0]
+        offset += 2
+        value = {}
+        for _ in xrange(count):
+            k, offset = _loadValue(data, offset)
+            value[k], offset = _loadValue(data, offset)
+        return value, offset
+
+    raise WireFormatError('Unknown value type: %r' % kind)
+
+
+def dumpValue(value):
+    """Serialize value, a None, bool, int, long, float, str, unicode, naive datetime, or a
+    list or dict of them"""
+    out = []
+    _dumpValue(value, out)
+    return ''.join(out)
+
+
+def loadValue(data, offset=0):
+    """Deserialize a value serialized with dumpValue() at offset, returns the value and the
+    offset following it"""
+    try:
+        return _loadValue(data, offset)
+    except WireFormatError:
+        raise
+    except Exception, e:
+        raise WireFormatError('Cannot deserialize value: %r' % e)
+
+
+def _dumpPDUs(pdu):
+    """Returns the PDU and its nextPdu parts metadata and their SMPP bytes"""
+    metadata = []
+    encoded = []
+    while pdu is not None:
+        meta = {}
+        params = pdu.params
+
+        # Params SMPP cannot carry as they are: None params (they would be decoded to their
+        # default values) and int data_coding (converted to DataCoding when sending the PDU)
+        restored = dict([(k, v) for k, v in params.iteritems() if v is None])
+        if isinstance(params.get('data_coding'), int):
+            restored['data_coding'] = params['data_coding']
+        if len(restored) > 0:
+            meta['params'] = restored
+        attributes = dict([(k, v) for k, v in pdu.__dict__.iteritems() if k not in PDU_ATTRIBUTES])
+        if len(attributes) > 0:
+            meta['attributes'] = attributes
+        metadata.append(meta)
+
+        try:
+            if len(restored) > 0:
+                pdu.params = dict([(k, v) for k, v in params.iteritems()
+                                   if k not in restored or k in pdu.mandatoryParams])
+                if 'data_coding' in restored:
+                    pdu.params['data_coding'] = None
+            encoded.append(_encoder.encode(pdu))
+        except Exception, e:
+            raise WireFormatError('Cannot encode %s: %r' % (pdu.id, e))
+        finally:
+            pdu.params = params
+
+        pdu = getattr(pdu, 'nextPdu', None)
+
+    return metadata, ''.join(encoded)
+
+
+def _loadPDUs(metadata, data, offset):
+    """Decode PDUs (chained through nextPdu) from data at offset"""
+    firstPdu = None
+    previousPdu = None
+    for meta in metadata:
+        try:
+            length = struct.unpack_from('!L', data, offset)[0]
+            pdu = _encoder.decode(StringIO.StringIO(data[offset:offset + length]))
+        except Exception, e:
+            raise WireFormatError('Cannot decode PDU: %r' % e)
+        offset += length
+
+        pdu.params.update(meta.get('params', {}))
+        for k, v in meta.get('attributes', {}).iteritems():
+            setattr(pdu, k, v)
+
+        if previousPdu is None:
+            firstPdu = pdu
+        else:
+            previousPdu.nextPdu = pdu
+        previousPdu = pdu
+
+    return firstPdu
+
+
+def dumpPDU(pdu):
+    """Serialize pdu, along with its nextPdu parts"""
+    metadata, encoded = _dumpPDUs(pdu)
+    return dumpValue(metadata) + encoded
+
+
+def loadPDU(data):
+    metadata, offset = loadValue(data)
+    return _loadPDUs(metadata, data, offset)
+
+
+def dumpRoutableDeliverSm(routable):
+    """Serialize a RoutableDeliverSm, routables holding any other attribute (set by an
+    interceptor script for example) cannot be serialized"""
+    if (type(routable) is not RoutableDeliverSm or type(routable.connector) is not Connector or
+            sorted(routable.__dict__) != ['_tags', 'connector', 'datetime', 'pdu']):
+        raise WireFormatError('Cannot serialize routable: %r' % routable)
+
+    metadata, encoded = _dumpPDUs(routable.pdu)
+    return dumpValue({
+        'pdus': metadata,
+        'cid': routable.connector.cid,
+        'datetime': routable.datetime,
+        'tags': routable.getTags()}) + encoded
+
+
+def loadRoutableDeliverSm(data):
+    metadata, offset = loadValue(data)
+
+    routable = RoutableDeliverSm(_loadPDUs(metadata['pdus'], data, offset),
+                                 Connector(metadata['cid']), metadata['datetime'])
+    for tag in metadata['tags']:
+        routable.addTag(tag)
+    return routable
+
+
+def dumpBill(bill):
+    """Serialize bill as scalars, its user is reduced to its uid"""
+    return dumpValue({
+        'bid': bill.bid,
+        'uid': bill.user.uid,
+        'amounts': bill.amounts,
+        'actions': bill.actions})
+
+
+def loadBill(data):
+    """Deserialize a SubmitSmBill, its user is a BilledUser"""
+    values, _ = loadValue(data)
+
+    bill = SubmitSmBill(BilledUser(values['uid']))
+    bill.bid = values['bid']
+    bill.amounts = values['amounts']
+    bill.actions = values['actions']
+    return bill
+
+
+def dumpConnectors(connectors):
+    values = []
+    for connector in connectors:
+        if type(connector) is HttpConnector:
+            values.append([connector.type, connector.cid, connector.baseurl, connector.method])
+        elif type(connector) is SmppServerSystemIdConnector:
+            values.append([connector.type, connector.system_id])
+        else:
+            raise WireFormatError('Cannot serialize connector: %r' % connector)
+
+    return dumpValue(values)
+
+
+def loadConnectors(data):
+    values, _ = loadValue(data)
+
+    connectors = []
+    for value in values:
+        if value[0] == HttpConnector.type:
+            connectors.append(HttpConnector(*value[1:]))
+        elif value[0] == SmppServerSystemIdConnector.type:
+            connectors.append(SmppServerSystemIdConnector(*value[1:]))
+        else:
+            raise WireFormatError('Unknown connector type: %s' % value[0])
+
+    return connectors
+
+
+def loads(content, data, loader):
+    """Deserialize data (content's body or one of its headers) with loader when content is
+    flagged with the compact wire format content-type, unpickle it otherwise"""
+    contentType = content.properties.get('content-type')
+    if contentType is None:
+        return pickle.loads(data)
+    elif contentType == CONTENT_TYPE:
+        return loader(data)
+
+    raise WireFormatError('Unsupported content-type: %s' % contentType)
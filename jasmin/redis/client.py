@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from logging.handlers import TimedRotatingFileHandler
 import jasmin.vendor.txredisapi as redis
@@ -20,6 +21,35 @@ class RedisForJasminProtocol(redis.RedisProtocol):
 
         return redis.RedisProtocol.execute_command(self, *args, **kwargs)
 
+    def hmset_expire(self, key, mapping, seconds):
+        """Set hash fields of key then its expiry in seconds
+
+        Both commands are written at once on this connection: redis runs them in order and
+        they cost a single round trip, the returned deferred is fired with the expire reply.
+        """
+        d = self.hmset(key, mapping)
+        expired = self.expire(key, seconds)
+        d.addCallbacks(lambda _: expired, lambda failure: expired.addBoth(lambda _: failure))
+        return d
+
+    def run_script(self, script, keys=(), args=()):
+        """Run a lua script with keys (KEYS) and args (ARGV)
+
+        The script is referenced by its sha1 (EVALSHA) and is only sent (EVAL) when redis
+        does not know it yet.
+        """
+        params = [len(keys)] + list(keys) + list(args)
+
+        def _noscript(failure):
+            failure.trap(redis.ResponseError)
+            if not str(failure.value).startswith('NOSCRIPT'):
+                return failure
+            return self.execute_command('EVAL', script, *params)
+
+        d = self.execute_command('EVALSHA', hashlib.sha1(script).hexdigest(), *params)
+        d.addErrback(_noscript)
+        return d
+
 class RedisForJasminFactory(redis.RedisFactory):
     protocol = RedisForJasminProtocol
 
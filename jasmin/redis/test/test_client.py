@@ -1,8 +1,11 @@
+import hashlib
+
 from twisted.trial.unittest import TestCase
 import jasmin.vendor.txredisapi as redis
 from twisted.internet import reactor, defer
+from twisted.test import proto_helpers
 from jasmin.redis.configs import RedisForJasminConfig
-from jasmin.redis.client import ConnectionWithConfiguration
+from jasmin.redis.client import ConnectionWithConfiguration, RedisForJasminProtocol, RedisForJasminFactory
 
 @defer.inlineCallbacks
 def waitFor(seconds):
@@ -112,3 +115,65 @@ class DataTestCase(RedisTestCase):
         # Redis key must be expired
         g = yield self.redisClient.hgetall('h_test')
         self.assertEqual(g, {})
+
+    @defer.inlineCallbacks
+    def test_hmset_expire(self):
+        r = yield self.redisClient.hmset_expire('h_test', {'key_a': 'value_a'}, 5)
+        self.assertEqual(r, 1)
+
+        g = yield self.redisClient.hgetall('h_test')
+        self.assertEqual(g, {u'key_a': u'value_a'})
+        g = yield self.redisClient.ttl('h_test')
+        self.assertTrue(0 < g <= 5)
+
+
+class ProtocolTestCase(TestCase):
+    "Commands written by RedisForJasminProtocol, replies are fed by hand"
+
+    def setUp(self):
+        self.protocol = RedisForJasminProtocol()
+        self.protocol.factory = RedisForJasminFactory('test', None, 1)
+        self.protocol.connected = 1
+        self.protocol.transport = proto_helpers.StringTransport()
+
+    def test_hmset_expire(self):
+        "expire is written along with hmset, without waiting for its reply"
+        d = self.protocol.hmset_expire('h_test', {'key_a': 'value_a'}, 5)
+
+        self.assertEqual(self.protocol.transport.value(),
+                         '*4\r\n$5\r\nHMSET\r\n$6\r\nh_test\r\n$5\r\nkey_a\r\n$7\r\nvalue_a\r\n'
+                         '*3\r\n$6\r\nEXPIRE\r\n$6\r\nh_test\r\n$1\r\n5\r\n')
+
+        self.protocol.dataReceived('+OK\r\n:1\r\n')
+        self.assertEqual(self.successResultOf(d), 1)
+
+    def test_hmset_expire_error(self):
+        d = self.protocol.hmset_expire('h_test', {'key_a': 'value_a'}, 5)
+
+        self.protocol.dataReceived('-ERR wrong kind of value\r\n:1\r\n')
+        self.failureResultOf(d, redis.ResponseError)
+
+    @defer.inlineCallbacks
+    def test_run_script(self):
+        d = self.protocol.run_script('return {KEYS[1], ARGV[1]}', keys=['k'], args=['a'])
+
+        self.assertEqual(self.protocol.transport.value(),
+                         '*5\r\n$7\r\nEVALSHA\r\n$40\r\n%s\r\n$1\r\n1\r\n$1\r\nk\r\n$1\r\na\r\n' %
+                         hashlib.sha1('return {KEYS[1], ARGV[1]}').hexdigest())
+
+        # Bulk replies are parsed in a later reactor iteration
+        self.protocol.dataReceived('*2\r\n$1\r\nk\r\n$1\r\na\r\n')
+        r = yield d
+        self.assertEqual(r, ['k', 'a'])
+
+    def test_run_unknown_script(self):
+        "Script is sent when redis does not know it yet"
+        d = self.protocol.run_script('return {{}, {}}')
+        self.protocol.transport.clear()
+
+        self.protocol.dataReceived('-NOSCRIPT No matching script. Please use EVAL.\r\n')
+        self.assertEqual(self.protocol.transport.value(),
+                         '*3\r\n$4\r\nEVAL\r\n$15\r\nreturn {{}, {}}\r\n$1\r\n0\r\n')
+
+        self.protocol.dataReceived('*2\r\n*0\r\n*0\r\n')
+        self.assertEqual(self.successResultOf(d), [[], []])
@@ -0,0 +1,122 @@
+"""
+Compiled matching engines used by routing and interception tables to avoid evaluating every
+route's (or interceptor's) filters for every routable.
+
+More info: http://docs.jasminsms.com/en/latest/routing/index.html
+"""
+
+from jasmin.routing.Filters import (UserFilter, GroupFilter, ConnectorFilter, TagFilter,
+                                    SourceAddrFilter, DestinationAddrFilter, PrefixTrie)
+
+
+class RoutingEngine(object):
+    """A compiled view of a routing (or interception) table:
+
+    Entries (routes or interceptors) are indexed by the most selective filter they hold (UserFilter
+    uid, ConnectorFilter cid, DestinationAddrFilter or SourceAddrFilter literal prefix, GroupFilter
+    gid or TagFilter tag), entries having none of these filters are kept unindexed and are candidates
+    for every routable.
+
+    getFirstMatch() will only evaluate candidate entries, in the table's order, hence preserving
+    the first-match-by-order semantics of routing and interception tables.
+    """
+
+    def __init__(self, table):
+        self.entries = []
+        self.unindexed = []
+        self.uids = {}
+        self.gids = {}
+        self.cids = {}
+        self.tags = {}
+        self.destination_prefixes = PrefixTrie()
+        self.source_prefixes = PrefixTrie()
+
+        for position, r in enumerate(table):
+            entry = r.values()[0]
+            self.entries.append(entry)
+
+            index, key = self._getIndexFor(entry)
+            if index is None:
+                self.unindexed.append(position)
+            elif isinstance(index, PrefixTrie):
+                index.add(key, position)
+            else:
+                index.setdefault(key, []).append(position)
+
+    def _getLongestPrefix(self, filters, filter_class):
+        prefix = None
+        for _filter in filters:
+            if isinstance(_filter, filter_class) and _filter.prefix is not None:
+                if prefix is None or len(_filter.prefix) > len(prefix):
+                    prefix = _filter.prefix
+
+        return prefix
+
+    def _getIndexFor(self, entry):
+        """Return the (index, key) tuple entry will be indexed in, (None, None) if entry
+        cannot be indexed
+        """
+        _filters = entry.filters
+        for _filter in _filters:
+            if isinstance(_filter, UserFilter):
+                return self.uids, _filter.user.uid
+        for _filter in _filters:
+            if isinstance(_filter, ConnectorFilter):
+                return self.cids, _filter.connector.cid
+
+        # Longest addr prefix is the most selective
+        prefix = self._getLongestPrefix(_filters, DestinationAddrFilter)
+        if prefix is not None:
+            return self.destination_prefixes, prefix
+        prefix = self._getLongestPrefix(_filters, SourceAddrFilter)
+        if prefix is not None:
+            return self.source_prefixes, prefix
+
+        for _filter in _filters:
+            if isinstance(_filter, GroupFilter):
+                return self.gids, _filter.group.gid
+        for _filter in _filters:
+            if isinstance(_filter, TagFilter):
+                return self.tags, _filter.tag
+
+        return None, None
+
+    def getCandidates(self, routable):
+        """Return positions of entries that may match routable, sorted by table order"""
+        candidates = set(self.unindexed)
+
+        user = getattr(routable, 'user', None)
+        if user is not None:
+            if self.uids:
+                candidates.update(self.uids.get(user.uid, []))
+            if self.gids:
+                candidates.update(self.gids.get(user.group.gid, []))
+
+        connector = getattr(routable, 'connector', None)
+        if connector is not None and self.cids:
+            candidates.update(self.cids.get(connector.cid, []))
+
+        if self.tags:
+            for tag in routable.getTags():
+                candidates.update(self.tags.get(tag, []))
+
+        if len(self.destination_prefixes) > 0:
+            destination_addr = routable.pdu.params.get('destination_addr')
+            if destination_addr is not None:
+                candidates.update(self.destination_prefixes.getAll(destination_addr))
+
+        if len(self.source_prefixes) > 0:
+            source_addr = routable.pdu.params.get('source_addr')
+            if source_addr is not None:
+                candidates.update(self.source_prefixes.getAll(source_addr))
+
+        return sorted(candidates)
+
+    def getFirstMatch(self, routable):
+        """Return the first entry (by order) matching routable, None otherwise"""
+        for position in self.getCandidates(routable):
+            entry = self.entries[position]
+            if entry.matchFilters(routable):
+                return entry
+
+        return None
@@ -16,6 +16,87 @@ class InvalidFilterParameterError(Exception):
     """
 
 
+def literal_prefix(regex):
+    """Return a (prefix, is_exact) tuple where prefix is the literal prefix any string matched
+    by regex (with re.match) must start with and is_exact is True when starting with prefix is
+    enough to match regex.
+
+    (None, False) is returned if no prefix can be safely extracted, e.g.:
+    - '^2126\\d+' will return ('2126', False)
+    - '^2126' or '^2126.*' will return ('2126', True)
+    - '^(33|34)\\d+' will return (None, False)
+    """
+    if regex.flags & re.IGNORECASE:
+        return None, False
+
+    pattern = regex.pattern
+    # Alternations may bypass the prefix
+    if '|' in pattern:
+        return None, False
+
+    pos = 1 if pattern.startswith('^') else 0
+    prefix = ''
+    while pos < len(pattern):
+        c = pattern[pos]
+        if c.isalnum():
+            step = 1
+        elif c == '\\' and pos + 1 < len(pattern) and pattern[pos + 1] in '+.*?()[]{}^$\\|':
+            c = pattern[pos + 1]
+            step = 2
+        else:
+            break
+
+        # An optional last char is not part of the prefix
+        if pattern[pos + step:pos + step + 1] in ['?', '*', '{']:
+            break
+
+        prefix += c
+        pos += step
+
+    if prefix == '':
+        return None, False
+    return prefix, pattern[pos:] in ['', '.*', '\\d*']
+
+
+class PrefixTrie(object):
+    """A trie mapping literal prefixes to values, routing engines (of routing and interception
+    tables) build one for indexing SourceAddrFilter and DestinationAddrFilter prefixes.
+
+    Looking up an address will cost O(length of address) whatever the number of prefixes is.
+    """
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, prefix, value):
+        node = self.root
+        for c in prefix:
+            node = node.setdefault(c, {})
+
+        # None key is holding values of the prefix ending at this node
+        node.setdefault(None, []).append(value)
+        self.size += 1
+
+    def getAll(self, address):
+        """Return values of every prefix of address, shortest prefix first"""
+        values = []
+        node = self.root
+        if None in node:
+            values.extend(node[None])
+        for c in address:
+            node = node.get(c)
+            if node is None:
+                break
+            if None in node:
+                values.extend(node[None])
+
+        return values
+
+
 class Filter(object):
     """
     Generic Filter:
@@ -163,26 +244,48 @@ class GroupFilter(Filter):
 class SourceAddrFilter(Filter):
     def __init__(self, source_addr):
         Filter.__init__(self, source_addr=source_addr)
+        self.prefix, self.exact_prefix = literal_prefix(self.source_addr)
 
         self._repr = '<SA (src_addr=%s)>' % source_addr
         self._str = '%s:\nsource_addr = %s' % (self.__class__.__name__, source_addr)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        # Filters persisted by older releases are not holding their literal prefix
+        if 'prefix' not in state:
+            self.prefix, self.exact_prefix = literal_prefix(self.source_addr)
+
     def match(self, routable):
         Filter.match(self, routable)
 
+        if self.exact_prefix:
+            return routable.pdu.params['source_addr'].startswith(self.prefix)
+
         return False if self.source_addr.match(routable.pdu.params['source_addr']) is None else True
 
 
 class DestinationAddrFilter(Filter):
     def __init__(self, destination_addr):
         Filter.__init__(self, destination_addr=destination_addr)
+        self.prefix, self.exact_prefix = literal_prefix(self.destination_addr)
 
         self._repr = '<DA (dst_addr=%s)>' % destination_addr
         self._str = '%s:\ndestination_addr = %s' % (self.__class__.__name__, destination_addr)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        # Filters persisted by older releases are not holding their literal prefix
+        if 'prefix' not in state:
+            self.prefix, self.exact_prefix = literal_prefix(self.destination_addr)
+
     def match(self, routable):
         Filter.match(self, routable)
 
+        if self.exact_prefix:
+            return routable.pdu.params['destination_addr'].startswith(self.prefix)
+
         if self.destination_addr.match(routable.pdu.params['destination_addr']) is None:
             return False
         else:
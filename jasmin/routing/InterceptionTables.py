@@ -2,6 +2,7 @@
 More info: http://docs.jasminsms.com/en/latest/interception/index.html
 """
 
+from jasmin.routing.Engines import RoutingEngine
 from jasmin.routing.Interceptors import Interceptor
 from jasmin.routing.Routables import Routable
 
@@ -14,10 +15,24 @@ class InterceptionTable(object):
     """Generic Interception table
     """
     type = 'generic'
+    # Compiled RoutingEngine, rebuilt on the first lookup following any table update
+    engine = None
 
     def __init__(self):
         self.table = []
 
+    def __getstate__(self):
+        """The compiled engine is not persisted, it will be rebuilt when needed"""
+        state = self.__dict__.copy()
+        state.pop('engine', None)
+        return state
+
+    def getEngine(self):
+        if self.engine is None:
+            self.engine = RoutingEngine(self.table)
+
+        return self.engine
+
     def add(self, interceptor, order):
         if not isinstance(interceptor, Interceptor):
             raise InvalidInterceptionTableParameterError("interceptor is not an instance of Interceptor")
@@ -46,11 +61,13 @@ class InterceptionTable(object):
 
         self.table.append({order: interceptor})
         self.table.sort(reverse=True)
+        self.engine = None
 
     def remove(self, order):
         for r in self.table:
             if r.keys()[0] == order:
                 self.table.remove(r)
+                self.engine = None
                 return True
 
         return False
@@ -60,6 +77,7 @@ class InterceptionTable(object):
 
     def flush(self):
         self.table = []
+        self.engine = None
 
     def getInterceptorFor(self, routable):
         """This will return the right interceptor to pass the routable to, None returned otherwise
@@ -68,12 +86,7 @@ class InterceptionTable(object):
         if not isinstance(routable, Routable):
             raise InvalidInterceptionTableParameterError("routable is not an instance of Routable")
 
-        for r in self.table:
-            interceptor = r.values()[0]
-            if interceptor.matchFilters(routable):
-                return interceptor
-
-        return None
+        return self.getEngine().getFirstMatch(routable)
 
 class MTInterceptionTable(InterceptionTable):
     "MT Interception table"
@@ -2,6 +2,7 @@
 More info: http://docs.jasminsms.com/en/latest/routing/index.html
 """
 
+from jasmin.routing.Engines import RoutingEngine
 from jasmin.routing.Routables import Routable
 from jasmin.routing.Routes import Route
 
@@ -15,10 +16,24 @@ class RoutingTable(object):
     """Generic Routing table
     """
     type = 'generic'
+    # Compiled RoutingEngine, rebuilt on the first lookup following any table update
+    engine = None
 
     def __init__(self):
         self.table = []
 
+    def __getstate__(self):
+        """The compiled engine is not persisted, it will be rebuilt when needed"""
+        state = self.__dict__.copy()
+        state.pop('engine', None)
+        return state
+
+    def getEngine(self):
+        if self.engine is None:
+            self.engine = RoutingEngine(self.table)
+
+        return self.engine
+
     def add(self, route, order):
         if not isinstance(route, Route):
             raise InvalidRoutingTableParameterError("route is not an instance of Route")
@@ -55,11 +70,13 @@ class RoutingTable(object):
 
         self.table.append({order: route})
         self.table.sort(reverse=True)
+        self.engine = None
 
     def remove(self, order):
         for r in self.table:
             if r.keys()[0] == order:
                 self.table.remove(r)
+                self.engine = None
                 return True
 
         return False
@@ -69,6 +86,7 @@ class RoutingTable(object):
 
     def flush(self):
         self.table = []
+        self.engine = None
 
     def getRouteFor(self, routable):
         """This will return the right route to send the routable to, None returned otherwise
@@ -77,12 +95,7 @@ class RoutingTable(object):
         if not isinstance(routable, Routable):
             raise InvalidRoutingTableParameterError("routable is not an instance of Routable")
 
-        for r in self.table:
-            route = r.values()[0]
-            if route.matchFilters(routable):
-                return route
-
-        return None
+        return self.getEngine().getFirstMatch(routable)
 
 class MTRoutingTable(RoutingTable):
     "MT Routing table"
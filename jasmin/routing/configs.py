@@ -20,6 +20,17 @@ class RouterPBConfig(ConfigFile):
         self.store_path = self._get('router', 'store_path', '%s/etc/jasmin/store' % ROOT_PATH)
 
         self.persistence_timer_secs = self._getint('router', 'persistence_timer_secs', 60)
+        # Quota updates are journaled and flushed every persistence_timer_secs, users are persisted
+        # (and the journal compacted) once it holds quota_journal_compaction_size updates
+        self.quota_journal_compaction_size = self._getint('router', 'quota_journal_compaction_size', 10000)
+
+        # Users balance and submit_sm_count are shared through redis with other routers when
+        # shared_quotas is True, they are charged from chunks leased for shared_quotas_lease_ttl
+        self.shared_quotas = self._getbool('router', 'shared_quotas', False)
+        self.shared_quotas_balance_chunk = self._getfloat('router', 'shared_quotas_balance_chunk', 10.0)
+        self.shared_quotas_submit_sm_count_chunk = self._getint(
+            'router', 'shared_quotas_submit_sm_count_chunk', 100)
+        self.shared_quotas_lease_ttl = self._getint('router', 'shared_quotas_lease_ttl', 60)
 
         self.bind = self._get('router', 'bind', '0.0.0.0')
         self.port = self._getint('router', 'port', 8988)
@@ -31,6 +42,10 @@ class RouterPBConfig(ConfigFile):
 
         self.pickle_protocol = self._getint('router', 'pickle_protocol', pickle.HIGHEST_PROTOCOL)
 
+        # Authentication cache
+        self.auth_cache_size = self._getint('router', 'auth_cache_size', 1000)
+        self.auth_cache_ttl = self._getint('router', 'auth_cache_ttl', 30)
+
         # Logging
         self.log_level = logging.getLevelName(self._get('router', 'log_level', 'INFO'))
         self.log_rotate = self._get('router', 'log_rotate', 'W6')
@@ -49,6 +64,31 @@ class deliverSmThrowerConfig(ConfigFile):
         self.retry_delay = self._getint('deliversm-thrower', 'retry_delay', 30)
         self.max_retries = self._getint('deliversm-thrower', 'max_retries', 3)
 
+        # Bounded parallelism: max_concurrency messages are held (being thrown or waiting for
+        # their destination) and no more than max_concurrency_per_destination are thrown to
+        # the same destination (http host or smpps system_id) at the same time
+        self.max_concurrency = self._getint('deliversm-thrower', 'max_concurrency', 20)
+        self.max_concurrency_per_destination = self._getint('deliversm-thrower', 'max_concurrency_per_destination', 5)
+
+        # Keep-alive http connections: idle connections kept per host, seconds before closing them
+        # and resumption of TLS sessions when connecting again to a https host
+        self.http_persistent_connections_per_host = self._getint(
+            'deliversm-thrower', 'http_persistent_connections_per_host', 5)
+        self.http_idle_timeout = self._getint('deliversm-thrower', 'http_idle_timeout', 240)
+        self.http_tls_session_reuse = self._getbool('deliversm-thrower', 'http_tls_session_reuse', True)
+
+        # Circuit breaker of http destinations (baseurls): the circuit opens when at least
+        # http_breaker_min_calls of the last http_breaker_window throws were made and
+        # http_breaker_failure_rate of them failed (errors, timeouts, 5xx or responses slower than
+        # http_breaker_slow_call seconds), messages are then parked without being thrown and a probe
+        # throw is made every http_breaker_open_time seconds until the destination recovers
+        self.http_breaker = self._getbool('deliversm-thrower', 'http_breaker', True)
+        self.http_breaker_window = self._getint('deliversm-thrower', 'http_breaker_window', 20)
+        self.http_breaker_min_calls = self._getint('deliversm-thrower', 'http_breaker_min_calls', 10)
+        self.http_breaker_failure_rate = self._getfloat('deliversm-thrower', 'http_breaker_failure_rate', 0.5)
+        self.http_breaker_slow_call = self._getfloat('deliversm-thrower', 'http_breaker_slow_call', 10.0)
+        self.http_breaker_open_time = self._getint('deliversm-thrower', 'http_breaker_open_time', 30)
+
         # Logging
         self.log_level = logging.getLevelName(self._get('deliversm-thrower', 'log_level', 'INFO'))
         self.log_file = self._get(
@@ -68,10 +108,43 @@ class DLRThrowerConfig(ConfigFile):
         self.retry_delay = self._getint('dlr-thrower', 'retry_delay', 30)
         self.max_retries = self._getint('dlr-thrower', 'max_retries', 3)
 
+        # Bounded parallelism: max_concurrency messages are held (being thrown or waiting for
+        # their destination) and no more than max_concurrency_per_destination are thrown to
+        # the same destination (http host or smpps system_id) at the same time
+        self.max_concurrency = self._getint('dlr-thrower', 'max_concurrency', 20)
+        self.max_concurrency_per_destination = self._getint('dlr-thrower', 'max_concurrency_per_destination', 5)
+
+        # Keep-alive http connections: idle connections kept per host, seconds before closing them
+        # and resumption of TLS sessions when connecting again to a https host
+        self.http_persistent_connections_per_host = self._getint(
+            'dlr-thrower', 'http_persistent_connections_per_host', 5)
+        self.http_idle_timeout = self._getint('dlr-thrower', 'http_idle_timeout', 240)
+        self.http_tls_session_reuse = self._getbool('dlr-thrower', 'http_tls_session_reuse', True)
+
+        # Circuit breaker of http destinations (baseurls): the circuit opens when at least
+        # http_breaker_min_calls of the last http_breaker_window throws were made and
+        # http_breaker_failure_rate of them failed (errors, timeouts, 5xx or responses slower than
+        # http_breaker_slow_call seconds), messages are then parked without being thrown and a probe
+        # throw is made every http_breaker_open_time seconds until the destination recovers
+        self.http_breaker = self._getbool('dlr-thrower', 'http_breaker', True)
+        self.http_breaker_window = self._getint('dlr-thrower', 'http_breaker_window', 20)
+        self.http_breaker_min_calls = self._getint('dlr-thrower', 'http_breaker_min_calls', 10)
+        self.http_breaker_failure_rate = self._getfloat('dlr-thrower', 'http_breaker_failure_rate', 0.5)
+        self.http_breaker_slow_call = self._getfloat('dlr-thrower', 'http_breaker_slow_call', 10.0)
+        self.http_breaker_open_time = self._getint('dlr-thrower', 'http_breaker_open_time', 30)
+
         # #139: need configuration to send deliver_sm instead of data_sm for SMPP delivery receipt
         # 20150521: it seems better to get deliver_sm the default pdu for receipts
         self.dlr_pdu = self._get('dlr-thrower', 'dlr_pdu', 'deliver_sm')
 
+        # Batched http DLRs: DLRs to urls starting with one of http_batch_urls (comma separated) are
+        # POSTed as a json array, up to http_batch_max_size DLRs waiting no more than http_batch_window
+        # seconds are batched together
+        self.http_batch_urls = [url.strip() for url in self._get('dlr-thrower', 'http_batch_urls', '').split(',')
+                                if len(url.strip()) > 0]
+        self.http_batch_window = self._getfloat('dlr-thrower', 'http_batch_window', 1.0)
+        self.http_batch_max_size = self._getint('dlr-thrower', 'http_batch_max_size', 100)
+
         # Logging
         self.log_level = logging.getLevelName(self._get('dlr-thrower', 'log_level', 'INFO'))
         self.log_file = self._get('dlr-thrower', 'log_file', '%s/var/log/jasmin/dlr-thrower.log' % ROOT_PATH)
@@ -2,6 +2,8 @@ import cPickle as pickle
 
 from txamqp.content import Content
 
+from jasmin.queues import wire
+
 
 class PDU(Content):
     pickleProtocol = pickle.HIGHEST_PROTOCOL
@@ -9,15 +11,17 @@ class PDU(Content):
     def pickle(self, data):
         return pickle.dumps(data, self.pickleProtocol)
 
-    def __init__(self, body="", children=None, properties=None, pickleProtocol=2):
+    def __init__(self, body="", children=None, properties=None, pickleProtocol=2, prePickle=True):
         self.pickleProtocol = pickleProtocol
 
-        body = self.pickle(body)
+        if prePickle is True:
+            body = self.pickle(body)
 
         Content.__init__(self, body, children, properties)
 
 class RoutedDeliverSmContent(PDU):
-    def __init__(self, deliver_sm, msgid, scid, dcs, route_type='simple', trycount=0, pickleProtocol=2):
+    def __init__(self, deliver_sm, msgid, scid, dcs, route_type='simple', trycount=0, pickleProtocol=2,
+                 compact=False):
         props = {}
 
         if type(dcs) != list:
@@ -25,11 +29,24 @@ class RoutedDeliverSmContent(PDU):
             #   this test/conversion is done to preserve backward compatibility
             dcs = [dcs]
 
+        # deliver_sm and dcs are pickled if they cannot be serialized in the compact format
+        prePickle = True
+        if compact:
+            try:
+                deliver_sm = wire.dumpPDU(deliver_sm)
+                dcs = wire.dumpConnectors(dcs)
+                props['content-type'] = wire.CONTENT_TYPE
+                prePickle = False
+            except wire.WireFormatError:
+                pass
+        if prePickle:
+            dcs = self.pickle(dcs)
+
         props['message-id'] = msgid
         props['headers'] = {
             'route-type': route_type,
             'src-connector-id': scid,
-            'dst-connectors': self.pickle(dcs),
+            'dst-connectors': dcs,
             'try-count': trycount}
 
-        PDU.__init__(self, deliver_sm, properties=props, pickleProtocol=pickleProtocol)
+        PDU.__init__(self, deliver_sm, properties=props, pickleProtocol=pickleProtocol, prePickle=prePickle)
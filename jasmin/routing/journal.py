@@ -0,0 +1,127 @@
+"""
+Append-only journal of users quota updates
+
+The journal holds the quota updates made since the users snapshot (.router-users file) it
+applies to was persisted, one json entry per line:
+  - The first line holds the md5 digest of the snapshot, a journal is only replayed on top
+    of the very snapshot it was started for,
+  - Next lines are [uid, cred, quota, difference] entries, as given to updateQuota().
+
+Entries are buffered in memory and written (then fsync-ed) in batches by flush().
+"""
+
+import json
+import os
+
+
+class QuotaJournalError(Exception):
+    """Raised when the journal file cannot be read or written"""
+
+
+class QuotaJournal(object):
+    def __init__(self, path):
+        self.path = path
+
+        # Entries waiting for the next flush()
+        self.pending = []
+        # Entries written to the journal file
+        self.size = 0
+
+    def append(self, uid, cred, quota, difference):
+        self.pending.append(json.dumps([uid, cred, quota, difference]))
+
+    def flush(self):
+        """Write pending entries to the journal file and fsync it, returns the number of
+        written entries"""
+        if len(self.pending) == 0:
+            return 0
+
+        try:
+            fh = open(self.path, 'a')
+            try:
+                fh.write(''.join(['%s\n' % entry for entry in self.pending]))
+                fh.flush()
+                os.fsync(fh.fileno())
+            finally:
+                fh.close()
+        except (IOError, OSError), e:
+            raise QuotaJournalError('Cannot write to %s: %s' % (self.path, e))
+
+        count = len(self.pending)
+        self.size += count
+        self.pending = []
+        return count
+
+    def reset(self, snapshot_digest):
+        """Start a new empty journal for the snapshot having snapshot_digest, pending entries
+        are dropped (they are part of the snapshot)"""
+        try:
+            fh = open(self.path, 'w')
+            try:
+                fh.write('%s\n' % json.dumps({'snapshot': snapshot_digest}))
+                fh.flush()
+                os.fsync(fh.fileno())
+            finally:
+                fh.close()
+        except (IOError, OSError), e:
+            raise QuotaJournalError('Cannot write to %s: %s' % (self.path, e))
+
+        self.pending = []
+        self.size = 0
+
+    def read(self, snapshot_digest):
+        """Returns the entries journaled on top of the snapshot having snapshot_digest and
+        whether the last entry was truncated (it was being written and is ignored), entries
+        are None if the journal is missing or was started for another snapshot"""
+        try:
+            fh = open(self.path, 'r')
+            try:
+                lines = fh.readlines()
+            finally:
+                fh.close()
+        except IOError:
+            return None, False
+
+        try:
+            if len(lines) == 0 or json.loads(lines[0])['snapshot'] != snapshot_digest:
+                return None, False
+        except (ValueError, TypeError, KeyError):
+            return None, False
+
+        entries = []
+        for i, line in enumerate(lines[1:]):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                if i < len(lines) - 2:
+                    raise QuotaJournalError('Corrupted entry at line %s of %s' % (i + 2, self.path))
+                return entries, True
+
+        return entries, False
+
+    def replay(self, snapshot_digest, users_by_uid):
+        """Apply the entries journaled on top of the snapshot having snapshot_digest to
+        users_by_uid, a new journal is started if there is no such entries.
+
+        Returns the number of replayed entries.
+        """
+        entries, truncated = self.read(snapshot_digest)
+        if entries is None:
+            self.reset(snapshot_digest)
+            return 0
+
+        for uid, cred, quota, difference in entries:
+            _user = users_by_uid.get(str(uid))
+            if _user is not None:
+                getattr(_user, cred).updateQuota(quota, difference)
+
+        self.pending = []
+        self.size = len(entries)
+        if truncated:
+            # Rewrite the journal without its truncated entry before appending to it
+            self.reset(snapshot_digest)
+            for entry in entries:
+                self.append(*entry)
+            self.flush()
+
+        return len(entries)
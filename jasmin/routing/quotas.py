@@ -0,0 +1,186 @@
+"""
+Users quotas shared by many routers through redis
+
+A shared quota (ex: 'quota:<uid>:balance') holds the credit that is not leased yet, routers
+charge their users from leases: credit chunks atomically taken from the shared quota by
+QUOTA_LEASE_SCRIPT and spent locally, without any redis round trip.
+
+A router never spends more than what it leased, unused leases are given back when they
+are idle for lease_ttl seconds (or when the router is stopped), a crashed router loses
+at most a chunk of credit per user quota.
+"""
+
+import time
+
+from twisted.internet import defer, task
+
+# Lease ARGV[1] from the shared quota KEYS[1], it is initialised to ARGV[2] (the router's
+# local quota) when missing, returns the leased amount and the credit left
+QUOTA_LEASE_SCRIPT = """
+local available = redis.call('GET', KEYS[1])
+if available then
+    available = tonumber(available)
+else
+    available = tonumber(ARGV[2])
+end
+local leased = math.max(math.min(available, tonumber(ARGV[1])), 0)
+available = available - leased
+redis.call('SET', KEYS[1], string.format('%.17g', available))
+return {string.format('%.17g', leased), string.format('%.17g', available)}
+"""
+
+# Add ARGV[1] to the shared quota KEYS[1], a missing quota is left to be initialised by
+# the next lease
+QUOTA_UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBYFLOAT', KEYS[1], ARGV[1])
+end
+return false
+"""
+
+
+class SharedQuotas(object):
+    # Users mt_credential quotas charged from leases, unlimited (None) quotas are not shared
+    quotas = ['balance', 'submit_sm_count']
+
+    def __init__(self, redisClient, RouterPBConfig, log):
+        self.redisClient = redisClient
+        self.log = log
+
+        self.chunks = {'balance': RouterPBConfig.shared_quotas_balance_chunk,
+                       'submit_sm_count': RouterPBConfig.shared_quotas_submit_sm_count_chunk}
+        self.lease_ttl = RouterPBConfig.shared_quotas_lease_ttl
+
+        # (uid, quota) -> [leased credit left, last time it was spent]
+        self.leases = {}
+        # (uid, quota) -> Deferreds waiting for the running refill
+        self.refills = {}
+
+        self.releaseTimer = task.LoopingCall(self.releaseIdleLeases)
+        self.releaseTimer.start(self.lease_ttl, now=False)
+
+    def getKey(self, uid, quota):
+        return 'quota:%s:%s' % (uid, quota)
+
+    def getLeased(self, uid, quota):
+        lease = self.leases.get((uid, quota))
+        if lease is None:
+            return 0
+        return lease[0]
+
+    def isLeased(self, _user, quota, amount):
+        """Returns True if amount can be spent from _user's lease, a refill is started if
+        it cannot"""
+        if self.getLeased(_user.uid, quota) >= amount:
+            return True
+
+        self.refill(_user, quota, amount)
+        return False
+
+    def ensureLeased(self, _user, quota, amount):
+        "Returns a deferred firing when _user's lease is refilled if it is short of amount"
+        if self.getLeased(_user.uid, quota) >= amount:
+            return defer.succeed(None)
+
+        return self.refill(_user, quota, amount)
+
+    def spend(self, _user, quota, amount):
+        """Spend amount from _user's lease (it must be checked through isLeased() first),
+        the lease is refilled in the background when half of a chunk is left"""
+        lease = self.leases[(_user.uid, quota)]
+        lease[0] -= amount
+        lease[1] = time.time()
+
+        if lease[0] < self.chunks[quota] / 2.0:
+            self.refill(_user, quota)
+
+    def refill(self, _user, quota, needed=0):
+        """Lease a chunk (or needed if larger) from the shared quota
+
+        The local quota is set to the shared one plus the leased credit, it is the
+        best known credit of _user and is what initialises the shared quota.
+        """
+        key = (_user.uid, quota)
+        d = defer.Deferred()
+        if key in self.refills:
+            # Wait for the running refill
+            self.refills[key].append(d)
+            return d
+        self.refills[key] = [d]
+
+        wanted = max(self.chunks[quota], needed - self.getLeased(*key))
+
+        def _leased((leased, available)):
+            lease = self.leases.setdefault(key, [0, time.time()])
+            lease[0] += type(self.chunks[quota])(float(leased))
+
+            _cred = _user.mt_credential
+            if _cred.getQuota(quota) is not None:
+                _cred.setQuota(quota, type(_cred.getQuota(quota))(float(available)) + lease[0])
+            self.log.debug('Leased %s %s for user [uid:%s], %s left', leased, quota, _user.uid, available)
+
+        def _error(failure):
+            self.log.error('Cannot lease %s for user [uid:%s]: %s', quota, _user.uid, failure.getErrorMessage())
+
+        def _done(_):
+            for waiting in self.refills.pop(key):
+                waiting.callback(None)
+
+        _d = self.redisClient.run_script(
+            QUOTA_LEASE_SCRIPT,
+            keys=[self.getKey(*key)],
+            args=['%.17g' % wanted, '%.17g' % _user.mt_credential.getQuota(quota)])
+        _d.addCallbacks(_leased, _error)
+        _d.addCallback(_done)
+
+        return d
+
+    def prefetch(self, users):
+        "Lease a chunk of every limited quota of users having no lease yet"
+        for _user in users:
+            for quota in self.quotas:
+                if (_user.mt_credential.getQuota(quota) is not None and
+                        (_user.uid, quota) not in self.leases):
+                    self.refill(_user, quota)
+
+    def update(self, uid, quota, difference):
+        "Add difference to the shared quota"
+        d = self.redisClient.run_script(
+            QUOTA_UPDATE_SCRIPT, keys=[self.getKey(uid, quota)], args=['%.17g' % difference])
+        d.addErrback(lambda failure: self.log.error(
+            'Cannot update %s of user [uid:%s] with %s: %s',
+            quota, uid, difference, failure.getErrorMessage()))
+        return d
+
+    def forget(self, uid, quota):
+        """Drop the shared quota and its local lease, the quota will be initialised by the
+        next lease"""
+        self.leases.pop((uid, quota), None)
+        d = self.redisClient.delete(self.getKey(uid, quota))
+        d.addErrback(lambda failure: self.log.error(
+            'Cannot drop %s of user [uid:%s]: %s', quota, uid, failure.getErrorMessage()))
+        return d
+
+    def releaseIdleLeases(self, idle_secs=None):
+        "Give back the leases left unspent for idle_secs (defaults to lease_ttl)"
+        if idle_secs is None:
+            idle_secs = self.lease_ttl
+
+        dl = []
+        for key, (leased, last_spent) in self.leases.items():
+            if time.time() - last_spent < idle_secs or key in self.refills:
+                continue
+
+            del self.leases[key]
+            if leased > 0:
+                self.log.debug('Releasing %s %s leased for user [uid:%s]', leased, key[1], key[0])
+                dl.append(self.update(key[0], key[1], leased))
+
+        return defer.DeferredList(dl)
+
+    def stop(self):
+        "Give back every lease"
+        if self.releaseTimer.running:
+            self.releaseTimer.stop()
+
+        return self.releaseIdleLeases(0)
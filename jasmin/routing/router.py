@@ -14,11 +14,18 @@ from jasmin.routing.InterceptionTables import (MOInterceptionTable,
                                                MTInterceptionTable,
                                                InvalidInterceptionTableParameterError)
 from jasmin.routing.RoutingTables import MORoutingTable, MTRoutingTable, InvalidRoutingTableParameterError
+from jasmin.queues import wire
+from jasmin.routing.journal import QuotaJournal, QuotaJournalError
+from jasmin.routing.quotas import SharedQuotas
 from jasmin.routing.content import RoutedDeliverSmContent
+from jasmin.tools.cache import LRUCache
 from jasmin.tools.migrations.configuration import ConfigurationMigrator
 
 LOG_CATEGORY = "jasmin-router"
 
+# Profile persisted by persistenceTimer, its users quota updates are journaled
+QUOTA_JOURNAL_PROFILE = 'jcli-prod'
+
 
 class RouterPB(pb.Avatar):
     def __init__(self, RouterPBConfig, persistenceTimer=True):
@@ -45,11 +52,27 @@ class RouterPB(pb.Avatar):
         self.mt_routing_table = MTRoutingTable()
         self.users = []
         self.groups = []
+        # Users and groups indexes, kept consistent with self.users and self.groups
+        self.users_by_uid = {}
+        self.users_by_username = {}
+        self.groups_by_gid = {}
+
+        # Authentication decisions cache: (username, password digest) -> User or None
+        self.auth_cache = LRUCache(self.config.auth_cache_size, self.config.auth_cache_ttl)
 
         # Init interception-related objects
         self.mo_interception_table = MOInterceptionTable()
         self.mt_interception_table = MTInterceptionTable()
 
+        # Quota updates journal of QUOTA_JOURNAL_PROFILE users, updates are journaled only when
+        # the profile's users snapshot is in sync with self.users (it was last loaded or persisted)
+        self.quota_journal = QuotaJournal(
+            '%s/%s.router-users.journal' % (self.config.store_path, QUOTA_JOURNAL_PROFILE))
+        self.quota_journal_synced = False
+
+        # Set through addRedisClient when users quotas are shared with other routers
+        self.sharedQuotas = None
+
         if persistenceTimer:
             # Activate persistenceTimer, used for persisting users and groups whenever critical updates
             # occured
@@ -104,13 +127,19 @@ class RouterPB(pb.Avatar):
             self.bill_request_submit_sm_resp_errback)
         self.log.info('RouterPB is consuming from routing key: %s', routingKey)
 
+    def addRedisClient(self, redisClient):
+        self.sharedQuotas = SharedQuotas(redisClient, self.config, self.log)
+        self.log.info('Added redisClient to RouterPB, users quotas are shared')
+
+        self.sharedQuotas.prefetch(self.users)
+
     @defer.inlineCallbacks
     def rejectMessage(self, message):
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=0)
+        yield self.amqpBroker.reject(message.delivery_tag, requeue=0)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.ack(message.delivery_tag)
 
     def activatePersistenceTimer(self):
         if self.persistenceTimer and self.persistenceTimer.active():
@@ -133,17 +162,37 @@ class RouterPB(pb.Avatar):
         'This is run every self.config.persistence_timer_secs seconds'
         self.log.debug('persistenceTimerExpired called')
 
-        # If at least one user have its quotas updated, then persist
-        # groups and users to disk
+        # Journaled quota updates are flushed to disk, groups and users are persisted (compacting
+        # the journal) instead if at least one user have its quotas updated without being
+        # journaled, if the journal is out of sync or reached quota_journal_compaction_size
+        quotas_updated = False
         for u in self.users:
             if u.mt_credential.quotas_updated:
-                self.log.info('Detected a user quota update, users and groups will be persisted.')
-                self.perspective_persist(scope='groups')
-                self.perspective_persist(scope='users')
-                u.mt_credential.quotas_updated = False
-                self.log.debug('Persisted successfully')
+                quotas_updated = True
                 break
 
+        if len(self.quota_journal.pending) > 0 and not quotas_updated:
+            if (not self.quota_journal_synced or not self.persistenceState['users'] or
+                    self.quota_journal.size + len(self.quota_journal.pending) >=
+                    self.config.quota_journal_compaction_size):
+                quotas_updated = True
+            else:
+                try:
+                    count = self.quota_journal.flush()
+                except QuotaJournalError, e:
+                    self.log.error('Cannot flush quota journal, users and groups will be persisted: %s', e)
+                    quotas_updated = True
+                else:
+                    self.log.debug('Flushed %s quota updates to journal', count)
+
+        if quotas_updated:
+            self.log.info('Detected a user quota update, users and groups will be persisted.')
+            self.perspective_persist(scope='groups')
+            self.perspective_persist(scope='users')
+            for u in self.users:
+                u.mt_credential.quotas_updated = False
+            self.log.debug('Persisted successfully')
+
         self.activatePersistenceTimer()
 
     @defer.inlineCallbacks
@@ -157,7 +206,7 @@ class RouterPB(pb.Avatar):
         scid = message.content.properties['headers']['connector-id']
         concatenated = message.content.properties['headers']['concatenated']
         will_be_concatenated = message.content.properties['headers']['will_be_concatenated']
-        routable = pickle.loads(message.content.body)
+        routable = wire.loads(message.content, message.content.body, wire.loadRoutableDeliverSm)
         self.log.debug("Callbacked a deliver_sm with a DeliverSmPDU[%s] (?): %s", msgid, routable.pdu)
 
         # @todo: Implement MO throttling here, same as in
@@ -209,7 +258,8 @@ class RouterPB(pb.Avatar):
                 yield self.ackMessage(message)
 
                 # Enqueue DeliverSm for delivery through publishing it to deliver_sm_thrower.(type)
-                content = RoutedDeliverSmContent(routable.pdu, msgid, scid, routedConnectors, route_type)
+                content = RoutedDeliverSmContent(routable.pdu, msgid, scid, routedConnectors, route_type,
+                                                 compact=self.amqpBroker.config.wire_format == 'compact')
                 self.log.debug("Publishing RoutedDeliverSmContent [msgid:%s] in deliver_sm_thrower.%s",
                                msgid, routedConnectors[0].type)
                 yield self.amqpBroker.publish(exchange='messaging', routing_key='deliver_sm_thrower.%s' %
@@ -247,13 +297,17 @@ class RouterPB(pb.Avatar):
             self.log.error("User [uid:%s] not found, billing request [bid:%s] rejected", uid, bid)
             yield self.rejectMessage(message)
         elif _user.mt_credential.getQuota('balance') is not None:
-            if _user.mt_credential.getQuota('balance') < amount:
+            if self.sharedQuotas is not None:
+                # Wait for the lease to be refilled if needed
+                yield self.sharedQuotas.ensureLeased(_user, 'balance', amount)
+
+            if not self.hasUserQuota(_user, 'balance', amount):
                 self.log.error(
                     'User [uid:%s] have no sufficient balance (%s/%s) for this billing [bid:%s] request: rejected',
                     uid, _user.mt_credential.getQuota('balance'), amount, bid)
                 yield self.rejectMessage(message)
             else:
-                _user.mt_credential.updateQuota('balance', -amount)
+                self.chargeUserQuota(_user, 'balance', amount)
                 self.log.info('User [uid:%s] charged for amount: %s (bid:%s)', uid, amount, bid)
                 yield self.ackMessage(message)
 
@@ -282,39 +336,131 @@ class RouterPB(pb.Avatar):
     def getMTRoutingTable(self):
         return self.mt_routing_table
 
-    def authenticateUser(self, username, password, return_pickled=False):
+    def reindexUsers(self):
+        """Rebuild users indexes, must be called whenever self.users is replaced or updated
+        in bulk
+        """
+        self.invalidateAuthCache()
+        self.users_by_uid = {}
+        self.users_by_username = {}
+        for _user in self.users:
+            self.users_by_uid.setdefault(str(_user.uid), _user)
+            self.users_by_username.setdefault(_user.username, _user)
+
+    def reindexGroups(self):
+        """Rebuild groups index, must be called whenever self.groups is replaced or updated
+        in bulk
+        """
+        self.invalidateAuthCache()
+        self.groups_by_gid = {}
+        for _group in self.groups:
+            self.groups_by_gid.setdefault(str(_group.gid), _group)
+
+    def _removeUser(self, user):
+        """Remove user from self.users and its indexes"""
+        self.users.remove(user)
+        if self.users_by_uid.get(str(user.uid)) is user:
+            del self.users_by_uid[str(user.uid)]
+        if self.users_by_username.get(user.username) is user:
+            del self.users_by_username[user.username]
+        self.invalidateAuthCache(user.username)
+
+    def invalidateAuthCache(self, username=None):
+        """Remove cached authentication decisions of username, or all decisions if username
+        is None
+        """
+        if username is None:
+            self.auth_cache.invalidate()
+        else:
+            self.auth_cache.invalidate(lambda key: key[0] == username)
+
+    def authenticateUser(self, username, password, return_pickled=False, stats=None):
         """Authenticate a user agains username and password and return user object or None
+
+        Decisions are cached in self.auth_cache, if stats is set then its auth_cache_hit_count and
+        auth_cache_miss_count keys will be incremented accordingly.
         """
+        password_digest = md5(password).digest()
+        try:
+            _user = self.auth_cache.get((username, password_digest))
+        except KeyError:
+            if stats is not None:
+                stats.inc('auth_cache_miss_count')
+
+            _user = self._authenticateUser(username, password_digest)
+            self.auth_cache.set((username, password_digest), _user)
+        else:
+            if stats is not None:
+                stats.inc('auth_cache_hit_count')
+            self.log.debug('authenticateUser [username:%s] returned a cached decision', username)
+
+        if _user is not None and return_pickled:
+            return pickle.dumps(_user, self.pickleProtocol)
+        else:
+            return _user
+
+    def _authenticateUser(self, username, password_digest):
         # Find user having correct username/password
-        for _user in self.users:
-            if _user.username == username and _user.password == md5(password).digest():
-                self.log.debug('authenticateUser [username:%s] returned a User', username)
-
-                # Check if user's group is enabled
-                _group = self.getGroup(_user.group.gid)
-                if _group is not None and not _group.enabled:
-                    self.log.info('authenticateUser [username:%s] returned None (group %s is disabled)',
-                                  username, _user.group)
-                    return None
-
-                # Check if user is enabled
-                if not _user.enabled:
-                    self.log.info('authenticateUser [username:%s] returned None (user is disabled)',
-                                  username)
-                    return None
-
-                # If user/group are enabled:
-                if return_pickled:
-                    return pickle.dumps(_user, self.pickleProtocol)
-                else:
-                    return _user
+        _user = self.users_by_username.get(username)
+        if _user is not None and _user.password == password_digest:
+            self.log.debug('authenticateUser [username:%s] returned a User', username)
+
+            # Check if user's group is enabled
+            _group = self.getGroup(_user.group.gid)
+            if _group is not None and not _group.enabled:
+                self.log.info('authenticateUser [username:%s] returned None (group %s is disabled)',
+                              username, _user.group)
+                return None
+
+            # Check if user is enabled
+            if not _user.enabled:
+                self.log.info('authenticateUser [username:%s] returned None (user is disabled)',
+                              username)
+                return None
+
+            # If user/group are enabled:
+            return _user
 
         self.log.info('authenticateUser [username:%s] returned None', username)
         return None
 
+    def leaseUserQuotasForSubmitSms(self, user, bill, submit_sm_count=1):
+        """Returns a deferred fired once user's shared quotas leases cover bill, it must be
+        waited for before charging (c.f. chargeUserForSubmitSms)
+        """
+        return self.leaseUserQuotasForSubmitSmBulk(user, [(bill, submit_sm_count)])
+
+    def leaseUserQuotasForSubmitSmBulk(self, user, charges):
+        """Returns a deferred fired once user's shared quotas leases cover charges (refilling
+        them if they are short or missing, e.g. released after being idle), it fires right away
+        when quotas are not shared
+        """
+        _user = self.getUser(user.uid)
+        if self.sharedQuotas is None or _user is None:
+            return defer.succeed(None)
+
+        amount = sum([bill.getAmount('submit_sm') * submit_sm_count for bill, submit_sm_count in charges])
+        decrement = sum([bill.getAction('decrement_submit_sm_count') * submit_sm_count
+                         for bill, submit_sm_count in charges])
+
+        dl = []
+        if amount > 0 and _user.mt_credential.getQuota('balance') is not None:
+            dl.append(self.sharedQuotas.ensureLeased(_user, 'balance', amount))
+        if decrement > 0 and _user.mt_credential.getQuota('submit_sm_count') is not None:
+            dl.append(self.sharedQuotas.ensureLeased(_user, 'submit_sm_count', decrement))
+        return defer.DeferredList(dl)
+
     def chargeUserForSubmitSms(self, user, bill, submit_sm_count=1, requirements=None):
         """Will charge the user using the bill object after checking requirements
         """
+        return self.chargeUserForSubmitSmBulk(user, [(bill, submit_sm_count)], requirements)
+
+    def chargeUserForSubmitSmBulk(self, user, charges, requirements=None):
+        """Will charge the user once for many bills after checking requirements
+
+        charges is a list of (bill, submit_sm_count) tuples, the user is charged for all
+        of them or for none of them.
+        """
         if requirements is None:
             # Default:
             requirements = []
@@ -330,48 +476,74 @@ class RouterPB(pb.Avatar):
                 self.log.warn(requirement['error_message'])
                 return None
 
+        amount = sum([bill.getAmount('submit_sm') * submit_sm_count for bill, submit_sm_count in charges])
+        decrement = sum([bill.getAction('decrement_submit_sm_count') * submit_sm_count
+                         for bill, submit_sm_count in charges])
+
+        # Check quotas before updating any of them
+        if (amount > 0 and _user.mt_credential.getQuota('balance') is not None
+            and not self.hasUserQuota(_user, 'balance', amount)):
+            self.log.info('User [uid:%s] have no sufficient balance (%s) for submit_sm charging: %s',
+                          user.uid, _user.mt_credential.getQuota('balance'), amount)
+            return None
+        if (decrement > 0 and _user.mt_credential.getQuota('submit_sm_count') is not None
+            and not self.hasUserQuota(_user, 'submit_sm_count', decrement)):
+            self.log.info('User [uid:%s] have no sufficient submit_sm_count (%s) for submit_sm charging: %s',
+                          user.uid, _user.mt_credential.getQuota('submit_sm_count'), decrement)
+            return None
+
         # Charge _user
-        if (bill.getAmount('submit_sm') * submit_sm_count > 0
-            and _user.mt_credential.getQuota('balance') is not None):
-            if _user.mt_credential.getQuota('balance') < bill.getAmount('submit_sm') * submit_sm_count:
-                self.log.info('User [uid:%s] have no sufficient balance (%s) for submit_sm charging: %s',
-                              user.uid, _user.mt_credential.getQuota('balance'),
-                              bill.getAmount('submit_sm') * submit_sm_count)
-                return None
-            _user.mt_credential.updateQuota('balance', -(bill.getAmount('submit_sm') * submit_sm_count))
-            self.log.info('User [uid:%s] charged for submit_sm amount: %s',
-                          user.uid, bill.getAmount('submit_sm') * submit_sm_count)
+        if amount > 0 and _user.mt_credential.getQuota('balance') is not None:
+            self.chargeUserQuota(_user, 'balance', amount)
+            self.log.info('User [uid:%s] charged for submit_sm amount: %s', user.uid, amount)
         # Decrement counts
-        if (bill.getAction('decrement_submit_sm_count') * submit_sm_count > 0
-            and _user.mt_credential.getQuota('submit_sm_count') is not None):
-            if _user.mt_credential.getQuota('submit_sm_count') < bill.getAction(
-                    'decrement_submit_sm_count') * submit_sm_count:
-                self.log.info('User [uid:%s] have no sufficient submit_sm_count (%s) for submit_sm charging: %s',
-                              user.uid, _user.mt_credential.getQuota('submit_sm_count'),
-                              bill.getAction('decrement_submit_sm_count') * submit_sm_count)
-                return None
-            _user.mt_credential.updateQuota(
-                'submit_sm_count',
-                -(bill.getAction('decrement_submit_sm_count') * submit_sm_count))
+        if decrement > 0 and _user.mt_credential.getQuota('submit_sm_count') is not None:
+            self.chargeUserQuota(_user, 'submit_sm_count', decrement)
             self.log.info('User\'s [uid:%s] submit_sm_count decremented for submit_sm: %s',
-                          user.uid, bill.getAction('decrement_submit_sm_count') * submit_sm_count)
+                          user.uid, decrement)
 
         return True
 
+    def hasUserQuota(self, _user, quota, amount):
+        """Check _user's mt_credential quota covers amount, shared quotas are checked against
+        their leased credit"""
+        if self.sharedQuotas is not None:
+            return self.sharedQuotas.isLeased(_user, quota, amount)
+
+        return _user.mt_credential.getQuota(quota) >= amount
+
+    def chargeUserQuota(self, _user, quota, amount):
+        "Charge _user's mt_credential quota for amount (checked through hasUserQuota)"
+        self.updateUserQuota(_user, quota, -amount)
+
+        if self.sharedQuotas is not None:
+            self.sharedQuotas.spend(_user, quota, amount)
+
+    def updateUserQuota(self, _user, quota, difference, cred='mt_credential'):
+        """Update _user's quota and journal it, journaled updates are not flagged through
+        quotas_updated (persistenceTimer does not need to persist users for them)"""
+        _cred = getattr(_user, cred)
+        quotas_updated = _cred.quotas_updated
+        _cred.updateQuota(quota, difference)
+
+        if self.quota_journal_synced:
+            self.quota_journal.append(_user.uid, cred, quota, difference)
+            _cred.quotas_updated = quotas_updated
+
     def getUser(self, uid):
-        for _user in self.users:
-            if str(_user.uid) == str(uid):
-                self.log.debug('getUser [uid:%s] returned a User', uid)
-                return _user
+        _user = self.users_by_uid.get(str(uid))
+        if _user is not None:
+            self.log.debug('getUser [uid:%s] returned a User', uid)
+            return _user
 
         self.log.debug('getUser [uid:%s] returned None', uid)
         return None
 
     def getGroup(self, gid):
-        for _group in self.groups:
-            if str(_group.gid) == str(gid):
-                self.log.debug('getGroup [gid:%s] returned a Group', gid)
-                return _group
+        _group = self.groups_by_gid.get(str(gid))
+        if _group is not None:
+            self.log.debug('getGroup [gid:%s] returned a Group', gid)
+            return _group
 
         self.log.debug('getGroup [gid:%s] returned None', gid)
         return None
@@ -451,8 +623,9 @@ class RouterPB(pb.Avatar):
 
                 fh = open(path, 'w')
                 # Write configuration with datetime stamp
-                fh.write('Persisted on %s [Jasmin %s]\n' % (time.strftime("%c"), jasmin.get_release()))
-                fh.write(pickle.dumps(self.users, self.pickleProtocol))
+                content = 'Persisted on %s [Jasmin %s]\n' % (time.strftime("%c"), jasmin.get_release())
+                content += pickle.dumps(self.users, self.pickleProtocol)
+                fh.write(content)
                 fh.close()
 
                 # Set persistance state to True
@@ -460,6 +633,9 @@ class RouterPB(pb.Avatar):
                 for u in self.users:
                     u.mt_credential.quotas_updated = False
 
+                # Start a new quota journal on top of the persisted users
+                self.syncQuotaJournal(profile, md5(content).hexdigest())
+
             if scope in ['all', 'moroutes']:
                 # Persist moroutes configuration
                 path = '%s/%s.router-moroutes' % (self.config.store_path, profile)
@@ -527,6 +703,26 @@ class RouterPB(pb.Avatar):
 
         return True
 
+    def syncQuotaJournal(self, profile, snapshot_digest, replay=False):
+        """Called when users are persisted to (or loaded from, with replay) profile having
+        snapshot_digest, quota updates are journaled only on top of QUOTA_JOURNAL_PROFILE
+        snapshot"""
+        if profile != QUOTA_JOURNAL_PROFILE:
+            self.quota_journal_synced = False
+            return
+
+        try:
+            if replay:
+                count = self.quota_journal.replay(snapshot_digest, self.users_by_uid)
+                self.log.info('Replayed %s journaled quota updates', count)
+            else:
+                self.quota_journal.reset(snapshot_digest)
+        except QuotaJournalError, e:
+            self.log.error('Quota journal is disabled until users are persisted: %s', e)
+            self.quota_journal_synced = False
+        else:
+            self.quota_journal_synced = True
+
     def perspective_load(self, profile='jcli-prod', scope='all'):
         try:
             if scope in ['all', 'groups']:
@@ -549,6 +745,7 @@ class RouterPB(pb.Avatar):
 
                 # Adding new groups
                 self.groups = cf.getMigratedData()
+                self.reindexGroups()
                 self.log.info('Added new Groups (%d)', len(self.groups))
 
                 # Set persistance state to True
@@ -574,13 +771,20 @@ class RouterPB(pb.Avatar):
 
                 # Adding new users
                 self.users = cf.getMigratedData()
+                self.reindexUsers()
                 self.log.info('Added new Users (%d)', len(self.users))
 
+                # Replay quota updates journaled since users were persisted
+                self.syncQuotaJournal(profile, md5(''.join(lines)).hexdigest(), replay=True)
+
                 # Set persistance state to True
                 self.persistenceState['users'] = True
                 for u in self.users:
                     u.mt_credential.quotas_updated = False
 
+                if self.sharedQuotas is not None:
+                    self.sharedQuotas.prefetch(self.users)
+
             if scope in ['all', 'mointerceptors']:
                 # Load mointerceptors configuration
                 path = '%s/%s.router-mointerceptors' % (self.config.store_path, profile)
@@ -695,31 +899,54 @@ class RouterPB(pb.Avatar):
         self.log.info('Adding a User (id:%s)', user.uid)
 
         # Check if group exists
-        foundGroup = False
-        for _group in self.groups:
-            if _group.gid == user.group.gid:
-                foundGroup = True
-        if not foundGroup:
+        if self.getGroup(user.group.gid) is None:
             self.log.error("Group with id:%s not found, cancelling user adding.", user.group.gid)
             return False
 
         # Replace existant users
-        for _user in self.users:
-            if user.uid == _user.uid or user.username == _user.username:
-                self.log.warn('User (id:%s) already existant, will be replaced !', user.uid)
-                self.users.remove(_user)
+        _user = self.users_by_uid.get(str(user.uid), self.users_by_username.get(user.username))
+        if _user is not None:
+            self.log.warn('User (id:%s) already existant, will be replaced !', user.uid)
+            self._removeUser(_user)
 
-                # Save old CnxStatus in new user
-                user.setCnxStatus(_user.getCnxStatus())
-                break
+            # Save old CnxStatus in new user
+            user.setCnxStatus(_user.getCnxStatus())
+
+            if self.sharedQuotas is not None:
+                self.updateSharedQuotas(_user, user)
+
+            # Another user may hold the same username
+            _user = self.users_by_username.get(user.username)
+            if _user is not None:
+                self.log.warn('User (id:%s) have the same username, will be removed !', _user.uid)
+                self._removeUser(_user)
 
         self.users.append(user)
+        self.users_by_uid[str(user.uid)] = user
+        self.users_by_username[user.username] = user
+        self.invalidateAuthCache(user.username)
+
+        if self.sharedQuotas is not None:
+            self.sharedQuotas.prefetch([user])
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['users'] = False
 
         return True
 
+    def updateSharedQuotas(self, old_user, user):
+        """Apply the quotas updates made by replacing old_user with user to the shared
+        quotas, user's quotas are relative to the last credit known by this router"""
+        for quota in self.sharedQuotas.quotas:
+            old_value = old_user.mt_credential.getQuota(quota)
+            value = user.mt_credential.getQuota(quota)
+            if old_value is None or value is None:
+                # Quota was set or unlimited, the shared one is initialised by the next lease
+                if old_value != value:
+                    self.sharedQuotas.forget(user.uid, quota)
+            elif value != old_value:
+                self.sharedQuotas.update(user.uid, quota, value - old_value)
+
     def perspective_user_authenticate(self, username, password):
         self.log.debug('Authenticating with username:%s and password:%s', username, password)
         self.log.info('Authentication request with username:%s', username)
@@ -730,13 +957,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Enabling a User (id:%s)', uid)
 
         # Enable user
-        for _user in self.users:
-            if uid == _user.uid:
-                _user.enable()
+        _user = self.users_by_uid.get(str(uid))
+        if _user is not None:
+            _user.enable()
+            self.invalidateAuthCache(_user.username)
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['users'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['users'] = False
+            return True
 
         self.log.error("User with id:%s not found, not enabling it.", uid)
         return False
@@ -745,13 +973,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Disabling a User (id:%s)', uid)
 
         # Disable user
-        for _user in self.users:
-            if uid == _user.uid:
-                _user.disable()
+        _user = self.users_by_uid.get(str(uid))
+        if _user is not None:
+            _user.disable()
+            self.invalidateAuthCache(_user.username)
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['users'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['users'] = False
+            return True
 
         self.log.error("User with id:%s not found, not disabling it.", uid)
         return False
@@ -760,13 +989,13 @@ class RouterPB(pb.Avatar):
         self.log.info('Removing a User (id:%s)', uid)
 
         # Remove user
-        for _user in self.users:
-            if uid == _user.uid:
-                self.users.remove(_user)
+        _user = self.users_by_uid.get(str(uid))
+        if _user is not None:
+            self._removeUser(_user)
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['users'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['users'] = False
+            return True
 
         self.log.error("User with id:%s not found, not removing it.", uid)
         return False
@@ -775,6 +1004,7 @@ class RouterPB(pb.Avatar):
         self.log.info('Removing all users')
 
         self.users = []
+        self.reindexUsers()
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['users'] = False
@@ -799,28 +1029,31 @@ class RouterPB(pb.Avatar):
         self.log.info('Updating a User (id:%s) quota: %s/%s %s', uid, cred, quota, value)
 
         # Find user
-        for _user in self.users:
-            if uid == _user.uid:
-                try:
-                    if not hasattr(_user, cred):
-                        raise Exception("Invalid cred: %s", cred)
-                    else:
-                        _cred = getattr(_user, cred)
+        _user = self.users_by_uid.get(str(uid))
+        if _user is not None:
+            try:
+                if not hasattr(_user, cred):
+                    raise Exception("Invalid cred: %s", cred)
+                else:
+                    _cred = getattr(_user, cred)
 
-                    if quota not in _cred.quotas:
-                        raise Exception("Unknown quota: %s", quota)
+                if quota not in _cred.quotas:
+                    raise Exception("Unknown quota: %s", quota)
 
-                    # Update the quota
-                    _cred.updateQuota(quota, value)
+                # Update the quota
+                self.updateUserQuota(_user, quota, value, cred)
+                if (self.sharedQuotas is not None and cred == 'mt_credential'
+                        and quota in self.sharedQuotas.quotas):
+                    self.sharedQuotas.update(_user.uid, quota, value)
 
-                except Exception, e:
-                    self.log.error("Error updating user (id:%s): %s", uid, e)
-                    return False
-                else:
-                    # Successful update !
-                    # Set persistance state to False (pending for persistance)
-                    self.persistenceState['users'] = False
-                    return True
+            except Exception, e:
+                self.log.error("Error updating user (id:%s): %s", uid, e)
+                return False
+            else:
+                # Successful update !
+                # Set persistance state to False (pending for persistance)
+                self.persistenceState['users'] = False
+                return True
 
         self.log.error("User with id:%s not found, not updating it.", uid)
 
@@ -831,12 +1064,13 @@ class RouterPB(pb.Avatar):
         self.log.info('Adding a Group (id:%s)', group.gid)
 
         # Replace existant groups
-        for _group in self.groups:
-            if group.gid == _group.gid:
-                self.groups.remove(_group)
-                break
+        _group = self.groups_by_gid.get(str(group.gid))
+        if _group is not None:
+            self.groups.remove(_group)
 
         self.groups.append(group)
+        self.groups_by_gid[str(group.gid)] = group
+        self.invalidateAuthCache()
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['groups'] = False
@@ -847,13 +1081,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Enabling a Group (id:%s)', gid)
 
         # Enable group
-        for _group in self.groups:
-            if gid == _group.gid:
-                _group.enable()
+        _group = self.groups_by_gid.get(str(gid))
+        if _group is not None:
+            _group.enable()
+            self.invalidateAuthCache()
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['groups'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['groups'] = False
+            return True
 
         self.log.error("Group with id:%s not found, not enabling it.", gid)
         return False
@@ -862,13 +1097,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Disabling a Group (id:%s)', gid)
 
         # Disable group
-        for _group in self.groups:
-            if gid == _group.gid:
-                _group.disable()
+        _group = self.groups_by_gid.get(str(gid))
+        if _group is not None:
+            _group.disable()
+            self.invalidateAuthCache()
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['groups'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['groups'] = False
+            return True
 
         self.log.error("Group with id:%s not found, not disabling it.", gid)
         return False
@@ -877,18 +1113,21 @@ class RouterPB(pb.Avatar):
         self.log.info('Removing a Group (id:%s)', gid)
 
         # Remove group
-        for _group in self.groups:
-            if gid == _group.gid:
-                # Remove users from this group
-                _users = copy(self.users)
-                for _user in _users:
-                    if _user.group.gid == _group.gid:
-                        self.log.info('Removing a User (id:%s) from the Group (id:%s)', _user.uid, gid)
-                        self.users.remove(_user)
-
-                # Safely remove this group
-                self.groups.remove(_group)
-                return True
+        _group = self.groups_by_gid.get(str(gid))
+        if _group is not None:
+            # Remove users from this group
+            _users = copy(self.users)
+            for _user in _users:
+                if _user.group.gid == _group.gid:
+                    self.log.info('Removing a User (id:%s) from the Group (id:%s)', _user.uid, gid)
+                    self.users.remove(_user)
+            self.reindexUsers()
+
+            # Safely remove this group
+            self.groups.remove(_group)
+            del self.groups_by_gid[str(gid)]
+            self.invalidateAuthCache()
+            return True
 
         self.log.error("Group with id:%s not found, not removing it.", gid)
 
@@ -914,6 +1153,8 @@ class RouterPB(pb.Avatar):
                     self.users.remove(_user)
 
         self.groups = []
+        self.reindexUsers()
+        self.reindexGroups()
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['groups'] = False
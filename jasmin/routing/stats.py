@@ -0,0 +1,32 @@
+from jasmin.tools.singleton import Singleton
+from jasmin.tools.stats import Stats
+
+class ThrowerStatistics(Stats):
+    "Thrower statistics holder"
+
+    def __init__(self, name):
+        self.name = name
+
+        self.init()
+
+    def init(self):
+        self._stats = {
+            'parked_count': 0,
+            # baseurl -> circuit breaker stats (c.f. jasmin.routing.throwers.CircuitBreaker)
+            'circuit_breakers': {},
+        }
+
+    def getStats(self):
+        return self._stats
+
+class ThrowerStatsCollector(object):
+    "Throwers statistics collection holder"
+    __metaclass__ = Singleton
+    throwers = {}
+
+    def get(self, name):
+        "Return a thrower's stats object or instanciate a new one"
+        if name not in self.throwers:
+            self.throwers[name] = ThrowerStatistics(name)
+
+        return self.throwers[name]
@@ -0,0 +1,110 @@
+#pylint: disable=W0401,W0611
+import cPickle as pickle
+
+from twisted.trial.unittest import TestCase
+from jasmin.routing.Engines import RoutingEngine
+from jasmin.routing.RoutingTables import MTRoutingTable, MORoutingTable
+from jasmin.routing.Routes import *
+from jasmin.routing.Filters import *
+from jasmin.vendor.smpp.pdu.operations import SubmitSM, DeliverSM
+from jasmin.routing.Routables import RoutableSubmitSm, RoutableDeliverSm
+
+class MTRoutingEngineTestCase(TestCase):
+
+    def setUp(self):
+        self.connector1 = SmppClientConnector('abc')
+        self.connector2 = SmppClientConnector('def')
+        self.group100 = Group(100)
+        self.group200 = Group(200)
+        self.user1 = User(1, self.group100, 'username', 'password')
+        self.user2 = User(2, self.group100, 'username', 'password')
+        self.user3 = User(3, self.group200, 'username', 'password')
+
+        self.routing_t = MTRoutingTable()
+        self.routing_t.add(DefaultRoute(self.connector1), 0)
+        self.routing_t.add(StaticMTRoute([UserFilter(self.user1)], self.connector1, 0.0), 10)
+        self.routing_t.add(StaticMTRoute([UserFilter(self.user2), DestinationAddrFilter(r'^33\d+')],
+                                         self.connector2, 0.0), 20)
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^2126\d+')], self.connector2, 0.0), 30)
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^21\d+')], self.connector1, 0.0), 15)
+        self.routing_t.add(StaticMTRoute([GroupFilter(self.group200)], self.connector1, 0.0), 5)
+        self.routing_t.add(StaticMTRoute([TagFilter(77)], self.connector2, 0.0), 50)
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^(44|45)\d+')], self.connector2, 0.0), 12)
+
+    def _linearGetRouteFor(self, routable):
+        for r in self.routing_t.getAll():
+            route = r.values()[0]
+            if route.matchFilters(routable):
+                return route
+        return None
+
+    def _routable(self, destination_addr, user, tags=None):
+        routable = RoutableSubmitSm(SubmitSM(source_addr='x', destination_addr=destination_addr,
+                                             short_message='hello world'), user)
+        for tag in tags or []:
+            routable.addTag(tag)
+        return routable
+
+    def test_same_result_as_linear_scan(self):
+        for destination_addr in ['21261234', '2126', '2199', '3312', '4412', '4512', '99', '']:
+            for user in [self.user1, self.user2, self.user3]:
+                for tags in [[], [77], [78, '77']]:
+                    routable = self._routable(destination_addr, user, tags)
+                    self.assertEqual(self.routing_t.getRouteFor(routable),
+                                     self._linearGetRouteFor(routable))
+
+    def test_order_is_preserved(self):
+        # Route 30 (prefix) is before route 10 (user)
+        route = self.routing_t.getRouteFor(self._routable('212612', self.user1))
+        self.assertEqual(route, self.routing_t.getAll()[1].values()[0])
+
+        # Only default route is matching
+        route = self.routing_t.getRouteFor(self._routable('99', self.user2))
+        self.assertEqual(repr(route), 'DefaultRoute')
+
+    def test_candidates(self):
+        engine = RoutingEngine(self.routing_t.getAll())
+
+        self.assertEqual(len(engine.unindexed), 2)
+        candidates = engine.getCandidates(self._routable('99', self.user2))
+        # user2's route, the non-literal prefix route and the default route
+        self.assertEqual([repr(engine.entries[p]) for p in candidates],
+                         ['StaticMTRoute', 'StaticMTRoute', 'DefaultRoute'])
+
+    def test_engine_invalidation(self):
+        routable = self._routable('99', self.user2, [99])
+        self.assertEqual(repr(self.routing_t.getRouteFor(routable)), 'DefaultRoute')
+
+        self.routing_t.add(StaticMTRoute([TagFilter(99)], self.connector2, 0.0), 60)
+        self.assertEqual(self.routing_t.getRouteFor(routable).getConnector(), self.connector2)
+
+        self.routing_t.remove(60)
+        self.assertEqual(repr(self.routing_t.getRouteFor(routable)), 'DefaultRoute')
+
+        self.routing_t.flush()
+        self.assertEqual(self.routing_t.getRouteFor(routable), None)
+
+    def test_engine_is_not_persisted(self):
+        routable = self._routable('21261234', self.user1)
+        route = self.routing_t.getRouteFor(routable)
+
+        self.assertFalse('engine' in pickle.loads(pickle.dumps(self.routing_t, 2)).__dict__)
+        unpickled = pickle.loads(pickle.dumps(self.routing_t, 2))
+        self.assertEqual(unpickled.getRouteFor(routable).getConnector().cid, route.getConnector().cid)
+
+class MORoutingEngineTestCase(TestCase):
+
+    def test_connector_index(self):
+        connector1 = SmppServerSystemIdConnector('abc')
+        connector2 = SmppServerSystemIdConnector('def')
+        routing_t = MORoutingTable()
+        routing_t.add(StaticMORoute([ConnectorFilter(connector1)], connector2), 10)
+        routing_t.add(StaticMORoute([ConnectorFilter(connector2)], connector1), 20)
+        routing_t.add(StaticMORoute([SourceAddrFilter(r'^1\d+')], connector1), 5)
+
+        pdu = DeliverSM(source_addr='100', destination_addr='200', short_message='hello world')
+        self.assertEqual(routing_t.getRouteFor(RoutableDeliverSm(pdu, connector1)).getConnector(), connector2)
+        self.assertEqual(routing_t.getRouteFor(RoutableDeliverSm(pdu, connector2)).getConnector(), connector1)
+
+        pdu = DeliverSM(source_addr='200', destination_addr='200', short_message='hello world')
+        self.assertEqual(routing_t.getRouteFor(RoutableDeliverSm(pdu, SmppServerSystemIdConnector('x'))), None)
@@ -1,3 +1,4 @@
+import re
 import cPickle as pickle
 from twisted.trial.unittest import TestCase
 from jasmin.routing.Routables import SimpleRoutablePDU
@@ -101,6 +102,26 @@ class DestinationAddrFilterTestCase(FilterTestCase):
         self.assertRaises(InvalidFilterParameterError, self.f.match, object)
         self.assertRaises(TypeError, self._filter, object)
 
+    def test_literal_prefix(self):
+        self.assertEqual(self.f.prefix, '20')
+        self.assertFalse(self.f.exact_prefix)
+
+        f = self._filter('^2020')
+        self.assertEqual(f.prefix, '2020')
+        self.assertTrue(f.exact_prefix)
+        self.assertTrue(f.match(self.routable))
+        self.assertFalse(self._filter('^2021').match(self.routable))
+
+    def test_unpickle_filter_without_prefix(self):
+        "Filters persisted by older releases have no prefix attributes"
+        del self.f.prefix
+        del self.f.exact_prefix
+
+        unpickledFilter = pickle.loads(pickle.dumps(self.f, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(unpickledFilter.prefix, '20')
+        self.assertFalse(unpickledFilter.exact_prefix)
+        self.assertTrue(unpickledFilter.match(self.routable))
+
 class ShortMessageFilterTestCase(FilterTestCase):
     _filter = ShortMessageFilter
 
@@ -248,3 +269,38 @@ class TagFilterTestCase(FilterTestCase):
     def test_invalid_parameter(self):
         self.assertRaises(InvalidFilterParameterError, self.f.match, object)
         self.assertRaises(InvalidFilterParameterError, self._filter, object)
+
+class LiteralPrefixTestCase(TestCase):
+
+    def test_literal_prefixes(self):
+        self.assertEqual(literal_prefix(re.compile(r'^2126\d+')), ('2126', False))
+        self.assertEqual(literal_prefix(re.compile(r'2126\d*')), ('2126', True))
+        self.assertEqual(literal_prefix(re.compile(r'^\+33')), ('+33', True))
+        self.assertEqual(literal_prefix(re.compile(r'^2126.*')), ('2126', True))
+        self.assertEqual(literal_prefix(re.compile(r'^21266?')), ('2126', False))
+        self.assertEqual(literal_prefix(re.compile(r'^2126*')), ('212', False))
+        self.assertEqual(literal_prefix(re.compile(r'^abc$')), ('abc', False))
+
+    def test_non_literal_prefixes(self):
+        self.assertEqual(literal_prefix(re.compile(r'^(33|34)\d+')), (None, False))
+        self.assertEqual(literal_prefix(re.compile(r'^33\d+|^34\d+')), (None, False))
+        self.assertEqual(literal_prefix(re.compile(r'^\d+')), (None, False))
+        self.assertEqual(literal_prefix(re.compile(r'^.*')), (None, False))
+        self.assertEqual(literal_prefix(re.compile(r'^3?')), (None, False))
+        self.assertEqual(literal_prefix(re.compile(r'(?i)^abc')), (None, False))
+
+class PrefixTrieTestCase(TestCase):
+
+    def setUp(self):
+        self.trie = PrefixTrie()
+        self.trie.add('21', 'a')
+        self.trie.add('2126', 'b')
+        self.trie.add('2126', 'c')
+        self.trie.add('33', 'd')
+
+    def test_standard(self):
+        self.assertEqual(len(self.trie), 4)
+        self.assertEqual(self.trie.getAll('212612345'), ['a', 'b', 'c'])
+        self.assertEqual(self.trie.getAll('2199'), ['a'])
+        self.assertEqual(self.trie.getAll('44'), [])
+        self.assertEqual(self.trie.getAll(''), [])
@@ -0,0 +1,91 @@
+"""
+Test cases for the quota updates journal
+"""
+
+import os
+import tempfile
+
+from twisted.trial.unittest import TestCase
+
+from jasmin.routing.jasminApi import User, Group, MtMessagingCredential
+from jasmin.routing.journal import QuotaJournal, QuotaJournalError
+
+
+class QuotaJournalTestCase(TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.journal = QuotaJournal(self.path)
+
+        mt_c = MtMessagingCredential()
+        mt_c.setQuota('balance', 10.0)
+        mt_c.setQuota('submit_sm_count', 10)
+        self.user = User('u1', Group('g1'), 'username', 'password', mt_c)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_replay(self):
+        self.journal.reset('digest')
+        self.journal.append('u1', 'mt_credential', 'balance', -1.5)
+        self.journal.append('u1', 'mt_credential', 'submit_sm_count', -2)
+        self.journal.append('unknown', 'mt_credential', 'balance', -1.0)
+        self.assertEqual(3, self.journal.flush())
+        self.assertEqual(3, self.journal.size)
+
+        journal = QuotaJournal(self.path)
+        self.assertEqual(3, journal.replay('digest', {'u1': self.user}))
+        self.assertEqual(8.5, self.user.mt_credential.getQuota('balance'))
+        self.assertEqual(8, self.user.mt_credential.getQuota('submit_sm_count'))
+        self.assertEqual(int, type(self.user.mt_credential.getQuota('submit_sm_count')))
+        self.assertEqual(3, journal.size)
+
+    def test_pending_updates_are_not_replayed(self):
+        self.journal.reset('digest')
+        self.journal.append('u1', 'mt_credential', 'balance', -1.5)
+
+        self.assertEqual(0, QuotaJournal(self.path).replay('digest', {'u1': self.user}))
+        self.assertEqual(10.0, self.user.mt_credential.getQuota('balance'))
+
+    def test_other_snapshot(self):
+        "Updates journaled on top of another snapshot are already part of the loaded one"
+        self.journal.reset('old-digest')
+        self.journal.append('u1', 'mt_credential', 'balance', -1.5)
+        self.journal.flush()
+
+        self.assertEqual(0, self.journal.replay('digest', {'u1': self.user}))
+        self.assertEqual(10.0, self.user.mt_credential.getQuota('balance'))
+
+        # A new journal is started
+        self.assertEqual(([], False), self.journal.read('digest'))
+
+    def test_missing_journal(self):
+        os.remove(self.path)
+
+        self.assertEqual(0, self.journal.replay('digest', {'u1': self.user}))
+        self.assertEqual(([], False), self.journal.read('digest'))
+
+    def test_truncated_entry(self):
+        self.journal.reset('digest')
+        self.journal.append('u1', 'mt_credential', 'balance', -1.5)
+        self.journal.flush()
+        with open(self.path, 'a') as fh:
+            fh.write('["u1", "mt_credential", "bal')
+
+        self.assertEqual(1, self.journal.replay('digest', {'u1': self.user}))
+        self.assertEqual(8.5, self.user.mt_credential.getQuota('balance'))
+
+        # Journal is rewritten without the truncated entry
+        self.journal.append('u1', 'mt_credential', 'balance', -1.0)
+        self.journal.flush()
+        entries, truncated = self.journal.read('digest')
+        self.assertEqual(2, len(entries))
+        self.assertFalse(truncated)
+
+    def test_corrupted_entry(self):
+        self.journal.reset('digest')
+        with open(self.path, 'a') as fh:
+            fh.write('garbage\n["u1", "mt_credential", "balance", -1.0]\n')
+
+        self.assertRaises(QuotaJournalError, self.journal.replay, 'digest', {'u1': self.user})
+        self.assertEqual(10.0, self.user.mt_credential.getQuota('balance'))
@@ -0,0 +1,179 @@
+"""
+Test cases for users quotas shared through redis
+"""
+
+import cPickle as pickle
+
+import mock
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from jasmin.routing.Bills import SubmitSmBill
+from jasmin.routing.configs import RouterPBConfig
+from jasmin.routing.jasminApi import User, Group, MtMessagingCredential
+from jasmin.routing.quotas import SharedQuotas, QUOTA_LEASE_SCRIPT, QUOTA_UPDATE_SCRIPT
+from jasmin.routing.router import RouterPB
+
+
+class FakeRedis(object):
+    "In memory redis strings, lua scripts are run the same way in python"
+
+    def __init__(self):
+        self.data = {}
+
+    def run_script(self, script, keys=(), args=()):
+        key = keys[0]
+        if script == QUOTA_LEASE_SCRIPT:
+            available = float(self.data.get(key, args[1]))
+            leased = max(min(available, float(args[0])), 0)
+            self.data[key] = '%.17g' % (available - leased)
+            return defer.succeed(['%.17g' % leased, self.data[key]])
+        elif script == QUOTA_UPDATE_SCRIPT:
+            if key not in self.data:
+                return defer.succeed(None)
+            self.data[key] = '%.17g' % (float(self.data[key]) + float(args[0]))
+            return defer.succeed(self.data[key])
+
+    def delete(self, key):
+        return defer.succeed(int(self.data.pop(key, None) is not None))
+
+
+class SharedQuotasTestCase(TestCase):
+    def setUp(self):
+        self.config = RouterPBConfig()
+        self.config.shared_quotas_balance_chunk = 10.0
+        self.config.shared_quotas_submit_sm_count_chunk = 10
+        self.redisClient = FakeRedis()
+        self.quotas = SharedQuotas(self.redisClient, self.config, mock.Mock())
+
+    def tearDown(self):
+        return self.quotas.stop()
+
+    def getUser(self, balance=15.0, submit_sm_count=None):
+        mt_c = MtMessagingCredential()
+        mt_c.setQuota('balance', balance)
+        mt_c.setQuota('submit_sm_count', submit_sm_count)
+        return User('u1', Group('g1'), 'username', 'password', mt_c)
+
+    def test_prefetch(self):
+        _user = self.getUser(submit_sm_count=100)
+        self.quotas.prefetch([_user, self.getUser(balance=None)])
+
+        # Shared quotas are initialised by the first lease
+        self.assertEqual({'quota:u1:balance': '5', 'quota:u1:submit_sm_count': '90'}, self.redisClient.data)
+        self.assertEqual(10.0, self.quotas.getLeased('u1', 'balance'))
+        self.assertEqual(10, self.quotas.getLeased('u1', 'submit_sm_count'))
+        self.assertEqual(15.0, _user.mt_credential.getQuota('balance'))
+
+    def test_spend(self):
+        _user = self.getUser()
+        self.quotas.prefetch([_user])
+
+        self.assertTrue(self.quotas.isLeased(_user, 'balance', 4.0))
+        self.quotas.spend(_user, 'balance', 4.0)
+        self.assertEqual(6.0, self.quotas.getLeased('u1', 'balance'))
+
+        # Lease is refilled once half of a chunk is spent
+        self.quotas.spend(_user, 'balance', 2.0)
+        self.assertEqual(9.0, self.quotas.getLeased('u1', 'balance'))
+        self.assertEqual('0', self.redisClient.data['quota:u1:balance'])
+        self.assertEqual(9.0, _user.mt_credential.getQuota('balance'))
+
+    def test_never_overspend(self):
+        "Routers sharing a quota cannot spend more than its credit"
+        other_quotas = SharedQuotas(self.redisClient, self.config, mock.Mock())
+        self.addCleanup(other_quotas.stop)
+        _user, _other_user = self.getUser(), self.getUser()
+        self.quotas.prefetch([_user])
+        other_quotas.prefetch([_other_user])
+
+        self.assertEqual(5.0, other_quotas.getLeased('u1', 'balance'))
+        self.assertFalse(other_quotas.isLeased(_other_user, 'balance', 6.0))
+        self.assertTrue(self.quotas.isLeased(_user, 'balance', 6.0))
+
+        # Giving back an unspent lease makes it available to others
+        self.quotas.releaseIdleLeases(0)
+        other_quotas.ensureLeased(_other_user, 'balance', 6.0)
+        self.assertTrue(other_quotas.isLeased(_other_user, 'balance', 6.0))
+        self.assertEqual(15.0, other_quotas.getLeased('u1', 'balance'))
+
+    def test_waiting_refill(self):
+        _user = self.getUser()
+        d = defer.Deferred()
+        self.redisClient.run_script = mock.Mock(return_value=d)
+
+        waiting = [self.quotas.ensureLeased(_user, 'balance', 12.0) for i in range(2)]
+        self.assertEqual(1, self.redisClient.run_script.call_count)
+        self.assertEqual(['12', '15'], self.redisClient.run_script.call_args[1]['args'])
+
+        d.callback(['12', '3'])
+        self.assertTrue(waiting[0].called and waiting[1].called)
+        self.assertEqual(12.0, self.quotas.getLeased('u1', 'balance'))
+
+    def test_redis_error(self):
+        _user = self.getUser()
+        self.redisClient.run_script = mock.Mock(return_value=defer.fail(Exception('Connection lost')))
+
+        self.assertFalse(self.quotas.isLeased(_user, 'balance', 1.0))
+        self.assertEqual(0, self.quotas.getLeased('u1', 'balance'))
+        self.assertEqual({}, self.quotas.refills)
+
+
+class RouterSharedQuotasTestCase(TestCase):
+    def setUp(self):
+        config = RouterPBConfig()
+        config.shared_quotas_balance_chunk = 10.0
+        config.shared_quotas_submit_sm_count_chunk = 10
+        self.router = RouterPB(config, persistenceTimer=False)
+        self.redisClient = FakeRedis()
+
+        self.group = Group('g1')
+        self.router.perspective_group_add(pickle.dumps(self.group))
+        mt_c = MtMessagingCredential()
+        mt_c.setQuota('balance', 15.0)
+        mt_c.setQuota('submit_sm_count', 5)
+        self.user = User('u1', self.group, 'username', 'password', mt_c)
+        self.router.perspective_user_add(pickle.dumps(self.user))
+        self.router.addRedisClient(self.redisClient)
+
+    def tearDown(self):
+        return self.router.sharedQuotas.stop()
+
+    def getBill(self, amount, decrement=1):
+        bill = SubmitSmBill(self.user)
+        bill.setAmount('submit_sm', amount)
+        bill.setAction('decrement_submit_sm_count', decrement)
+        return bill
+
+    def test_charge(self):
+        self.assertTrue(self.router.chargeUserForSubmitSms(self.user, self.getBill(2.0)))
+        self.assertEqual(13.0, self.router.getUser('u1').mt_credential.getQuota('balance'))
+        self.assertEqual(4, self.router.getUser('u1').mt_credential.getQuota('submit_sm_count'))
+
+        # submit_sm_count is all leased (5 < chunk), user is not charged at all
+        self.assertEqual(None, self.router.chargeUserForSubmitSms(self.user, self.getBill(1.0), 5))
+        self.assertEqual(8.0, self.router.sharedQuotas.getLeased('u1', 'balance'))
+        self.assertEqual(4, self.router.sharedQuotas.getLeased('u1', 'submit_sm_count'))
+
+    def test_user_update_quota(self):
+        self.assertTrue(self.router.perspective_user_update_quota('u1', 'mt_credential', 'balance', 10.0))
+        self.assertEqual('15', self.redisClient.data['quota:u1:balance'])
+
+        # Replacing the user applies its quotas updates
+        self.user.mt_credential.setQuota('balance', 30.0)
+        self.user.mt_credential.setQuota('submit_sm_count', None)
+        self.router.perspective_user_add(pickle.dumps(self.user))
+        self.assertEqual('20', self.redisClient.data['quota:u1:balance'])
+        self.assertFalse('quota:u1:submit_sm_count' in self.redisClient.data)
+
+    @defer.inlineCallbacks
+    def test_lease_after_idle_release(self):
+        "Leases released while the user was idle are refilled before charging"
+        yield self.router.sharedQuotas.releaseIdleLeases(0)
+        self.assertEqual(0, self.router.sharedQuotas.getLeased('u1', 'balance'))
+
+        bill = self.getBill(2.0)
+        yield self.router.leaseUserQuotasForSubmitSms(self.user, bill)
+        self.assertTrue(self.router.chargeUserForSubmitSms(self.user, bill))
+        self.assertEqual(8.0, self.router.sharedQuotas.getLeased('u1', 'balance'))
+        self.assertEqual(13.0, self.router.getUser('u1').mt_credential.getQuota('balance'))
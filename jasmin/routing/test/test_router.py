@@ -21,6 +21,7 @@ from jasmin.managers.dlr import DLRLookup
 from jasmin.managers.proxies import SMPPClientManagerPBProxy
 from jasmin.protocols.http.configs import HTTPApiConfig
 from jasmin.protocols.http.server import HTTPApi
+from jasmin.protocols.http.stats import HttpAPIStatsCollector
 from jasmin.protocols.smpp.configs import SMPPClientConfig
 from jasmin.protocols.smpp.test.smsc_simulator import *
 from jasmin.queues.configs import AmqpConfig
@@ -37,6 +38,7 @@ from jasmin.routing.proxies import RouterPBProxy
 from jasmin.routing.router import RouterPB
 from jasmin.routing.test.http_server import AckServer
 from jasmin.routing.throwers import DLRThrower
+from jasmin.tools.cache import LRUCache
 from jasmin.tools.cred.portal import JasminPBRealm
 from jasmin.tools.proxies import ConnectError
 from jasmin.tools.spread.pb import JasminPBPortalRoot
@@ -715,6 +717,108 @@ class UserAndGroupTestCases(RouterPBProxy, RouterPBTestCase):
         # Asserts
         self.assertEqual(oldCnxStatus, newCnxStatus)
 
+    @defer.inlineCallbacks
+    def test_users_and_groups_indexes(self):
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        g1 = Group(1)
+        yield self.group_add(g1)
+        g2 = Group(2)
+        yield self.group_add(g2)
+        u1 = User(1, g1, 'username', 'password')
+        yield self.user_add(u1)
+        u2 = User(2, g2, 'other', 'password')
+        yield self.user_add(u2)
+
+        self.assertEqual(self.pbRoot_f.getUser('1').username, 'username')
+        self.assertEqual(self.pbRoot_f.getUser(2).username, 'other')
+        self.assertEqual(self.pbRoot_f.getGroup('2').gid, 2)
+
+        # Replacing u1 with a new username
+        u1 = User(1, g1, 'renamed', 'password')
+        yield self.user_add(u1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password'), None)
+        self.assertEqual(self.pbRoot_f.authenticateUser('renamed', 'password').uid, 1)
+        self.assertEqual(sorted(self.pbRoot_f.users_by_username.keys()), ['other', 'renamed'])
+
+        # Removing a group will remove its users
+        yield self.group_remove(2)
+        self.assertEqual(self.pbRoot_f.getGroup(2), None)
+        self.assertEqual(self.pbRoot_f.getUser(2), None)
+        self.assertEqual(self.pbRoot_f.authenticateUser('other', 'password'), None)
+
+        yield self.user_remove(1)
+        self.assertEqual(self.pbRoot_f.getUser(1), None)
+        self.assertEqual(self.pbRoot_f.users_by_username, {})
+
+        yield self.user_add(u1)
+        yield self.group_remove_all()
+        self.assertEqual(self.pbRoot_f.users_by_uid, {})
+        self.assertEqual(self.pbRoot_f.groups_by_gid, {})
+
+    @defer.inlineCallbacks
+    def test_authentication_cache(self):
+        yield self.connect('127.0.0.1', self.pbPort)
+        stats = HttpAPIStatsCollector().get()
+        hits = stats.get('auth_cache_hit_count')
+        misses = stats.get('auth_cache_miss_count')
+
+        g1 = Group(1)
+        yield self.group_add(g1)
+        u1 = User(1, g1, 'username', 'password')
+        yield self.user_add(u1)
+
+        # Miss then hit
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password', stats=stats).uid, 1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password', stats=stats).uid, 1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'incorrect', stats=stats), None)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'incorrect', stats=stats), None)
+        self.assertEqual(stats.get('auth_cache_hit_count'), hits + 2)
+        self.assertEqual(stats.get('auth_cache_miss_count'), misses + 2)
+
+        # Disabling user or group invalidates cached decisions
+        yield self.user_disable(1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password'), None)
+        yield self.user_enable(1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password').uid, 1)
+        yield self.group_disable(1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password'), None)
+        yield self.group_enable(1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password').uid, 1)
+
+        # Updating password invalidates cached decisions
+        u1 = User(1, g1, 'username', 'newpwd')
+        yield self.user_add(u1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password'), None)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'newpwd').uid, 1)
+
+        # Removing user invalidates cached decisions
+        yield self.user_remove(1)
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'newpwd'), None)
+
+    def test_authentication_cache_ttl_and_size(self):
+        cache = LRUCache(size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+
+        # 'a' is the least recently used
+        cache.get('b')
+        cache.set('c', 3)
+        self.assertRaises(KeyError, cache.get, 'a')
+        self.assertEqual(len(cache), 2)
+
+        # Expired entries
+        cache.ttl = 0
+        cache.set('d', 4)
+        self.assertRaises(KeyError, cache.get, 'd')
+
+        # Disabled cache
+        cache = LRUCache(size=0)
+        cache.set('a', 1)
+        self.assertRaises(KeyError, cache.get, 'a')
+
 
 class PersistenceTestCase(RouterPBProxy, RouterPBTestCase):
     @defer.inlineCallbacks
@@ -788,6 +892,10 @@ class ConfigurationPersistenceTestCases(PersistenceTestCase):
         c = yield self.group_get_all()
         c = pickle.loads(c)
         self.assertEqual(1, len(c))
+        # Indexes are rebuilt
+        self.assertEqual(self.pbRoot_f.getUser(2).username, 'username2')
+        self.assertEqual(self.pbRoot_f.authenticateUser('username', 'password').uid, 1)
+        self.assertNotEqual(self.pbRoot_f.getGroup(1), None)
 
     @defer.inlineCallbacks
     def test_add_all_persist_and_load_default(self):
@@ -1181,6 +1289,75 @@ class QuotasUpdatedPersistenceTestCases(PersistenceTestCase):
         self.assertEqual(self.pbRoot_f.perspective_persist.call_args_list,
                          [mock.call(scope='groups'), mock.call(scope='users')])
 
+    @defer.inlineCallbacks
+    def test_journaled_quota_updates(self):
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        # Add a group and a user, then persist them
+        g1 = Group(1)
+        yield self.group_add(g1)
+        mt_c = MtMessagingCredential()
+        mt_c.setQuota('balance', 2.0)
+        u1 = User(1, g1, 'username', 'password', mt_c)
+        yield self.user_add(u1)
+        yield self.persist()
+
+        # Mock perspective_persist for later assertions
+        self.pbRoot_f.perspective_persist = mock.Mock(wraps=self.pbRoot_f.perspective_persist)
+        self.pbRoot_f.config.persistence_timer_secs = 0.1
+        self.pbRoot_f.activatePersistenceTimer()
+
+        # Journaled updates are not flagged through quotas_updated
+        self.pbRoot_f.updateUserQuota(self.pbRoot_f.users[0], 'balance', -0.5)
+        self.pbRoot_f.updateUserQuota(self.pbRoot_f.users[0], 'balance', -0.5)
+        self.assertFalse(self.pbRoot_f.users[0].mt_credential.quotas_updated)
+
+        yield waitFor(0.5)
+
+        # Users are not persisted, updates are flushed to the journal
+        self.assertEqual(self.pbRoot_f.perspective_persist.call_count, 0)
+        self.assertEqual(self.pbRoot_f.quota_journal.size, 2)
+
+        # Journaled updates are replayed when loading users
+        loadRet = yield self.load()
+        self.assertTrue(loadRet)
+        self.assertEqual(self.pbRoot_f.users[0].mt_credential.getQuota('balance'), 1.0)
+        self.assertFalse(self.pbRoot_f.users[0].mt_credential.quotas_updated)
+
+    @defer.inlineCallbacks
+    def test_quota_journal_compaction(self):
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        # Add a group and a user, then persist them
+        g1 = Group(1)
+        yield self.group_add(g1)
+        mt_c = MtMessagingCredential()
+        mt_c.setQuota('balance', 2.0)
+        u1 = User(1, g1, 'username', 'password', mt_c)
+        yield self.user_add(u1)
+        yield self.persist()
+
+        # Mock perspective_persist for later assertions
+        self.pbRoot_f.perspective_persist = mock.Mock(wraps=self.pbRoot_f.perspective_persist)
+        self.pbRoot_f.config.persistence_timer_secs = 0.1
+        self.pbRoot_f.config.quota_journal_compaction_size = 2
+        self.pbRoot_f.activatePersistenceTimer()
+
+        self.pbRoot_f.updateUserQuota(self.pbRoot_f.users[0], 'balance', -0.5)
+        self.pbRoot_f.updateUserQuota(self.pbRoot_f.users[0], 'balance', -0.5)
+
+        yield waitFor(0.5)
+
+        # Users and groups are persisted, the journal is compacted
+        self.assertEqual(self.pbRoot_f.perspective_persist.call_args_list,
+                         [mock.call(scope='groups'), mock.call(scope='users')])
+        self.assertEqual(self.pbRoot_f.quota_journal.size, 0)
+        self.assertEqual(self.pbRoot_f.quota_journal.pending, [])
+
+        loadRet = yield self.load()
+        self.assertTrue(loadRet)
+        self.assertEqual(self.pbRoot_f.users[0].mt_credential.getQuota('balance'), 1.0)
+
     @defer.inlineCallbacks
     def test_increase_decrease_quota(self):
         yield self.connect('127.0.0.1', self.pbPort)
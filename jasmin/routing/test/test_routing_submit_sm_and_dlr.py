@@ -733,7 +733,7 @@ class HttpDlrCallbackingTestCases(RouterPBProxy, HappySMSCTestCase, SubmitSmTest
         yield self.prepareRoutingsAndStartConnector()
 
         # Make a new connection to redis
-        # It is used to wrap DLRLookup's redis client and slowdown calls to hmset
+        # It is used to wrap DLRLookup's redis client and slowdown calls to hmset_expire
         RCInstance = RedisForJasminConfig()
         r = yield ConnectionWithConfiguration(RCInstance)
         # Authenticate and select db
@@ -741,17 +741,17 @@ class HttpDlrCallbackingTestCases(RouterPBProxy, HappySMSCTestCase, SubmitSmTest
             yield r.auth(RCInstance.password)
             yield r.select(RCInstance.dbid)
 
-        # Mock hmset redis's call to slow it down
+        # Mock hmset_expire redis's call to slow it down
         @defer.inlineCallbacks
-        def mocked_hmset(k, v):
-            # Slow down hmset
+        def mocked_hmset_expire(k, v, seconds):
+            # Slow down hmset_expire
             # We need to receive the deliver_sm dlr before submit_sm_resp
             if k[:11] == 'queue-msgid':
                 yield waitFor(1)
 
-            yield r.hmset(k, v)
+            yield r.hmset_expire(k, v, seconds)
 
-        self.dlrlookup.redisClient.hmset = mock.MagicMock(wraps=mocked_hmset)
+        self.dlrlookup.redisClient.hmset_expire = mock.MagicMock(wraps=mocked_hmset_expire)
 
         # Ask for DLR
         self.params['dlr-url'] = self.dlr_url
@@ -1599,7 +1599,7 @@ class SmppsDlrCallbackingTestCases(SmppsDlrCallbacking):
         self.smpps_factory.lastProto.sendPDU = mock.Mock(wraps=self.smpps_factory.lastProto.sendPDU)
 
         # Make a new connection to redis
-        # It is used to wrap DLRLookup's redis client and slowdown calls to hmset
+        # It is used to wrap DLRLookup's redis client and slowdown calls to hmset_expire
         RCInstance = RedisForJasminConfig()
         r = yield ConnectionWithConfiguration(RCInstance)
         # Authenticate and select db
@@ -1607,16 +1607,16 @@ class SmppsDlrCallbackingTestCases(SmppsDlrCallbacking):
             yield r.auth(RCInstance.password)
             yield r.select(RCInstance.dbid)
 
-        # Mock hmset redis's call to slow it down
+        # Mock hmset_expire redis's call to slow it down
         @defer.inlineCallbacks
-        def mocked_hmset(k, v):
-            # Slow down hmset
+        def mocked_hmset_expire(k, v, seconds):
+            # Slow down hmset_expire
             # We need to receive the deliver_sm dlr before submit_sm_resp
             if k[:11] == 'queue-msgid':
                 yield waitFor(1)
 
-            yield r.hmset(k, v)
-        self.dlrlookup.redisClient.hmset = mock.MagicMock(wraps=mocked_hmset)
+            yield r.hmset_expire(k, v, seconds)
+        self.dlrlookup.redisClient.hmset_expire = mock.MagicMock(wraps=mocked_hmset_expire)
 
         # Ask for DLR
         SubmitSmPDU = copy.deepcopy(self.SubmitSmPDU)
@@ -0,0 +1,198 @@
+"""
+Test cases for throwers bounded parallelism
+"""
+
+import mock
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from jasmin.managers.content import DLRContentForHttpapi, DLRContentForSmpps
+from jasmin.routing.configs import DLRThrowerConfig, deliverSmThrowerConfig
+from jasmin.routing.content import RoutedDeliverSmContent
+from jasmin.routing.jasminApi import HttpConnector
+from jasmin.routing.throwers import (ThrowingScheduler, DLRThrower, deliverSmThrower, CircuitBreaker,
+                                     CircuitOpenError)
+from jasmin.vendor.smpp.pdu.operations import DeliverSM
+
+
+class ThrowingSchedulerTestCase(TestCase):
+    def setUp(self):
+        self.scheduler = ThrowingScheduler(max_concurrency=4, max_per_destination=2)
+        self.throws = []
+
+    def throw(self, name):
+        d = defer.Deferred()
+        self.throws.append((name, d))
+        return d
+
+    def test_max_per_destination(self):
+        for i in range(3):
+            self.scheduler.run('slow', self.throw, 'slow%s' % i)
+
+        self.assertEqual(['slow0', 'slow1'], [name for name, _ in self.throws])
+        self.assertFalse(self.scheduler.isFull())
+
+        # Third throw is started when a running one is done
+        self.throws[0][1].callback(None)
+        self.assertEqual('slow2', self.throws[2][0])
+        self.assertEqual(2, self.scheduler.held)
+
+    def test_max_concurrency(self):
+        for i in range(4):
+            self.scheduler.run('d%s' % i, self.throw, 'd%s' % i)
+
+        self.assertEqual(4, len(self.throws))
+        self.assertTrue(self.scheduler.isFull())
+
+    def test_fairness(self):
+        "A saturated destination does not delay throws to other destinations"
+        self.scheduler.run('slow', self.throw, 'slow0')
+        self.scheduler.run('slow', self.throw, 'slow1')
+        self.scheduler.run('slow', self.throw, 'slow2')
+        self.assertFalse(self.scheduler.isSaturated('slow'))
+        self.scheduler.run('fast', self.throw, 'fast0')
+
+        self.assertEqual(['slow0', 'slow1', 'fast0'], [name for name, _ in self.throws])
+
+        self.scheduler.run('slow', self.throw, 'slow3')
+        self.assertTrue(self.scheduler.isSaturated('slow'))
+        self.assertFalse(self.scheduler.isSaturated('fast'))
+
+    def test_result(self):
+        d = self.scheduler.run('d', lambda: 'ACK/Jasmin')
+        d.addCallback(self.assertEqual, 'ACK/Jasmin')
+
+        d = self.scheduler.run('d', lambda: 1 / 0)
+        self.assertFailure(d, ZeroDivisionError)
+
+        self.assertEqual(0, self.scheduler.held)
+        self.assertEqual({}, self.scheduler.running)
+
+    def test_clear(self):
+        for i in range(3):
+            self.scheduler.run('slow', self.throw, 'slow%s' % i)
+        self.scheduler.clear()
+
+        self.assertEqual(2, self.scheduler.held)
+        self.throws[0][1].callback(None)
+        self.throws[1][1].callback(None)
+        self.assertEqual(2, len(self.throws))
+        self.assertEqual(0, self.scheduler.held)
+
+
+class ConsumingTestCase(TestCase):
+    def setUp(self):
+        config = DLRThrowerConfig()
+        config.max_concurrency = 3
+        config.max_concurrency_per_destination = 1
+        self.thrower = DLRThrower(config)
+        self.thrower.thrower_q = defer.DeferredQueue()
+        self.thrower.amqpBroker = mock.Mock()
+        self.thrower.amqpBroker.reject.return_value = defer.succeed(None)
+
+        self.throws = []
+        self.thrower.callback = self.throw
+
+    def tearDown(self):
+        self.thrower.stopService()
+
+    def throw(self, message):
+        d = defer.Deferred()
+        self.throws.append((message.content.properties['message-id'], d))
+        return d
+
+    def putMessage(self, content, routing_key):
+        message = mock.Mock()
+        message.content = content
+        message.routing_key = routing_key
+        self.thrower.thrower_q.put(message)
+
+    def putHttpMessage(self, msgid, url):
+        self.putMessage(DLRContentForHttpapi('DELIVRD', msgid, url, 1), 'dlr_thrower.http')
+
+    def test_destination(self):
+        self.putHttpMessage('1', 'http://10.0.0.1:8080/dlr?a=1')
+        self.putMessage(DLRContentForSmpps('DELIVRD', '2', 'user1', '1', '2', '2017-01-01 10:00:00',
+                                           1, 1, 1, 1), 'dlr_thrower.smpps')
+
+        messages = [self.thrower.thrower_q.pending[i] for i in range(2)]
+        self.assertEqual('10.0.0.1:8080', self.thrower.getDestination(messages[0]))
+        self.assertEqual('user1', self.thrower.getDestination(messages[1]))
+
+    def test_consume(self):
+        self.thrower.consume()
+        self.putHttpMessage('1', 'http://slow/dlr')
+        self.putHttpMessage('2', 'http://slow/dlr')
+        self.putHttpMessage('3', 'http://fast/dlr')
+        self.putHttpMessage('4', 'http://fast/dlr')
+
+        # max_concurrency messages are held, 2 of them are being thrown
+        self.assertEqual(['1', '3'], [msgid for msgid, _ in self.throws])
+        self.assertEqual(1, len(self.thrower.thrower_q.pending))
+
+        # Consuming is resumed when a throw is done
+        self.throws[1][1].callback(None)
+        self.assertEqual(['1', '3', '4'], [msgid for msgid, _ in self.throws])
+        self.assertEqual(0, len(self.thrower.thrower_q.pending))
+
+    def test_saturated_destination(self):
+        self.thrower.consume()
+        self.putHttpMessage('1', 'http://slow/dlr')
+        self.putHttpMessage('2', 'http://slow/dlr')
+        self.putHttpMessage('3', 'http://slow/dlr')
+
+        # Third message is requeued after retry_delay, it is not held
+        self.assertEqual(['1'], [msgid for msgid, _ in self.throws])
+        self.assertEqual(2, self.thrower.throwing.held)
+        self.assertEqual(['3'], self.thrower.requeueTimers.keys())
+
+    def test_open_circuit(self):
+        self.thrower.getCircuitBreaker('http://down/dlr').setState(CircuitBreaker.OPEN)
+        self.thrower.consume()
+        self.putHttpMessage('1', 'http://down/dlr')
+        self.putHttpMessage('2', 'http://up/dlr')
+
+        # Message to the down destination is parked without being thrown
+        self.assertEqual(['2'], [msgid for msgid, _ in self.throws])
+        self.assertEqual(['1'], self.thrower.requeueTimers.keys())
+
+    def test_open_circuit_not_a_retrial(self):
+        "A throw refused by an open circuit breaker parks the message without counting a retrial"
+        self.thrower.stats.init()
+        self.putHttpMessage('1', 'http://down/dlr')
+        message = self.thrower.thrower_q.pending[0]
+        for i in range(self.thrower.config.max_retries + 1):
+            self.thrower.incThrowingRetrials(message)
+
+        self.thrower.http_dlr_errback(message, CircuitOpenError('Circuit breaker of http://down/dlr is open.'))
+
+        self.assertEqual(self.thrower.config.max_retries, self.thrower.getThrowingRetrials(message))
+        self.assertEqual(['1'], self.thrower.requeueTimers.keys())
+        self.assertEqual(1, self.thrower.stats.get('parked_count'))
+
+
+class FailoverParkingTestCase(TestCase):
+    def setUp(self):
+        self.thrower = deliverSmThrower(deliverSmThrowerConfig())
+
+    def tearDown(self):
+        self.thrower.stopService()
+
+    def getMessage(self, route_type):
+        message = mock.Mock()
+        message.routing_key = 'deliver_sm_thrower.http'
+        message.content = RoutedDeliverSmContent(
+            DeliverSM(source_addr='1234', destination_addr='4567', short_message='hello !'), '1', 'src',
+            [HttpConnector('main', 'http://10.0.0.1/mo'), HttpConnector('backup', 'http://10.0.0.2/mo')],
+            route_type)
+        return message
+
+    def test_backup_up(self):
+        "A failover route is thrown while one of its destinations is up"
+        self.thrower.getCircuitBreaker('http://10.0.0.1/mo').setState(CircuitBreaker.OPEN)
+        self.assertFalse(self.thrower.isParked(self.getMessage('failover')))
+
+    def test_all_down(self):
+        self.thrower.getCircuitBreaker('http://10.0.0.1/mo').setState(CircuitBreaker.OPEN)
+        self.thrower.getCircuitBreaker('http://10.0.0.2/mo').setState(CircuitBreaker.OPEN)
+        self.assertTrue(self.thrower.isParked(self.getMessage('failover')))
@@ -0,0 +1,347 @@
+"""
+Test cases for throwers http connection pool
+"""
+
+import json
+
+import mock
+from twisted.internet import defer, reactor
+from twisted.trial.unittest import TestCase
+from twisted.web import error, server
+from twisted.web.resource import Resource
+
+from jasmin.managers.content import DLRContentForHttpapi
+from jasmin.routing.configs import DLRThrowerConfig
+from jasmin.routing.test.http_server import AckServer, NoAckServer, Error404Server
+from jasmin.routing.throwers import DLRThrower, SessionReusingCreator, CircuitBreaker, CircuitOpenError
+
+
+class HangingServer(Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        return server.NOT_DONE_YET
+
+
+class RedirectServer(Resource):
+    isLeaf = True
+
+    def __init__(self, location, code):
+        Resource.__init__(self)
+        self.location = location
+        self.code = code
+
+    def render(self, request):
+        request.setResponseCode(self.code)
+        request.setHeader('location', self.location)
+        return ''
+
+
+class CountingSite(server.Site):
+    "Counts accepted connections"
+    connections = 0
+
+    def buildProtocol(self, addr):
+        self.connections += 1
+        return server.Site.buildProtocol(self, addr)
+
+
+class HttpRequestTestCase(TestCase):
+    def setUp(self):
+        config = DLRThrowerConfig()
+        config.timeout = 1
+        self.thrower = DLRThrower(config)
+
+        self.AckServerResource = AckServer()
+        self.AckServerSite = CountingSite(self.AckServerResource)
+        self.AckServer = reactor.listenTCP(0, self.AckServerSite)
+        self.Error404Server = reactor.listenTCP(0, server.Site(Error404Server()))
+        self.HangingServer = reactor.listenTCP(0, server.Site(HangingServer()))
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.thrower.stopService()
+        yield self.AckServer.stopListening()
+        yield self.Error404Server.stopListening()
+        yield self.HangingServer.stopListening()
+
+    def getUrl(self, port):
+        return 'http://127.0.0.1:%s/dlr' % port.getHost().port
+
+    @defer.inlineCallbacks
+    def test_post(self):
+        content = yield self.thrower.httpRequest(self.getUrl(self.AckServer), 'POST', 'id=1&level=1', 'Jasmin')
+
+        self.assertEqual('ACK/Jasmin', content)
+        self.assertEqual({'id': ['1'], 'level': ['1']}, self.AckServerResource.last_request.args)
+        self.assertEqual('Jasmin', self.AckServerResource.last_request.getHeader('user-agent'))
+
+    @defer.inlineCallbacks
+    def test_redirect_301(self):
+        "e.g. http to https redirections"
+        redirectServer = reactor.listenTCP(0, server.Site(RedirectServer(self.getUrl(self.AckServer), 301)))
+        self.addCleanup(redirectServer.stopListening)
+
+        content = yield self.thrower.httpRequest(self.getUrl(redirectServer) + '?id=1')
+
+        self.assertEqual('ACK/Jasmin', content)
+        self.assertEqual('GET', self.AckServerResource.last_request.method)
+
+    @defer.inlineCallbacks
+    def test_redirect_302_post(self):
+        "Redirected POST requests are sent with their body, like getPage did"
+        redirectServer = reactor.listenTCP(0, server.Site(RedirectServer(self.getUrl(self.AckServer), 302)))
+        self.addCleanup(redirectServer.stopListening)
+
+        content = yield self.thrower.httpRequest(self.getUrl(redirectServer), 'POST', 'id=1&level=1')
+
+        self.assertEqual('ACK/Jasmin', content)
+        self.assertEqual('POST', self.AckServerResource.last_request.method)
+        self.assertEqual({'id': ['1'], 'level': ['1']}, self.AckServerResource.last_request.args)
+
+    @defer.inlineCallbacks
+    def test_redirect_loop(self):
+        redirectServer = reactor.listenTCP(0, server.Site(RedirectServer('/dlr', 302)))
+        self.addCleanup(redirectServer.stopListening)
+
+        try:
+            yield self.thrower.httpRequest(self.getUrl(redirectServer))
+        except error.Error as e:
+            self.assertEqual('302 Found', str(e))
+        else:
+            self.fail('302 error not raised')
+
+    @defer.inlineCallbacks
+    def test_keep_alive(self):
+        for i in range(3):
+            content = yield self.thrower.httpRequest(self.getUrl(self.AckServer) + '?id=%s' % i)
+            self.assertEqual('ACK/Jasmin', content)
+
+        self.assertEqual(1, self.AckServerSite.connections)
+
+    @defer.inlineCallbacks
+    def test_error_404(self):
+        try:
+            yield self.thrower.httpRequest(self.getUrl(self.Error404Server))
+        except error.Error as e:
+            # Throwers do not retry 404 errors
+            self.assertEqual('404 Not Found', str(e))
+        else:
+            self.fail('404 error not raised')
+
+    @defer.inlineCallbacks
+    def test_timeout(self):
+        try:
+            yield self.thrower.httpRequest(self.getUrl(self.HangingServer))
+        except defer.TimeoutError:
+            pass
+        else:
+            self.fail('TimeoutError not raised')
+
+
+class CircuitBreakerTestCase(TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker('http://host/dlr', window=4, min_calls=2, failure_rate=0.5,
+                                      slow_call=1, open_time=30, log=mock.Mock())
+
+    @mock.patch('jasmin.routing.throwers.time')
+    def test_open(self, _time):
+        _time.time.return_value = 100
+        self.breaker.record(False, 0.1)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+
+        # Slow responses are failures
+        self.breaker.record(False, 2)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertTrue(self.breaker.isOpen())
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(1, self.breaker.getStats()['opened_count'])
+
+    @mock.patch('jasmin.routing.throwers.time')
+    def test_probe(self, _time):
+        _time.time.return_value = 100
+        self.breaker.record(True, 0.1)
+        self.breaker.record(True, 0.1)
+
+        # A single probe is made after open_time
+        _time.time.return_value = 130
+        self.assertFalse(self.breaker.isOpen())
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(CircuitBreaker.HALF_OPEN, self.breaker.state)
+        self.assertTrue(self.breaker.isOpen())
+        self.assertFalse(self.breaker.allow())
+
+        # Failed probe opens the circuit again
+        self.breaker.record(True, 0.1)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertEqual(130, self.breaker.opened_at)
+
+        _time.time.return_value = 160
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False, 0.1)
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        self.assertEqual(0, self.breaker.getFailureRate())
+
+
+class HttpCircuitBreakerTestCase(TestCase):
+    def setUp(self):
+        config = DLRThrowerConfig()
+        config.timeout = 1
+        config.http_breaker_min_calls = 3
+        self.thrower = DLRThrower(config)
+        self.thrower.stats.init()
+
+        self.AckServerSite = CountingSite(AckServer())
+        self.AckServer = reactor.listenTCP(0, self.AckServerSite)
+        self.Error404Server = reactor.listenTCP(0, server.Site(Error404Server()))
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.thrower.stopService()
+        yield self.AckServer.stopListening()
+        yield self.Error404Server.stopListening()
+
+    def getUrl(self, port):
+        return 'http://127.0.0.1:%s/dlr' % port.getHost().port
+
+    def render_unavailable(self, request):
+        request.setResponseCode(503)
+        return 'Down'
+
+    @defer.inlineCallbacks
+    def test_open(self):
+        url = self.getUrl(self.AckServer)
+        yield self.thrower.httpRequest(url + '?id=1')
+        self.AckServerSite.resource.render_GET = mock.Mock(side_effect=self.render_unavailable)
+        for i in range(2):
+            yield self.assertFailure(self.thrower.httpRequest(url + '?id=2'), error.Error)
+
+        # Destination is not called anymore
+        yield self.assertFailure(self.thrower.httpRequest(url + '?id=3'), CircuitOpenError)
+        self.assertEqual(2, self.AckServerSite.resource.render_GET.call_count)
+        self.assertEqual('open', self.thrower.stats.get('circuit_breakers')[url]['state'])
+
+    @defer.inlineCallbacks
+    def test_error_404(self):
+        "Destination is up when it replies with a 4xx error"
+        url = self.getUrl(self.Error404Server)
+        for i in range(3):
+            yield self.assertFailure(self.thrower.httpRequest(url), error.Error)
+
+        self.assertEqual('closed', self.thrower.stats.get('circuit_breakers')[url]['state'])
+
+
+class BatchTestCase(TestCase):
+    def setUp(self):
+        self.bodies = []
+        self.AckServerResource = AckServer()
+        self.AckServerResource.render_POST = mock.Mock(side_effect=self.render_POST)
+        self.AckServer = reactor.listenTCP(0, server.Site(self.AckServerResource))
+        self.NoAckServerResource = NoAckServer()
+        self.NoAckServer = reactor.listenTCP(0, server.Site(self.NoAckServerResource))
+
+        config = DLRThrowerConfig()
+        config.http_batch_urls = ['http://127.0.0.1:%s/' % self.AckServer.getHost().port,
+                                  'http://127.0.0.1:%s/' % self.NoAckServer.getHost().port]
+        config.http_batch_window = 0.2
+        config.http_batch_max_size = 3
+        self.thrower = DLRThrower(config)
+        self.thrower.amqpBroker = mock.Mock()
+        self.thrower.amqpBroker.ack.return_value = defer.succeed(None)
+        self.thrower.amqpBroker.reject.return_value = defer.succeed(None)
+
+    @defer.inlineCallbacks
+    def tearDown(self):
+        yield self.thrower.stopService()
+        yield self.AckServer.stopListening()
+        yield self.NoAckServer.stopListening()
+
+    def render_POST(self, request):
+        self.bodies.append((request.getHeader('content-type'), request.content.read()))
+        return 'ACK/Jasmin'
+
+    def getMessage(self, msgid, dlr_url, dlr_level=1):
+        message = mock.Mock()
+        message.content = DLRContentForHttpapi('DELIVRD', msgid, dlr_url, dlr_level)
+        message.delivery_tag = msgid
+        message.routing_key = 'dlr_thrower.http'
+        return message
+
+    def waitForBatch(self):
+        d = defer.Deferred()
+        reactor.callLater(0.5, d.callback, None)
+        return d
+
+    @defer.inlineCallbacks
+    def test_batch_window(self):
+        dlr_url = 'http://127.0.0.1:%s/dlr' % self.AckServer.getHost().port
+        yield self.thrower.dlr_throwing_callback(self.getMessage('1', dlr_url))
+        yield self.thrower.dlr_throwing_callback(self.getMessage('2', dlr_url, 2))
+        self.assertEqual(0, self.AckServerResource.render_POST.call_count)
+
+        yield self.waitForBatch()
+
+        self.assertEqual(1, self.AckServerResource.render_POST.call_count)
+        self.assertEqual('application/json', self.bodies[0][0])
+        dlrs = json.loads(self.bodies[0][1])
+        self.assertEqual(['1', '2'], [dlr['id'] for dlr in dlrs])
+        self.assertEqual('DELIVRD', dlrs[1]['message_status'])
+        self.assertTrue('donedate' in dlrs[1])
+        self.assertEqual(['1', '2'], [c[0][0] for c in self.thrower.amqpBroker.ack.call_args_list])
+
+    @defer.inlineCallbacks
+    def test_batch_max_size(self):
+        dlr_url = 'http://127.0.0.1:%s/dlr' % self.AckServer.getHost().port
+        for msgid in range(4):
+            yield self.thrower.dlr_throwing_callback(self.getMessage(str(msgid), dlr_url))
+
+        yield self.waitForBatch()
+
+        self.assertEqual(2, self.AckServerResource.render_POST.call_count)
+        self.assertEqual(4, self.thrower.amqpBroker.ack.call_count)
+
+    @defer.inlineCallbacks
+    def test_batch_held(self):
+        "Batched DLRs are held until their batch is settled, batches are POSTed through the ThrowingScheduler"
+        self.thrower.throwing.run = mock.Mock(wraps=self.thrower.throwing.run)
+        dlr_url = 'http://127.0.0.1:%s/dlr' % self.AckServer.getHost().port
+        yield self.thrower.dlr_throwing_callback(self.getMessage('1', dlr_url))
+        yield self.thrower.dlr_throwing_callback(self.getMessage('2', dlr_url))
+        self.assertEqual(2, self.thrower.throwing.held)
+
+        yield self.waitForBatch()
+
+        self.assertEqual(1, self.thrower.throwing.run.call_count)
+        self.assertEqual('127.0.0.1:%s' % self.AckServer.getHost().port,
+                         self.thrower.throwing.run.call_args[0][0])
+        self.assertEqual(0, self.thrower.throwing.held)
+
+    @defer.inlineCallbacks
+    def test_batch_not_acknowledged(self):
+        dlr_url = 'http://127.0.0.1:%s/dlr' % self.NoAckServer.getHost().port
+        yield self.thrower.dlr_throwing_callback(self.getMessage('1', dlr_url))
+        yield self.thrower.dlr_throwing_callback(self.getMessage('2', dlr_url))
+
+        yield self.waitForBatch()
+
+        # Every DLR is requeued for a later retry
+        self.assertEqual(0, self.thrower.amqpBroker.ack.call_count)
+        self.assertEqual(['1', '2'], sorted(self.thrower.requeueTimers.keys()))
+
+
+class SessionReusingCreatorTestCase(TestCase):
+    def test_session_reuse(self):
+        connections = [mock.Mock(), mock.Mock(), mock.Mock()]
+        connections[0].get_session.return_value = None
+        connections[1].get_session.return_value = 'session'
+        creator = mock.Mock()
+        creator.clientConnectionForTLS.side_effect = connections
+        reusing = SessionReusingCreator(creator)
+
+        # Nothing to resume until a handshake is done
+        self.assertEqual(connections[0], reusing.clientConnectionForTLS(None))
+        self.assertEqual(connections[1], reusing.clientConnectionForTLS(None))
+        self.assertFalse(connections[1].set_session.called)
+
+        self.assertEqual(connections[2], reusing.clientConnectionForTLS(None))
+        connections[2].set_session.assert_called_once_with('session')
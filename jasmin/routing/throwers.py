@@ -1,20 +1,34 @@
 import binascii
-import cPickle as pickle
+import json
 import logging
+import StringIO
+import time
 import urllib
+import urlparse
+from collections import deque
 from logging.handlers import TimedRotatingFileHandler
 
 from twisted.application.service import Service
 from twisted.internet import defer
 from twisted.internet import reactor
-from twisted.web.client import getPage
+from twisted.internet.interfaces import IOpenSSLClientConnectionCreator
+from twisted.python.failure import Failure
+from twisted.web import error
+from twisted.web.client import Agent, BrowserLikePolicyForHTTPS, FileBodyProducer, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
 from txamqp.queue import Closed
+from zope.interface import implementer
 
 from jasmin.protocols.smpp.factory import SMPPServerFactory
 from jasmin.protocols.smpp.operations import SMPPOperationFactory
 from jasmin.protocols.smpp.proxies import SMPPServerPBProxy
+from jasmin.queues import wire
+from jasmin.routing.stats import ThrowerStatsCollector
 from jasmin.vendor.smpp.pdu.constants import data_coding_default_name_map, priority_flag_name_map
 
+# Same limit as getPage, which throwers used before Thrower.httpRequest
+HTTP_REDIRECT_LIMIT = 20
+
 
 class MessageAcknowledgementError(Exception):
     """Raised when destination end does not return 'ACK/Jasmin' back to
@@ -41,6 +55,236 @@ class DeliveringFailed(Exception):
     """Raised when delivering a pdu errored"""
 
 
+class CircuitOpenError(Exception):
+    """Raised when throwing to a http destination whose circuit breaker is open"""
+
+
+@implementer(IOpenSSLClientConnectionCreator)
+class SessionReusingCreator(object):
+    """Wraps the TLS connection creator of a host: new connections resume the TLS session of
+    the previous one, saving a full handshake"""
+
+    def __init__(self, creator):
+        self.creator = creator
+        self.session = None
+        self.connection = None
+
+    def clientConnectionForTLS(self, tlsProtocol):
+        if self.connection is not None and self.connection.get_session() is not None:
+            self.session = self.connection.get_session()
+
+        self.connection = self.creator.clientConnectionForTLS(tlsProtocol)
+        if self.session is not None:
+            self.connection.set_session(self.session)
+        return self.connection
+
+
+class ThrowerPolicyForHTTPS(BrowserLikePolicyForHTTPS):
+    """Verifies certificates like browsers do, TLS sessions are reused across the connections
+    to the same host when tls_session_reuse is True"""
+
+    def __init__(self, tls_session_reuse=True):
+        BrowserLikePolicyForHTTPS.__init__(self)
+
+        self.tls_session_reuse = tls_session_reuse
+        self.creators = {}
+
+    def creatorForNetloc(self, hostname, port):
+        if not self.tls_session_reuse:
+            return BrowserLikePolicyForHTTPS.creatorForNetloc(self, hostname, port)
+
+        if (hostname, port) not in self.creators:
+            self.creators[(hostname, port)] = SessionReusingCreator(
+                BrowserLikePolicyForHTTPS.creatorForNetloc(self, hostname, port))
+        return self.creators[(hostname, port)]
+
+
+class ThrowingScheduler(object):
+    """Runs throws with bounded parallelism: no more than max_concurrency throws are held
+    (running or waiting) and no more than max_per_destination throws are running against the
+    same destination.
+
+    Waiting throws are started destination by destination (round robin), a slow destination
+    will only hold its own throws and cannot starve the other ones.
+    """
+
+    def __init__(self, max_concurrency, max_per_destination):
+        self.max_concurrency = max_concurrency
+        self.max_per_destination = max_per_destination
+        self.held = 0
+        self.running = {}
+        self.waiting = {}
+        self.destinations = deque()
+
+    def isFull(self):
+        return self.held >= self.max_concurrency
+
+    def isSaturated(self, destination):
+        "Returns True if destination has already max_per_destination throws waiting"
+        return len(self.waiting.get(destination, [])) >= self.max_per_destination
+
+    def hold(self, count=1):
+        "Count throws made later on (e.g. batched ones) as held until they are unhold()"
+        self.held += count
+
+    def unhold(self, count=1):
+        self.held -= count
+
+    def run(self, destination, f, *args):
+        """Call f(*args) once destination allows it, returns a deferred fired with f's result
+        """
+        d = defer.Deferred()
+        if destination not in self.waiting:
+            self.waiting[destination] = deque()
+            self.destinations.append(destination)
+        self.waiting[destination].append((d, f, args))
+        self.held += 1
+
+        self.startWaiting()
+        return d
+
+    def startWaiting(self):
+        started = True
+        while started:
+            started = False
+            for _ in range(len(self.destinations)):
+                if len(self.destinations) == 0:
+                    break
+                destination = self.destinations[0]
+                self.destinations.rotate(-1)
+
+                if self.running.get(destination, 0) < self.max_per_destination:
+                    self.start(destination)
+                    started = True
+
+    def start(self, destination):
+        d, f, args = self.waiting[destination].popleft()
+        if len(self.waiting[destination]) == 0:
+            del self.waiting[destination]
+            self.destinations.remove(destination)
+        self.running[destination] = self.running.get(destination, 0) + 1
+
+        defer.maybeDeferred(f, *args).addBoth(self.release, destination).chainDeferred(d)
+
+    def release(self, result, destination):
+        self.running[destination] -= 1
+        if self.running[destination] == 0:
+            del self.running[destination]
+        self.held -= 1
+
+        self.startWaiting()
+        return result
+
+    def clear(self):
+        "Drop waiting throws, running ones are left to complete"
+        for destination in self.destinations:
+            self.held -= len(self.waiting[destination])
+        self.waiting = {}
+        self.destinations.clear()
+
+
+def getBaseurl(url):
+    "Returns the baseurl (url without its query string) circuit breakers are kept for"
+    return url.split('?', 1)[0]
+
+
+class CircuitBreaker(object):
+    """Circuit breaker of a http destination (baseurl)
+
+    - closed: throws are made and the outcome of the last window ones is kept, the circuit opens
+      when at least min_calls were made and failure_rate of them failed (errors, timeouts, 5xx
+      responses or responses slower than slow_call seconds),
+    - open: throws are not attempted for open_time seconds,
+    - half-open: a single probe throw is made, the circuit closes on its success and opens
+      again on its failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    # Weight of the last throw in the latency average
+    latency_weight = 0.2
+
+    def __init__(self, baseurl, window, min_calls, failure_rate, slow_call, open_time, log):
+        self.baseurl = baseurl
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.open_time = open_time
+        self.log = log
+
+        self.state = self.CLOSED
+        # Outcome (True for a failure) of the last window throws
+        self.calls = deque(maxlen=window)
+        self.latency = 0
+        self.opened_at = None
+        self.opened_count = 0
+        self.probing = False
+
+    def getFailureRate(self):
+        if len(self.calls) == 0:
+            return 0
+        return float(self.calls.count(True)) / len(self.calls)
+
+    def isOpen(self):
+        "Returns True if throws are not attempted, messages are to be parked"
+        if self.state == self.OPEN:
+            return time.time() - self.opened_at < self.open_time
+        elif self.state == self.HALF_OPEN:
+            return self.probing
+        return False
+
+    def allow(self):
+        "Returns True if a throw can be made now, it is the probe when circuit is half-open"
+        if self.state == self.OPEN and not self.isOpen():
+            self.setState(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self.probing:
+                return False
+            self.probing = True
+        return self.state != self.OPEN
+
+    def record(self, failed, latency):
+        "Record the outcome of a throw, latency is its duration in seconds"
+        self.latency += (latency - self.latency) * self.latency_weight
+        if self.slow_call > 0 and latency > self.slow_call:
+            failed = True
+
+        if self.state == self.HALF_OPEN:
+            self.probing = False
+            if failed:
+                self.setState(self.OPEN)
+            else:
+                self.setState(self.CLOSED)
+        elif self.state == self.CLOSED:
+            self.calls.append(failed)
+            if len(self.calls) >= self.min_calls and self.getFailureRate() >= self.failure_rate:
+                self.setState(self.OPEN)
+
+    def setState(self, state):
+        if state == self.OPEN:
+            self.log.warn('Circuit breaker of %s is open: failure rate %.2f, latency %.3fs, probing in %s seconds.',
+                          self.baseurl, self.getFailureRate(), self.latency, self.open_time)
+            self.opened_at = time.time()
+            self.opened_count += 1
+        elif state == self.CLOSED:
+            self.log.info('Circuit breaker of %s is closed: destination recovered.', self.baseurl)
+            self.calls.clear()
+        else:
+            self.log.info('Circuit breaker of %s is half-open: probing destination.', self.baseurl)
+
+        self.state = state
+
+    def getStats(self):
+        return {'state': self.state,
+                'failure_rate': self.getFailureRate(),
+                'latency': self.latency,
+                'opened_count': self.opened_count,
+                'opened_at': self.opened_at}
+
+
 class Thrower(Service):
     name = 'abstract thrower'
     log_category = 'abstract-thrower'
@@ -66,6 +310,25 @@ class Thrower(Service):
         self.smpps = None
         self.smpps_access = None
 
+        # Consumed messages are thrown through a ThrowingScheduler
+        self.throwing = ThrowingScheduler(self.config.max_concurrency,
+                                          self.config.max_concurrency_per_destination)
+        self.thrower_q = None
+        self.consuming = False
+
+        # Circuit breakers of http destinations, by baseurl
+        self.breakers = {}
+        self.stats = ThrowerStatsCollector().get(self.name)
+
+        # Http throws are made through keep-alive connections
+        self.pool = HTTPConnectionPool(reactor)
+        self.pool.maxPersistentPerHost = self.config.http_persistent_connections_per_host
+        self.pool.cachedConnectionTimeout = self.config.http_idle_timeout
+        self.agent = Agent(reactor,
+                           contextFactory=ThrowerPolicyForHTTPS(self.config.http_tls_session_reuse),
+                           connectTimeout=self.config.timeout,
+                           pool=self.pool)
+
         # Set up a dedicated logger
         self.log = logging.getLogger(self.log_category)
         if len(self.log.handlers) != 1:
@@ -105,12 +368,161 @@ class Thrower(Service):
         else:
             self.throwing_retrials[message.content.properties['message-id']] = 1
 
+    def decThrowingRetrials(self, message):
+        if self.getThrowingRetrials(message) > 0:
+            self.throwing_retrials[message.content.properties['message-id']] -= 1
+
+    def getCircuitBreaker(self, url):
+        "Returns the circuit breaker of url's baseurl, None if circuit breakers are disabled"
+        if not self.config.http_breaker:
+            return None
+
+        baseurl = getBaseurl(url)
+        if baseurl not in self.breakers:
+            self.breakers[baseurl] = CircuitBreaker(
+                baseurl,
+                self.config.http_breaker_window,
+                self.config.http_breaker_min_calls,
+                self.config.http_breaker_failure_rate,
+                self.config.http_breaker_slow_call,
+                self.config.http_breaker_open_time,
+                self.log)
+        return self.breakers[baseurl]
+
+    def recordHttpRequest(self, result, breaker, started_at):
+        "Record a http request outcome in its circuit breaker, a 4xx response is not a failure"
+        failed = isinstance(result, Failure) and not (
+            result.check(error.Error) is not None and 400 <= int(result.value.status) < 500)
+        breaker.record(failed, time.time() - started_at)
+        self.stats.get('circuit_breakers')[breaker.baseurl] = breaker.getStats()
+
+        return result
+
+    def httpRequest(self, url, method='GET', postdata=None, agent='Jasmin gateway/1.0',
+                    contentType='application/x-www-form-urlencoded'):
+        """Request url through the thrower's connection pool, returns a deferred fired with the
+        response body, a twisted.web.error.Error is raised for non 2xx responses and a
+        CircuitOpenError if url's circuit breaker is open"""
+        breaker = self.getCircuitBreaker(url)
+        if breaker is not None and not breaker.allow():
+            return defer.fail(CircuitOpenError('Circuit breaker of %s is open.' % breaker.baseurl))
+
+        headers = Headers({'User-Agent': [agent],
+                           'Content-Type': [contentType],
+                           'Accept': ['text/plain']})
+
+        started_at = time.time()
+        d = self.followHttpRequest(method, url, headers, postdata)
+
+        # Whole request (including reading the body) must not take more than timeout seconds
+        timer = reactor.callLater(self.config.timeout, d.cancel)
+
+        def cancelTimer(result):
+            if timer.active():
+                timer.cancel()
+            elif isinstance(result, Failure):
+                # Request was cancelled by the timer
+                raise defer.TimeoutError('Getting %s took longer than %s seconds.' % (url, self.config.timeout))
+            return result
+        d.addBoth(cancelTimer)
+
+        if breaker is not None:
+            d.addBoth(self.recordHttpRequest, breaker, started_at)
+
+        return d
+
+    def followHttpRequest(self, method, url, headers, postdata, redirects=0):
+        """Request url and follow its redirections like getPage did: the same method and body
+        are sent to the new location (but 303 which is followed with a GET), up to
+        HTTP_REDIRECT_LIMIT redirections"""
+        body = None
+        if postdata is not None:
+            body = FileBodyProducer(StringIO.StringIO(postdata))
+
+        d = self.agent.request(method, url, headers, body)
+        d.addCallback(self.readHttpResponse, method, url, headers, postdata, redirects)
+        return d
+
+    def readHttpResponse(self, response, method, url, headers, postdata, redirects):
+        d = readBody(response)
+
+        location = response.headers.getRawHeaders('location', [None])[0]
+        if (response.code in [301, 302, 303, 307, 308] and location is not None and
+                redirects < HTTP_REDIRECT_LIMIT):
+            if response.code == 303:
+                method, postdata = 'GET', None
+            location = urlparse.urljoin(url, location)
+            d.addCallback(lambda _: self.followHttpRequest(method, location, headers, postdata,
+                                                           redirects + 1))
+        elif response.code < 200 or response.code >= 300:
+            def raiseError(content):
+                raise error.Error(response.code, response.phrase, content)
+            d.addCallback(raiseError)
+
+        return d
+
+    def getDestination(self, message):
+        """Returns the destination (host or system_id) message will be thrown to, throws to
+        the same destination are limited to max_concurrency_per_destination"""
+        return None
+
+    def getHttpUrls(self, message):
+        """Returns the urls message may be thrown to through http, an empty list if it is not
+        thrown through http"""
+        return []
+
+    def isParked(self, message):
+        """Returns True if message is to be thrown through http and the circuits of all its
+        destinations are open, a failover route is thrown as long as one destination is up"""
+        urls = self.getHttpUrls(message)
+        if len(urls) == 0:
+            return False
+
+        for url in urls:
+            breaker = self.getCircuitBreaker(url)
+            if breaker is None or not breaker.isOpen():
+                return False
+        return True
+
+    def parkMessage(self, message):
+        "Requeue message after retry_delay until its destination's circuit breaker closes"
+        self.stats.inc('parked_count')
+        return self.rejectAndRequeueMessage(message)
+
+    def consume(self):
+        "Get the next message from thrower_q unless max_concurrency messages are already held"
+        if self.thrower_q is None or self.consuming or self.throwing.isFull():
+            return
+
+        self.consuming = True
+        self.thrower_q.get().addCallback(self.consumed).addErrback(self.errback)
+
+    def consumed(self, message):
+        self.consuming = False
+
+        destination = self.getDestination(message)
+        if self.isParked(message):
+            # Destination is down, the message is not thrown until its circuit breaker closes
+            self.log.debug('Circuit breaker of %s is open, parking Content[%s]',
+                           ', '.join([getBaseurl(url) for url in self.getHttpUrls(message)]),
+                           message.content.properties['message-id'])
+            self.parkMessage(message)
+        elif self.throwing.isSaturated(destination):
+            # Destination is not keeping up, let the message wait in the queuing system
+            self.log.debug('Destination %s is saturated, requeuing Content[%s]',
+                           destination, message.content.properties['message-id'])
+            self.rejectAndRequeueMessage(message)
+        else:
+            d = self.throwing.run(destination, self.callback, message)
+            d.addErrback(self.errback)
+            d.addCallback(lambda _: self.consume())
+
+        self.consume()
+
     def throwing_callback(self, message):
         # Init retrial mechanism
         self.incThrowingRetrials(message)
 
-        self.thrower_q.get().addCallback(self.callback).addErrback(self.errback)
-
     def throwing_errback(self, error):
         """It appears that when closing a queue with the close() method it errbacks with
         a txamqp.queue.Closed exception, didnt find a clean way to stop consuming a queue
@@ -146,6 +558,9 @@ class Thrower(Service):
         Service.stopService(self)
 
         self.clearAllTimers()
+        self.throwing.clear()
+
+        return self.pool.closeCachedConnections()
 
     @defer.inlineCallbacks
     def addAmqpBroker(self, amqpBroker):
@@ -168,7 +583,7 @@ class Thrower(Service):
                                                  no_ack=False,
                                                  consumer_tag=self.consumerTag)
         self.thrower_q = yield self.amqpBroker.client.queue(self.consumerTag)
-        self.thrower_q.get().addCallback(self.callback).addErrback(self.errback)
+        self.consume()
         self.log.info('Consuming from routing key: %s', self.routingKey)
 
     @defer.inlineCallbacks
@@ -200,14 +615,14 @@ class Thrower(Service):
             # Remove retrial tracker
             self.delThrowingRetrials(message)
 
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=requeue)
+        yield self.amqpBroker.reject(message.delivery_tag, requeue=requeue)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
         # Remove retrial tracker
         self.delThrowingRetrials(message)
 
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.ack(message.delivery_tag)
 
 
 class deliverSmThrower(Thrower):
@@ -223,12 +638,35 @@ class deliverSmThrower(Thrower):
 
         Thrower.__init__(self, config)
 
+    def getDestination(self, message):
+        try:
+            dcs = wire.loads(message.content, message.content.properties['headers']['dst-connectors'],
+                             wire.loadConnectors)
+            if message.routing_key == 'deliver_sm_thrower.http':
+                return urlparse.urlparse(dcs[0].baseurl).netloc
+            elif message.routing_key == 'deliver_sm_thrower.smpps':
+                return dcs[0].cid
+        except Exception:
+            # Message will be rejected by deliver_sm_throwing_callback
+            return None
+
+    def getHttpUrls(self, message):
+        if message.routing_key != 'deliver_sm_thrower.http':
+            return []
+        try:
+            dcs = wire.loads(message.content, message.content.properties['headers']['dst-connectors'],
+                             wire.loadConnectors)
+            return [dc.baseurl for dc in dcs]
+        except Exception:
+            return []
+
     @defer.inlineCallbacks
     def http_deliver_sm_callback(self, message):
         msgid = message.content.properties['message-id']
         route_type = message.content.properties['headers']['route-type']
-        dcs = pickle.loads(message.content.properties['headers']['dst-connectors'])
-        RoutedDeliverSmContent = pickle.loads(message.content.body)
+        dcs = wire.loads(message.content, message.content.properties['headers']['dst-connectors'],
+                         wire.loadConnectors)
+        RoutedDeliverSmContent = wire.loads(message.content, message.content.body, wire.loadPDU)
         self.log.debug('Got one message (msgid:%s) to throw: %s', msgid, RoutedDeliverSmContent)
 
         # If any, clear requeuing timer
@@ -277,6 +715,7 @@ class deliverSmThrower(Thrower):
             args['validity'] = RoutedDeliverSmContent.params['validity_period']
 
         counter = 0
+        circuit_open_count = 0
         for dc in dcs:
             counter += 1
             self.log.debug('DCS Iteration %s/%s taking [cid:%s] (%s)', counter, len(dcs), dc.cid, dc)
@@ -296,14 +735,11 @@ class deliverSmThrower(Thrower):
                     postdata = encodedArgs
 
                 self.log.debug('Calling %s with args %s using %s method.', dc.baseurl, args, _method)
-                content = yield getPage(
+                content = yield self.httpRequest(
                     baseurl,
                     method=_method,
                     postdata=postdata,
-                    timeout=self.config.timeout,
-                    agent='Jasmin gateway/1.0 deliverSmHttpThrower',
-                    headers={'Content-Type': 'application/x-www-form-urlencoded',
-                             'Accept': 'text/plain'})
+                    agent='Jasmin gateway/1.0 deliverSmHttpThrower')
                 self.log.info('Throwed message [msgid:%s] to connector (%s %s/%s)[cid:%s] using http to %s.',
                               msgid, route_type, counter, len(dcs), dc.cid, dc.baseurl)
 
@@ -321,7 +757,14 @@ class deliverSmThrower(Thrower):
                 # List of errors after which, no further retrying shall be made
                 noRetryErrors = ['404 Not Found']
 
-                if route_type == 'simple':
+                if isinstance(e, CircuitOpenError):
+                    circuit_open_count += 1
+
+                if route_type == 'simple' and isinstance(e, CircuitOpenError):
+                    # Destination is down, this attempt does not count as a retrial
+                    self.decThrowingRetrials(message)
+                    yield self.parkMessage(message)
+                elif route_type == 'simple':
                     # Requeue message for later retry
                     if (str(e) not in noRetryErrors
                         and self.getThrowingRetrials(message) <= self.config.max_retries):
@@ -338,7 +781,11 @@ class deliverSmThrower(Thrower):
                         yield self.rejectMessage(message)
                 elif route_type == 'failover':
                     # The route has multiple connectors, we will not retry throwing to same connector
-                    if last_dc:
+                    if last_dc and circuit_open_count == len(dcs):
+                        # All destinations are down, retry once one of them recovers
+                        self.decThrowingRetrials(message)
+                        yield self.parkMessage(message)
+                    elif last_dc:
                         self.log.warn(
                             'Message [msgid:%s] is no more processed after receiving "%s" error on this fo/connector',
                             msgid, str(e))
@@ -363,10 +810,10 @@ class deliverSmThrower(Thrower):
     def smpp_deliver_sm_callback(self, message):
         msgid = message.content.properties['message-id']
         route_type = message.content.properties['headers']['route-type']
-        dcs = pickle.loads(message.content.properties['headers']['dst-connectors'])
-        pdu = pickle.loads(message.content.body)
-        RoutedDeliverSmContent = pickle.loads(message.content.body)
-        self.log.debug('Got one message (msgid:%s) to throw: %s', msgid, RoutedDeliverSmContent)
+        dcs = wire.loads(message.content, message.content.properties['headers']['dst-connectors'],
+                         wire.loadConnectors)
+        pdu = wire.loads(message.content, message.content.body, wire.loadPDU)
+        self.log.debug('Got one message (msgid:%s) to throw: %s', msgid, pdu)
 
         # If any, clear requeuing timer
         self.clearRequeueTimer(msgid)
@@ -490,8 +937,40 @@ class DLRThrower(Thrower):
         self.callback = self.dlr_throwing_callback
         self.opFactory = SMPPOperationFactory()
 
+        # Http DLRs being batched, by url
+        self.batches = {}
+        self.batchTimers = {}
+
         Thrower.__init__(self, config)
 
+    def clearBatchTimers(self):
+        "Drop pending batches, their messages are not acknowledged"
+        for url, timer in self.batchTimers.items():
+            if timer.active():
+                timer.cancel()
+            del self.batchTimers[url]
+        for batch in self.batches.values():
+            self.throwing.unhold(len(batch))
+        self.batches = {}
+
+    def clearAllTimers(self):
+        Thrower.clearAllTimers(self)
+
+        self.clearBatchTimers()
+
+    def getDestination(self, message):
+        headers = message.content.properties['headers']
+        if message.routing_key == 'dlr_thrower.http':
+            return urlparse.urlparse(headers.get('url', '')).netloc
+        elif message.routing_key == 'dlr_thrower.smpps':
+            return headers.get('system_id')
+
+    def getHttpUrls(self, message):
+        url = message.content.properties['headers'].get('url')
+        if message.routing_key == 'dlr_thrower.http' and url is not None:
+            return [url]
+        return []
+
     @defer.inlineCallbacks
     def http_dlr_callback(self, message):
         msgid = message.content.properties['message-id']
@@ -517,6 +996,10 @@ class DLRThrower(Thrower):
             args['err'] = message.content.properties['headers']['err']
             args['text'] = message.content.properties['headers']['text']
 
+        if self.isBatched(url):
+            self.batchHttpDLR(url, message, args)
+            defer.returnValue(None)
+
         try:
             # Throw the message to http endpoint
             encodedArgs = urllib.urlencode(args)
@@ -528,14 +1011,11 @@ class DLRThrower(Thrower):
                 postdata = encodedArgs
 
             self.log.debug('Calling %s with args %s using %s method.', baseurl, encodedArgs, method)
-            content = yield getPage(
+            content = yield self.httpRequest(
                 baseurl,
                 method=method,
                 postdata=postdata,
-                timeout=self.config.timeout,
-                agent='Jasmin gateway/1.0 %s' % self.name,
-                headers={'Content-Type': 'application/x-www-form-urlencoded',
-                         'Accept': 'text/plain'})
+                agent='Jasmin gateway/1.0 %s' % self.name)
             self.log.info('Throwed DLR [msgid:%s] to %s.', msgid, baseurl)
 
             self.log.debug('Destination end replied to message [msgid:%s]: %r', msgid, content)
@@ -549,22 +1029,104 @@ class DLRThrower(Thrower):
         except Exception, e:
             self.log.error('Throwing HTTP/DLR [msgid:%s] to (%s): %r.', msgid, baseurl, e)
 
-            # List of errors after which, no further retrying shall be made
-            noRetryErrors = ['404 Not Found']
+            yield self.http_dlr_errback(message, e)
 
-            # Requeue message for later retry
-            if (str(e) not in noRetryErrors
-                and self.getThrowingRetrials(message) <= self.config.max_retries):
-                self.log.debug('Message try-count is %s [msgid:%s]: requeuing',
-                               self.getThrowingRetrials(message), msgid)
-                yield self.rejectAndRequeueMessage(message)
-            elif str(e) in noRetryErrors:
-                self.log.warn('Message is no more processed after receiving "%s" error', str(e))
-                yield self.rejectMessage(message)
-            else:
-                self.log.warn('Message try-count is %s [msgid:%s]: purged from queue',
-                              self.getThrowingRetrials(message), msgid)
-                yield self.rejectMessage(message)
+    @defer.inlineCallbacks
+    def http_dlr_errback(self, message, e):
+        msgid = message.content.properties['message-id']
+
+        # List of errors after which, no further retrying shall be made
+        noRetryErrors = ['404 Not Found']
+
+        if isinstance(e, CircuitOpenError):
+            # Destination is down, this attempt does not count as a retrial
+            self.decThrowingRetrials(message)
+            yield self.parkMessage(message)
+        # Requeue message for later retry
+        elif (str(e) not in noRetryErrors
+            and self.getThrowingRetrials(message) <= self.config.max_retries):
+            self.log.debug('Message try-count is %s [msgid:%s]: requeuing',
+                           self.getThrowingRetrials(message), msgid)
+            yield self.rejectAndRequeueMessage(message)
+        elif str(e) in noRetryErrors:
+            self.log.warn('Message is no more processed after receiving "%s" error', str(e))
+            yield self.rejectMessage(message)
+        else:
+            self.log.warn('Message try-count is %s [msgid:%s]: purged from queue',
+                          self.getThrowingRetrials(message), msgid)
+            yield self.rejectMessage(message)
+
+    def isBatched(self, url):
+        for prefix in self.config.http_batch_urls:
+            if url.startswith(prefix):
+                return True
+        return False
+
+    def batchHttpDLR(self, url, message, args):
+        """Add DLR to url's batch, the batch is thrown when it reaches http_batch_max_size
+        DLRs or after http_batch_window seconds
+
+        Batched DLRs are held (c.f. max_concurrency) until their batch is settled.
+        """
+        if url not in self.batches:
+            self.batches[url] = []
+            self.batchTimers[url] = reactor.callLater(self.config.http_batch_window, self.throwHttpDLRBatch, url)
+        self.batches[url].append((message, args))
+        self.throwing.hold()
+        self.log.debug('Batched DLR [msgid:%s] for %s (%s/%s).', args['id'], url,
+                       len(self.batches[url]), self.config.http_batch_max_size)
+
+        if len(self.batches[url]) >= self.config.http_batch_max_size:
+            self.throwHttpDLRBatch(url)
+
+    def throwHttpDLRBatch(self, url):
+        """Throw url's batch of DLRs, the POST is run through the ThrowingScheduler like single
+        DLRs are"""
+        timer = self.batchTimers.pop(url)
+        if timer.active():
+            timer.cancel()
+        batch = self.batches.pop(url)
+
+        def settled(result):
+            self.throwing.unhold(len(batch))
+            self.consume()
+            return result
+
+        d = self.throwing.run(urlparse.urlparse(url).netloc, self.postHttpDLRBatch, url, batch)
+        d.addBoth(settled)
+        d.addErrback(self.errback)
+        return d
+
+    @defer.inlineCallbacks
+    def postHttpDLRBatch(self, url, batch):
+        """POST batch of DLRs to url as a json array (whatever their dlr-method), all DLRs are
+        acknowledged on ACK/Jasmin and retried one by one on failure"""
+        try:
+            postdata = json.dumps([args for _, args in batch])
+
+            self.log.debug('Calling %s with a batch of %s DLRs.', url, len(batch))
+            content = yield self.httpRequest(
+                url,
+                method='POST',
+                postdata=postdata,
+                agent='Jasmin gateway/1.0 %s' % self.name,
+                contentType='application/json')
+            self.log.info('Throwed a batch of %s DLRs to %s.', len(batch), url)
+
+            self.log.debug('Destination end replied to batch: %r', content)
+            # Check for acknowledgement
+            if content.strip() != 'ACK/Jasmin':
+                raise MessageAcknowledgementError(
+                    'Destination end did not acknowledge receipt of the DLR messages batch.')
+        except Exception, e:
+            self.log.error('Throwing HTTP/DLR batch of %s DLRs to (%s): %r.', len(batch), url, e)
+
+            for message, _ in batch:
+                yield self.http_dlr_errback(message, e)
+        else:
+            # Everything is okay ? then:
+            for message, _ in batch:
+                yield self.ackMessage(message)
 
     @defer.inlineCallbacks
     def smpp_dlr_callback(self, message):
@@ -0,0 +1,48 @@
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """A bounded least-recently-used cache with a time to live for each entry
+
+    Setting size to 0 will disable caching.
+    """
+
+    def __init__(self, size=1000, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the value cached for key, KeyError is raised if key is not cached or expired"""
+        expires_at, value = self._entries.pop(key)
+        if expires_at <= time.time():
+            raise KeyError(key)
+
+        # Move key to the most recently used end
+        self._entries[key] = (expires_at, value)
+        return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.size:
+            # Evict the least recently used entry
+            self._entries.popitem(last=False)
+
+        self._entries[key] = (time.time() + self.ttl, value)
+
+    def invalidate(self, match=None):
+        """Remove entries having match(key) returning True, all entries are removed when
+        match is None
+        """
+        if match is None:
+            self._entries.clear()
+        else:
+            for key in [k for k in self._entries if match(k)]:
+                del self._entries[key]
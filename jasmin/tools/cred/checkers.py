@@ -8,13 +8,15 @@ class RouterAuthChecker(object):
     implements(checkers.ICredentialsChecker)
     credentialInterfaces = (credentials.IUsernamePassword,)
 
-    def __init__(self, router_factory):
+    def __init__(self, router_factory, stats=None):
         self.router_factory = router_factory
+        self.stats = stats
 
     def requestAvatarId(self, creds):
         user = self.router_factory.authenticateUser(
             creds.username,
-            creds.password)
+            creds.password,
+            stats=self.stats)
 
         # Username / Password correct ?
         if user is not None:
@@ -86,6 +86,38 @@ def fix_users_and_smppccs_09rc23(data, context=None):
         return data
 
 
+def smppccs_submit_sm_window(data, context=None):
+    """Adding the new submit_sm_window and prefetch_count smppcc parameters"""
+
+    for smppcc in data:
+        if not hasattr(smppcc['config'], 'submit_sm_window'):
+            smppcc['config'].submit_sm_window = 0
+        if not hasattr(smppcc['config'], 'prefetch_count'):
+            smppcc['config'].prefetch_count = 0
+
+    return data
+
+
+def smppccs_submit_sm_burst(data, context=None):
+    """Adding the new submit_sm_burst smppcc parameter"""
+
+    for smppcc in data:
+        if not hasattr(smppcc['config'], 'submit_sm_burst'):
+            smppcc['config'].submit_sm_burst = 1
+
+    return data
+
+
+def smppccs_bind_count(data, context=None):
+    """Adding the new bind_count smppcc parameter"""
+
+    for smppcc in data:
+        if not hasattr(smppcc['config'], 'bind_count'):
+            smppcc['config'].bind_count = 1
+
+    return data
+
+
 """This is the main map for orchestring config migrations.
 
 The map is based on 3 elements:
@@ -107,4 +139,7 @@ MAP = [
     {'conditions': ['<=0.9022'],
      'contexts': {'users', 'smppccs'},
      'operations': [fix_users_and_smppccs_09rc23]},
+    {'conditions': ['<=0.9024'],
+     'contexts': {'smppccs'},
+     'operations': [smppccs_submit_sm_window, smppccs_submit_sm_burst, smppccs_bind_count]},
 ]
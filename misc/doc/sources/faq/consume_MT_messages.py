@@ -1,5 +1,4 @@
 # Gist from https://gist.github.com/farirat/5701d71bf6e404d17cb4
-import cPickle as pickle
 from twisted.internet.defer import inlineCallbacks
 from twisted.internet import reactor
 from twisted.internet.protocol import ClientCreator
@@ -10,6 +9,8 @@ from txamqp.client import TwistedDelegate
 
 import txamqp.spec
 
+from jasmin.queues import wire
+
 @inlineCallbacks
 def gotConnection(conn, username, password):
     print "Connected to broker."
@@ -21,8 +22,11 @@ def gotConnection(conn, username, password):
 
     yield chan.queue_declare(queue="someQueueName")
 
-    # Bind to submit.sm.* and submit.sm.resp.* routes
+    # Bind to submit.sm.* (and its priority lanes) and submit.sm.resp.* routes
     yield chan.queue_bind(queue="someQueueName", exchange="messaging", routing_key='submit.sm.*')
+    for priority in [1, 2, 3]:
+        yield chan.queue_bind(queue="someQueueName", exchange="messaging",
+                              routing_key='submit.sm.*.p%s' % priority)
     yield chan.queue_bind(queue="someQueueName", exchange="messaging", routing_key='submit.sm.resp.*')
 
     yield chan.basic_consume(queue='someQueueName', no_ack=True, consumer_tag="someTag")
@@ -33,7 +37,8 @@ def gotConnection(conn, username, password):
     while True:
         msg = yield queue.get()
         props = msg.content.properties
-        pdu = pickle.loads(msg.content.body)
+        # Body is pickled or, with wire_format = compact, in the compact wire format
+        pdu = wire.loads(msg.content, msg.content.body, wire.loadPDU)
 
     	if msg.routing_key[:15] == 'submit.sm.resp.':
     		print 'SubmitSMResp: status: %s, msgid: %s' % (pdu.status,
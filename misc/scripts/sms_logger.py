@@ -27,7 +27,6 @@ Requirement:
   ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;
 """
 
-import cPickle as pickle
 import binascii
 from datetime import datetime
 from twisted.internet.defer import inlineCallbacks
@@ -38,6 +37,7 @@ from txamqp.protocol import AMQClient
 from txamqp.client import TwistedDelegate
 import txamqp.spec
 
+from jasmin.queues import wire
 from jasmin.vendor.smpp.pdu.pdu_types import DataCoding
 
 import MySQLdb as mdb
@@ -55,8 +55,11 @@ def gotConnection(conn, username, password):
 
     yield chan.queue_declare(queue="sms_logger_queue")
 
-    # Bind to submit.sm.* and submit.sm.resp.* routes to track sent messages
+    # Bind to submit.sm.* (and its priority lanes) and submit.sm.resp.* routes to track sent messages
     yield chan.queue_bind(queue="sms_logger_queue", exchange="messaging", routing_key='submit.sm.*')
+    for priority in [1, 2, 3]:
+        yield chan.queue_bind(queue="sms_logger_queue", exchange="messaging",
+                              routing_key='submit.sm.*.p%s' % priority)
     yield chan.queue_bind(queue="sms_logger_queue", exchange="messaging", routing_key='submit.sm.resp.*')
     # Bind to dlr_thrower.* to track DLRs
     yield chan.queue_bind(queue="sms_logger_queue", exchange="messaging", routing_key='dlr_thrower.*')
@@ -81,16 +84,18 @@ def gotConnection(conn, username, password):
         props = msg.content.properties
 
         if msg.routing_key[:10] == 'submit.sm.' and msg.routing_key[:15] != 'submit.sm.resp.':
-            pdu = pickle.loads(msg.content.body)
+            # Body and bill are pickled or, with wire_format = compact, in the compact wire format
+            pdu = wire.loads(msg.content, msg.content.body, wire.loadPDU)
             pdu_count = 1
             short_message = pdu.params['short_message']
             billing = props['headers']
-            billing_pickle = billing.get('submit_sm_resp_bill')
-            if not billing_pickle:
-                billing_pickle = billing.get('submit_sm_bill')
-            submit_sm_bill = pickle.loads(billing_pickle)
+            billing_data = billing.get('submit_sm_resp_bill')
+            if not billing_data:
+                billing_data = billing.get('submit_sm_bill')
+            submit_sm_bill = wire.loads(msg.content, billing_data, wire.loadBill)
             source_connector = props['headers']['source_connector']
-            routed_cid = msg.routing_key[10:]
+            # Strip the priority lane suffix (submit.sm.<cid>.p<N>), cids cannot contain dots
+            routed_cid = msg.routing_key[10:].split('.')[0]
 
             # Is it a multipart message ?
             while hasattr(pdu, 'nextPdu'):
@@ -127,7 +132,7 @@ def gotConnection(conn, username, password):
         elif msg.routing_key[:15] == 'submit.sm.resp.':
             # It's a submit_sm_resp
 
-            pdu = pickle.loads(msg.content.body)
+            pdu = wire.loads(msg.content, msg.content.body, wire.loadPDU)
             if props['message-id'] not in q:
                 print 'Got resp of an unknown submit_sm: %s' % props['message-id']
                 chan.basic_ack(delivery_tag=msg.delivery_tag)